@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app import deps
 from app.db import models
 from app import schemas
+from app.core.cache import cache
+from app.api.jobs import job_accepted
+from app.services import ai_executor, batch_matching, job_queue, research_pipeline
+from app.services.job_queue import JobQueue
+from app.services.opportunity_matrix import OpportunityMatrix
+from app.services.llm_cache import llm_cache
 
 router = APIRouter()
 
@@ -98,6 +104,7 @@ def create_admin_opportunity(
         db.commit()
         db.refresh(db_opportunity)
         
+    OpportunityMatrix.refresh_opportunity(db, db_opportunity)
     return db_opportunity
 
 @router.get("/applications", response_model=List[schemas.ApplicationResponse])
@@ -109,3 +116,76 @@ def get_all_applications(
     applications = db.query(models.Application).all()
     return applications
 
+@router.get("/ai/stats")
+def get_ai_stats(
+    current_user: models.User = Depends(deps.get_current_user)
+):
+    check_admin(current_user)
+    return {
+        "executor": ai_executor.stats(),
+        "llm_cache": llm_cache.stats(),
+        "app_cache": cache.stats()
+    }
+
+# Scores on one thread in the job worker; the process-pool run is precompute_matches.py (CLI).
+# One run at a time (concurrency 1), and a failed run is re-triggered rather than retried.
+@job_queue.handler("batch_matching", max_attempts=1)
+async def batch_matching_job(db: Session):
+    return await batch_matching.run_batch_matching(workers=1)
+
+def _latest_job(db: Session, job_type: str) -> Optional[models.AIJob]:
+    return db.query(models.AIJob).filter(models.AIJob.type == job_type).order_by(models.AIJob.id.desc()).first()
+
+@router.post("/matching/precompute", status_code=202)
+async def trigger_batch_matching(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user)
+):
+    check_admin(current_user)
+    latest = _latest_job(db, "batch_matching")
+    if latest is not None and latest.status in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="Batch matching is already running")
+    
+    job = JobQueue.enqueue(db, "batch_matching", {}, user_id=current_user.id)
+    return job_accepted(job, message="Batch matching queued")
+
+@router.get("/matching/precompute")
+def get_batch_matching_status(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user)
+):
+    check_admin(current_user)
+    latest = _latest_job(db, "batch_matching")
+    return {"job": JobQueue.to_response(latest) if latest else None}
+
+# One run at a time (concurrency 1); a run resumes from its checkpoints, so it isn't retried
+@job_queue.handler("research_pipeline", max_attempts=1)
+async def research_pipeline_job(db: Session, force: bool = False, limit: Optional[int] = None):
+    return await research_pipeline.run_research_pipeline(
+        force_analysis=force, limit=limit, on_progress=JobQueue.report_progress
+    )
+
+@router.post("/research/pipeline", status_code=202)
+async def trigger_research_pipeline(
+    force: bool = False,
+    limit: Optional[int] = None,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user)
+):
+    check_admin(current_user)
+    latest = _latest_job(db, "research_pipeline")
+    if latest is not None and latest.status in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="Research pipeline is already running")
+    
+    job = JobQueue.enqueue(db, "research_pipeline", {"force": force, "limit": limit}, user_id=current_user.id)
+    return job_accepted(job, message="Research pipeline queued")
+
+@router.get("/research/pipeline")
+def get_research_pipeline_status(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user)
+):
+    check_admin(current_user)
+    # Progress (running totals) is on the job row while it runs, the stats once it finished
+    latest = _latest_job(db, "research_pipeline")
+    return {"job": JobQueue.to_response(latest) if latest else None}
@@ -1,9 +1,13 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.db import models
 from app.deps import get_current_user
-from app.services import ai_service
+from app.services import ai_service, job_queue
+from app.services.job_queue import JobQueue
+from app.api.jobs import job_accepted, job_responses
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -117,14 +121,33 @@ async def analyze_match(
     
     return result
 
-@router.post("/cover-letter", response_model=CoverLetterResponse)
+async def _cover_letter(profile: models.StudentProfile, opportunity: models.Opportunity, raise_errors: bool = False) -> dict:
+    resume_text = format_student_profile(profile)
+    job_desc = format_opportunity(opportunity)
+    
+    cover_letter = await ai_service.generate_cover_letter(resume_text, job_desc, raise_errors=raise_errors)
+    
+    return {"cover_letter": cover_letter}
+
+@job_queue.handler("cover_letter", concurrency=4)
+async def cover_letter_job(db: Session, user_id: int, opportunity_id: int):
+    opportunity = db.query(models.Opportunity).filter(models.Opportunity.id == opportunity_id).first()
+    profile = db.query(models.StudentProfile).filter(models.StudentProfile.user_id == user_id).first()
+    if not opportunity or not profile:
+        raise ValueError("Opportunity or student profile no longer exists")
+    return await _cover_letter(profile, opportunity, raise_errors=True)
+
+@router.post("/cover-letter", responses=job_responses(CoverLetterResponse))
 async def generate_cover_letter(
     request: AIAnalysisRequest,
+    async_job: bool = True,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Generates a cover letter for the specified opportunity based on the user's profile.
+    The letter is queued (202) and delivered through /jobs/{job_id}; async_job=false
+    generates it inline instead.
     """
     if current_user.role != "student":
          raise HTTPException(status_code=403, detail="Only students can generate cover letters")
@@ -139,35 +162,55 @@ async def generate_cover_letter(
     if not profile:
         raise HTTPException(status_code=400, detail="Student profile not found. Please complete your profile first.")
         
-    resume_text = format_student_profile(profile)
-    job_desc = format_opportunity(opportunity)
+    if async_job:
+        job = JobQueue.enqueue(db, "cover_letter", {"user_id": current_user.id, "opportunity_id": opportunity.id}, user_id=current_user.id)
+        return job_accepted(job)
     
-    cover_letter = await ai_service.generate_cover_letter(resume_text, job_desc)
-    
-    return {"cover_letter": cover_letter}
+    return CoverLetterResponse.model_validate(await _cover_letter(profile, opportunity))
 
-@router.post("/proposal-guidance", response_model=ProposalGuidanceResponse)
-async def get_proposal_guidance(
-    request: ProposalGuidanceRequest,
+def _sse_response(events, result_key: str = None) -> StreamingResponse:
+    """
+    Relays (event, data) pairs from an ai_service stream as Server-Sent Events:
+    "token" events carry text chunks, then one "done" (final result) or "error".
+    """
+    async def body():
+        async for event, data in events:
+            if event == "result":
+                event, data = "done", {result_key: data} if result_key else data
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    # No proxy buffering, or tokens would arrive all at once
+    return StreamingResponse(body(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@router.post("/cover-letter/stream")
+async def stream_cover_letter(
+    request: AIAnalysisRequest,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
-    Generates structured proposal guidance, supervisor talking points, and a readiness check.
+    Streams the cover letter as it is generated (text/event-stream).
+    The final "done" event has the same shape as /cover-letter.
     """
     if current_user.role != "student":
-         raise HTTPException(status_code=403, detail="Only students can request proposal guidance")
-
-    # Fetch Student Profile
-    student = db.query(models.StudentProfile).filter(models.StudentProfile.user_id == current_user.id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student profile not found")
-
-    # Fetch Mentor Profile
-    mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == request.mentor_id).first()
-    if not mentor:
-        raise HTTPException(status_code=404, detail="Mentor not found")
+         raise HTTPException(status_code=403, detail="Only students can generate cover letters")
+         
+    opportunity = db.query(models.Opportunity).filter(models.Opportunity.id == request.opportunity_id).first()
+    if not opportunity:
+        raise HTTPException(status_code=404, detail="Opportunity not found")
+        
+    profile = db.query(models.StudentProfile).filter(models.StudentProfile.user_id == current_user.id).first()
+    if not profile:
+        raise HTTPException(status_code=400, detail="Student profile not found. Please complete your profile first.")
+        
+    # Prompts are built before streaming starts: the request session isn't used after this
+    resume_text = format_student_profile(profile)
+    job_desc = format_opportunity(opportunity)
+    return _sse_response(ai_service.stream_cover_letter(resume_text, job_desc), result_key="cover_letter")
 
+def _proposal_guidance_inputs(student: models.StudentProfile, mentor: models.MentorProfile, gap_title: str, gap_description: str):
     # Prepare data for AI Service
     student_skills = []
     if student.primary_skills:
@@ -188,9 +231,80 @@ async def get_proposal_guidance(
     }
 
     gap_data = {
-        "title": request.gap_title,
-        "description": request.gap_description
+        "title": gap_title,
+        "description": gap_description
     }
 
-    result = await ai_service.generate_proposal_guidance(student_data, mentor_data, gap_data)
-    return result
+    return student_data, mentor_data, gap_data
+
+async def _proposal_guidance(student: models.StudentProfile, mentor: models.MentorProfile, gap_title: str, gap_description: str, raise_errors: bool = False) -> dict:
+    inputs = _proposal_guidance_inputs(student, mentor, gap_title, gap_description)
+    return await ai_service.generate_proposal_guidance(*inputs, raise_errors=raise_errors)
+
+@job_queue.handler("proposal_guidance", concurrency=4)
+async def proposal_guidance_job(db: Session, user_id: int, mentor_id: int, gap_title: str, gap_description: str):
+    student = db.query(models.StudentProfile).filter(models.StudentProfile.user_id == user_id).first()
+    mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == mentor_id).first()
+    if not student or not mentor:
+        raise ValueError("Student or mentor profile no longer exists")
+    return await _proposal_guidance(student, mentor, gap_title, gap_description, raise_errors=True)
+
+@router.post("/proposal-guidance", responses=job_responses(ProposalGuidanceResponse))
+async def get_proposal_guidance(
+    request: ProposalGuidanceRequest,
+    async_job: bool = True,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Generates structured proposal guidance, supervisor talking points, and a readiness check.
+    The guidance is queued (202) and delivered through /jobs/{job_id}; async_job=false
+    generates it inline instead.
+    """
+    if current_user.role != "student":
+         raise HTTPException(status_code=403, detail="Only students can request proposal guidance")
+
+    # Fetch Student Profile
+    student = db.query(models.StudentProfile).filter(models.StudentProfile.user_id == current_user.id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student profile not found")
+
+    # Fetch Mentor Profile
+    mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == request.mentor_id).first()
+    if not mentor:
+        raise HTTPException(status_code=404, detail="Mentor not found")
+
+    if async_job:
+        job = JobQueue.enqueue(db, "proposal_guidance", {
+            "user_id": current_user.id,
+            "mentor_id": mentor.id,
+            "gap_title": request.gap_title,
+            "gap_description": request.gap_description
+        }, user_id=current_user.id)
+        return job_accepted(job)
+
+    return ProposalGuidanceResponse.model_validate(await _proposal_guidance(student, mentor, request.gap_title, request.gap_description))
+
+@router.post("/proposal-guidance/stream")
+async def stream_proposal_guidance(
+    request: ProposalGuidanceRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Streams proposal guidance as it is generated (text/event-stream).
+    The final "done" event has the same shape as /proposal-guidance.
+    """
+    if current_user.role != "student":
+         raise HTTPException(status_code=403, detail="Only students can request proposal guidance")
+
+    student = db.query(models.StudentProfile).filter(models.StudentProfile.user_id == current_user.id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student profile not found")
+
+    mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == request.mentor_id).first()
+    if not mentor:
+        raise HTTPException(status_code=404, detail="Mentor not found")
+
+    inputs = _proposal_guidance_inputs(student, mentor, request.gap_title, request.gap_description)
+    return _sse_response(ai_service.stream_proposal_guidance(*inputs))
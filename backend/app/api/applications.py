@@ -7,7 +7,7 @@ from app.db.database import get_db
 from app.db.models import Application, Opportunity, User, Message, StudentProfile
 from app.schemas import ApplicationCreate, ApplicationResponse, ApplicationUpdate
 from app.deps import get_current_user
-from app.services.matching import calculate_match_score
+from app.services.matching import calculate_match_score, deadline_passed
 from app.services.twilio_service import send_whatsapp_message
 from app.core.config import settings
 
@@ -28,6 +28,8 @@ def create_application(
         raise HTTPException(status_code=404, detail="Opportunity not found")
     if not opportunity.is_open:
         raise HTTPException(status_code=400, detail="This opportunity is closed")
+    if deadline_passed(opportunity):
+        raise HTTPException(status_code=400, detail="The application deadline has passed")
     
     # Check if already applied
     existing_application = db.query(Application).filter(
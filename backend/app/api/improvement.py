@@ -6,7 +6,9 @@ from datetime import datetime, timedelta
 from app.db.database import get_db
 from app.db.models import User, Opportunity, ImprovementPlan, PlanItem, StudentProfile
 from app.deps import get_current_user
-from app.services import ai_service
+from app.services import ai_service, job_queue
+from app.services.job_queue import JobQueue
+from app.api.jobs import job_accepted, job_responses
 
 router = APIRouter()
 
@@ -104,42 +106,7 @@ def format_opportunity(opp: Opportunity) -> str:
 
 # Endpoints
 
-@router.post("/generate/{opportunity_id}", response_model=ImprovementPlanResponse)
-async def generate_improvement_plan(
-    opportunity_id: int, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_user)
-):
-    if current_user.role != "student":
-        raise HTTPException(status_code=403, detail="Only students can generate improvement plans")
-
-    # Check if plan already exists
-    existing_plan = db.query(ImprovementPlan).filter(
-        ImprovementPlan.student_id == current_user.id,
-        ImprovementPlan.opportunity_id == opportunity_id
-    ).first()
-    
-    if existing_plan:
-        return _format_plan_response(existing_plan)
-
-    opportunity = db.query(Opportunity).filter(Opportunity.id == opportunity_id).first()
-    if not opportunity:
-        raise HTTPException(status_code=404, detail="Opportunity not found")
-
-    # Fetch Student Profile
-    profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
-    if not profile:
-        raise HTTPException(status_code=400, detail="Student profile not found. Please complete your profile first.")
-
-    # Create Plan Record
-    new_plan = ImprovementPlan(
-        student_id=current_user.id,
-        opportunity_id=opportunity_id,
-        status="in_progress"
-    )
-    db.add(new_plan)
-    db.flush() # Get ID
-
+async def _create_improvement_plan(db: Session, user_id: int, opportunity: Opportunity, profile: StudentProfile, raise_errors: bool = False) -> ImprovementPlan:
     # Generate Plan Items via AI
     resume_text = format_student_profile(profile)
     job_desc = format_opportunity(opportunity)
@@ -151,12 +118,20 @@ async def generate_improvement_plan(
          if delta.days > 0:
              days_remaining = delta.days
     
-    ai_items = await ai_service.generate_improvement_plan(resume_text, job_desc, days_remaining)
+    ai_items = await ai_service.generate_improvement_plan(resume_text, job_desc, days_remaining, raise_errors=raise_errors)
     
     if not ai_items:
-        # Fallback to simple skill gap if AI fails
-        # (Simplified fallback omitted for brevity, but should handle error gracefully)
-        pass
+        # Nothing is saved: an empty plan would be returned as "existing" from then on
+        raise RuntimeError("Improvement plan generation returned no items")
+
+    # Create Plan Record
+    new_plan = ImprovementPlan(
+        student_id=user_id,
+        opportunity_id=opportunity.id,
+        status="in_progress"
+    )
+    db.add(new_plan)
+    db.flush() # Get ID
 
     for item_data in ai_items:
         # Calculate absolute deadline date
@@ -179,7 +154,65 @@ async def generate_improvement_plan(
 
     db.commit()
     db.refresh(new_plan)
-    return _format_plan_response(new_plan)
+    return new_plan
+
+@job_queue.handler("improvement_plan", concurrency=4)
+async def improvement_plan_job(db: Session, user_id: int, opportunity_id: int):
+    # A retry (or a second request) must not create a duplicate plan
+    plan = db.query(ImprovementPlan).filter(
+        ImprovementPlan.student_id == user_id,
+        ImprovementPlan.opportunity_id == opportunity_id
+    ).first()
+    if not plan:
+        opportunity = db.query(Opportunity).filter(Opportunity.id == opportunity_id).first()
+        profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+        if not opportunity or not profile:
+            raise ValueError("Opportunity or student profile no longer exists")
+        plan = await _create_improvement_plan(db, user_id, opportunity, profile, raise_errors=True)
+    return ImprovementPlanResponse.model_validate(_format_plan_response(plan)).model_dump(mode="json")
+
+@router.post("/generate/{opportunity_id}", responses=job_responses(ImprovementPlanResponse))
+async def generate_improvement_plan(
+    opportunity_id: int, 
+    async_job: bool = True,
+    db: Session = Depends(get_db), 
+    current_user: User = Depends(get_current_user)
+):
+    """
+    A new plan is generated in the job queue (202) and delivered through
+    /jobs/{job_id}; an existing plan is still returned at once. async_job=false
+    generates it inline instead.
+    """
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Only students can generate improvement plans")
+
+    # Check if plan already exists
+    existing_plan = db.query(ImprovementPlan).filter(
+        ImprovementPlan.student_id == current_user.id,
+        ImprovementPlan.opportunity_id == opportunity_id
+    ).first()
+    
+    if existing_plan:
+        return ImprovementPlanResponse.model_validate(_format_plan_response(existing_plan))
+
+    opportunity = db.query(Opportunity).filter(Opportunity.id == opportunity_id).first()
+    if not opportunity:
+        raise HTTPException(status_code=404, detail="Opportunity not found")
+
+    # Fetch Student Profile
+    profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
+    if not profile:
+        raise HTTPException(status_code=400, detail="Student profile not found. Please complete your profile first.")
+
+    if async_job:
+        job = JobQueue.enqueue(db, "improvement_plan", {"user_id": current_user.id, "opportunity_id": opportunity_id}, user_id=current_user.id)
+        return job_accepted(job)
+
+    try:
+        new_plan = await _create_improvement_plan(db, current_user.id, opportunity, profile)
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return ImprovementPlanResponse.model_validate(_format_plan_response(new_plan))
 
 @router.get("/", response_model=List[ImprovementPlanResponse])
 def get_my_plans(
@@ -1,21 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime
 from app.db.database import get_db
-from app.db.models import User, SavedResearchGap, MentorProfile
+from app.db.models import User, SavedResearchGap, MentorProfile, StudentProfile
 from app.deps import get_current_user
 from app.services.research_service import ResearchService
-from app.core.cache import SimpleCache
+from app.core.cache import SimpleCache, mentor_tag, student_tag
+from app.core.config import settings
+from app.api.jobs import job_accepted
+from app.services import job_queue
+from app.services.job_queue import JobQueue
 
 router = APIRouter()
 cache = SimpleCache()
+logger = logging.getLogger(__name__)
 
-@router.post("/mentors/{mentor_id}/ingest")
+GAPS_CACHE_TTL = 86400
+MAX_GAPS_BATCH = 10
+
+def _gaps_cache_key(student_id: int, mentor_id: int) -> str:
+    return f"research_gaps_{student_id}_{mentor_id}"
+
+# Job handlers: each run gets its own session from the job worker
+
+@job_queue.handler("ingest_publications", concurrency=2)
+async def ingest_publications_job(db: Session, mentor_id: int):
+    await ResearchService.ingest_publications(db, mentor_id, raise_errors=True)
+    return {"mentor_id": mentor_id}
+
+@job_queue.handler("analyze_trends", concurrency=2)
+async def analyze_trends_job(db: Session, mentor_id: int):
+    new_topics = await ResearchService.analyze_trends(db, mentor_id, raise_errors=True)
+    if new_topics:
+        schedule_retag(db)
+    return {"mentor_id": mentor_id, "new_topics": new_topics}
+
+# New topics only reach other mentors' papers through a corpus retag. One queued
+# retag covers every analysis that adds topics before it runs.
+RETAG_JOB = "retag_publications"
+
+def schedule_retag(db: Session):
+    JobQueue.enqueue_unique(db, RETAG_JOB, RETAG_JOB, {})
+
+@job_queue.handler(RETAG_JOB)
+async def retag_publications_job(db: Session):
+    # Synchronous and corpus-sized: off the event loop, so job heartbeats keep running
+    changed = await asyncio.to_thread(ResearchService.retag_all_publications)
+    return {"mentors": changed}
+
+# Trend statuses are relative to the current year, so they're re-derived once each new year
+TREND_REFRESH_JOB = "refresh_trend_statuses"
+
+def schedule_trend_refresh(db: Session, run_after: Optional[datetime] = None):
+    """
+    Keeps one refresh_trend_statuses job queued (due now unless run_after is
+    given). Safe to call from every worker process at once.
+    """
+    JobQueue.enqueue_unique(db, TREND_REFRESH_JOB, TREND_REFRESH_JOB, {}, run_after=run_after)
+
+@job_queue.handler(TREND_REFRESH_JOB)
+async def refresh_trend_statuses_job(db: Session):
+    changed = ResearchService.refresh_trend_statuses(db)
+    schedule_trend_refresh(db, run_after=datetime(datetime.utcnow().year + 1, 1, 1))
+    return {"changed": changed}
+
+@router.post("/mentors/{mentor_id}/ingest", status_code=202)
 async def ingest_publications(
     mentor_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -23,14 +78,13 @@ async def ingest_publications(
     if current_user.role != "admin" and (current_user.mentor_profile is None or current_user.mentor_profile.id != mentor_id):
         raise HTTPException(status_code=403, detail="Not authorized")
         
-    # Run in background as it calls AI
-    background_tasks.add_task(ResearchService.ingest_publications, db, mentor_id)
-    return {"message": "Ingestion started in background"}
+    # Queued as it calls AI; poll /jobs/{job_id} for completion
+    job = JobQueue.enqueue(db, "ingest_publications", {"mentor_id": mentor_id}, user_id=current_user.id)
+    return job_accepted(job, message="Ingestion started in background")
 
-@router.post("/mentors/{mentor_id}/analyze")
+@router.post("/mentors/{mentor_id}/analyze", status_code=202)
 async def analyze_research(
     mentor_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -38,8 +92,8 @@ async def analyze_research(
     if current_user.role != "admin" and (current_user.mentor_profile is None or current_user.mentor_profile.id != mentor_id):
         raise HTTPException(status_code=403, detail="Not authorized")
         
-    background_tasks.add_task(ResearchService.analyze_trends, db, mentor_id)
-    return {"message": "Analysis started in background"}
+    job = JobQueue.enqueue(db, "analyze_trends", {"mentor_id": mentor_id}, user_id=current_user.id)
+    return job_accepted(job, message="Analysis started in background")
 
 @router.get("/mentors/{mentor_id}/analytics")
 def get_analytics(
@@ -66,23 +120,88 @@ async def get_research_gaps(
         raise HTTPException(status_code=403, detail="Not authorized to view these gaps")
         
     try:
-        # Check cache first
-        cache_key = f"research_gaps_{student_id}_{mentor_id}"
-        cached_gaps = cache.get(cache_key)
-        if cached_gaps:
-            return cached_gaps
-
-        gaps = await ResearchService.generate_gaps_for_pair(db, mentor_id, student_id)
-        
-        # Cache for 24 hours
-        cache.set(cache_key, gaps, ttl_seconds=86400)
-        
-        return gaps
+        # Cache for 24 hours (empty results are AI failures, so they're not cached)
+        cache_key = _gaps_cache_key(student_id, mentor_id)
+        return await cache.get_or_set(
+            cache_key,
+            lambda: ResearchService.generate_gaps_for_pair(db, mentor_id, student_id),
+            ttl_seconds=GAPS_CACHE_TTL,
+            cache_if=bool,
+            tags=[student_tag(student_id), mentor_tag(mentor_id)]
+        )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class GapsBatchRequest(BaseModel):
+    student_id: int
+    mentor_ids: List[int]
+
+@router.post("/gaps/batch")
+async def get_research_gaps_batch(
+    request: GapsBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Research gaps for one student against several mentors (e.g. their top matches).
+    Context for every mentor is prefetched in bulk, uncached pairs are generated
+    concurrently, and each pair is cached on its own (shared with /mentors/{id}/gaps).
+    Returns [{"mentor_id", "gaps"}] in request order, with "error" for failed pairs.
+    """
+    mentor_ids = list(dict.fromkeys(request.mentor_ids))
+    if not mentor_ids or len(mentor_ids) > MAX_GAPS_BATCH:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {MAX_GAPS_BATCH} mentor ids")
+        
+    # Auth check: the student, admin, or a mentor asking only about themselves
+    student_id = request.student_id
+    is_student = current_user.student_profile and current_user.student_profile.id == student_id
+    is_mentor = current_user.mentor_profile and mentor_ids == [current_user.mentor_profile.id]
+    if not (is_student or is_mentor or current_user.role == "admin"):
+        raise HTTPException(status_code=403, detail="Not authorized to view these gaps")
+        
+    student = db.query(StudentProfile).filter(StudentProfile.id == student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+        
+    # Only pairs missing from the cache need any context
+    results = {mentor_id: cache.get(_gaps_cache_key(student_id, mentor_id)) for mentor_id in mentor_ids}
+    missing = [mentor_id for mentor_id, gaps in results.items() if gaps is None]
+    contexts = ResearchService.gap_contexts(db, missing) if missing else {}
+    student_skills = ResearchService.student_gap_skills(student)
+    
+    semaphore = asyncio.Semaphore(settings.GAPS_BATCH_CONCURRENCY)
+    
+    async def generate(mentor_id: int):
+        async with semaphore:
+            return await cache.get_or_set(
+                _gaps_cache_key(student_id, mentor_id),
+                lambda: ResearchService.generate_gaps_from_context(contexts[mentor_id], student_skills, raise_errors=True),
+                ttl_seconds=GAPS_CACHE_TTL,
+                cache_if=bool,
+                tags=[student_tag(student_id), mentor_tag(mentor_id)]
+            )
+    
+    to_generate = [mentor_id for mentor_id in missing if mentor_id in contexts]
+    generated = await asyncio.gather(*(generate(mentor_id) for mentor_id in to_generate), return_exceptions=True)
+    
+    errors = {mentor_id: "Mentor not found" for mentor_id in missing if mentor_id not in contexts}
+    for mentor_id, gaps in zip(to_generate, generated):
+        if isinstance(gaps, Exception):
+            logger.error(f"Research gaps for student {student_id}, mentor {mentor_id} failed: {str(gaps)}")
+            errors[mentor_id] = "Could not generate research gaps"
+        else:
+            results[mentor_id] = gaps
+    
+    response = []
+    for mentor_id in mentor_ids:
+        item = {"mentor_id": mentor_id, "gaps": results.get(mentor_id) or []}
+        if mentor_id in errors:
+            item["error"] = errors[mentor_id]
+        response.append(item)
+    return response
+
 # Saved Gaps Endpoints
 
 class SavedGapCreate(BaseModel):
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.db import models
+from app.deps import get_current_user
+from typing import Any, Dict, Type
+from pydantic import BaseModel
+from app.schemas import JobAcceptedResponse, JobResponse
+from app.services.job_queue import JobQueue
+
+router = APIRouter()
+
+def job_accepted(job: models.AIJob, **extra) -> JSONResponse:
+    """202 response for an endpoint that queued its work; poll status_url for the result."""
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        **extra
+    })
+
+def job_responses(result_model: Type[BaseModel]) -> Dict[int, Dict[str, Any]]:
+    """
+    OpenAPI `responses=` for an endpoint that queues by default (202, job payload)
+    and returns `result_model` inline with async_job=false (200). Such endpoints
+    don't declare a response_model: the two status codes have different bodies.
+    """
+    return {
+        200: {"model": result_model, "description": "Generated inline (async_job=false)"},
+        202: {"model": JobAcceptedResponse, "description": "Queued; the result is delivered through status_url"}
+    }
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    job = db.query(models.AIJob).filter(models.AIJob.id == job_id).first()
+    # Other users' jobs are reported as missing
+    if not job or (job.user_id != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobQueue.to_response(job)
@@ -4,13 +4,11 @@ from typing import List, Optional, Any
 from app.db.database import get_db
 from app.db import models
 from app.deps import get_current_user
-from app.services.matching_engine import MatchingEngine
+from app.services.matching_engine import MatchingEngine, CANDIDATE_POOL_SIZE
+from app.services.match_scores import MatchScoreStore
 from pydantic import BaseModel
 
-from app.core.cache import SimpleCache
-
 router = APIRouter()
-cache = SimpleCache()
 
 class TrendInfo(BaseModel):
     topic: str
@@ -31,9 +29,23 @@ class MatchResult(BaseModel):
     accepting_students: Optional[str]
     trends: List[TrendInfo] = []
 
+class StudentMatchResult(BaseModel):
+    student_id: int
+    student_name: str
+    headline: Optional[str]
+    university: Optional[str]
+    degree: Optional[str]
+    major: Optional[str]
+    is_phd_seeker: bool
+    match_score: int
+    semantic_score: int
+    alignment_score: int
+    explanation: str
+    research_interests: Optional[str]
+
 @router.get("/mentors", response_model=List[MatchResult])
 async def get_mentor_matches(
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -48,20 +60,34 @@ async def get_mentor_matches(
     if not student_profile:
         raise HTTPException(status_code=400, detail="Student profile not found")
         
-    # Check cache first
-    cache_key = f"smart_matches_{current_user.email}"
-    cached_matches = cache.get(cache_key)
-    if cached_matches:
-        return cached_matches[:limit]
-
-    # Fetch all mentors
-    mentors = db.query(models.MentorProfile).join(models.User).filter(models.User.is_active == True).all()
-    
-    # Run Matching Engine
-    matches = await MatchingEngine.match_student_with_mentors(student_profile, mentors)
-    
-    # Cache the result for 24 hours (86400 seconds)
-    # We cache the Pydantic models (or dicts)
-    cache.set(cache_key, matches, ttl_seconds=86400)
+    # Scores are persisted per (student, mentor) and kept current by profile writes.
+    # Only a student who has never been scored, whose profile changed since, or whose
+    # stored list is shorter than `limit` is scored inline.
+    if not MatchScoreStore.is_current(db, student_profile, limit):
+        await MatchScoreStore.rescore_student(db, student_profile, max(CANDIDATE_POOL_SIZE, limit))
     
-    return matches[:limit]
+    rows = MatchScoreStore.top_matches(db, student_profile.id, limit)
+    return [
+        MatchingEngine.build_match_result(student_profile, r.mentor, r.semantic_score, r.alignment_score, r.match_score)
+        for r in rows
+    ]
+
+@router.get("/students", response_model=List[StudentMatchResult])
+async def get_student_matches(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Get the best-fitting students for the current mentor (reverse 3-Lens match).
+    Candidates come from the student vector index, so the cost is independent of the pool size.
+    """
+    if current_user.role != "mentor":
+        raise HTTPException(status_code=403, detail="Only mentors can view student matches")
+        
+    mentor_profile = current_user.mentor_profile
+    if not mentor_profile:
+        raise HTTPException(status_code=400, detail="Mentor profile not found")
+        
+    students = await MatchingEngine.retrieve_candidate_students(db, mentor_profile)
+    return await MatchingEngine.match_mentor_with_students(db, mentor_profile, students, limit=limit)
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, selectinload
 from app.db.database import get_db
-from app.db.models import Opportunity, User, OpportunitySkill
-from app.schemas import OpportunityCreate, OpportunityResponse, OpportunityUpdate
-from app.deps import get_current_user
-from app.services.matching import calculate_match_score
+from app.db.models import Opportunity, User, OpportunitySkill, user_skills
+from app.schemas import OpportunityCreate, OpportunityResponse, OpportunityUpdate, OpportunityRecommendation
+from app.deps import get_current_user, get_current_user_optional
+from app.services.matching import calculate_match_score, score_required_skills
+from app.services.opportunity_matrix import OpportunityMatrix
 
 router = APIRouter()
 
@@ -43,6 +44,7 @@ def create_opportunity(
         db.commit()
         db.refresh(new_opportunity)
         
+    OpportunityMatrix.refresh_opportunity(db, new_opportunity)
     return new_opportunity
 
 @router.get("/", response_model=List[OpportunityResponse])
@@ -51,19 +53,80 @@ def read_opportunities(
     limit: int = 100,
     type: Optional[str] = None,
     mentor_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    with_match: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
 ):
+    """
+    with_match=true (students only) annotates every listed opportunity with the
+    match-preview score and a matched/missing skill summary, computed in one pass.
+    """
+    if with_match and (current_user is None or current_user.role != "student"):
+        raise HTTPException(status_code=403, detail="Only students can view match scores")
+        
     query = db.query(Opportunity)
     if type:
         query = query.filter(Opportunity.type == type)
     if mentor_id:
         query = query.filter(Opportunity.mentor_id == mentor_id)
     
-    # Eager load the mentor relationship
-    query = query.options(joinedload(Opportunity.mentor))
+    # Eager load the mentor relationship, and required skills (one bulk query) for the response
+    query = query.options(
+        joinedload(Opportunity.mentor),
+        selectinload(Opportunity.required_skills).joinedload(OpportunitySkill.skill)
+    )
     
     opportunities = query.offset(skip).limit(limit).all()
-    return opportunities
+    if not with_match:
+        return opportunities
+    
+    skill_ids = {r[0] for r in db.query(user_skills.c.skill_id).filter(user_skills.c.user_id == current_user.id)}
+    results = []
+    for opportunity in opportunities:
+        score, details = score_required_skills(skill_ids, opportunity.required_skills)
+        results.append(OpportunityResponse.model_validate(opportunity).model_copy(update={
+            "match_score": score,
+            "match_summary": {
+                "matched_count": details.get("matched_count", 0),
+                "total_required_skills": details.get("total_required_skills", 0),
+                "missing_skills": details.get("missing_skills", [])
+            }
+        }))
+    return results
+
+@router.get("/recommended", response_model=List[OpportunityRecommendation])
+def get_recommended_opportunities(
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Open opportunities ranked by weighted skill match for the current student.
+    Every opportunity is scored at once against the cached skill-weight matrix;
+    matched/missing details are only built for the returned ones.
+    """
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Only students can view recommendations")
+    
+    skill_ids = [r[0] for r in db.query(user_skills.c.skill_id).filter(user_skills.c.user_id == current_user.id)]
+    top = OpportunityMatrix.get(db).top(skill_ids, limit)
+    if not top:
+        return []
+    
+    opportunities = db.query(Opportunity).filter(Opportunity.id.in_([o for o, _ in top])).options(
+        joinedload(Opportunity.mentor),
+        selectinload(Opportunity.required_skills).joinedload(OpportunitySkill.skill)
+    ).all()
+    by_id = {o.id: o for o in opportunities}
+    
+    results = []
+    for opportunity_id, _ in top:
+        opportunity = by_id.get(opportunity_id)
+        if opportunity is None: # Deleted since the matrix was refreshed
+            continue
+        score, details = calculate_match_score(current_user, opportunity)
+        results.append({"opportunity": opportunity, "match_score": score, "details": details})
+    return results
 
 @router.get("/{opportunity_id}", response_model=OpportunityResponse)
 def read_opportunity(opportunity_id: int, db: Session = Depends(get_db)):
@@ -106,9 +169,18 @@ def update_opportunity(
     if opportunity.mentor_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this opportunity")
     
-    for key, value in opportunity_update.dict(exclude_unset=True).items():
+    update_data = opportunity_update.dict(exclude_unset=True)
+    skills_data = update_data.pop("skills", None)
+    for key, value in update_data.items():
         setattr(opportunity, key, value)
     
+    # Replace required skills when they are sent
+    if skills_data is not None:
+        opportunity.required_skills = [
+            OpportunitySkill(skill_id=item["skill_id"], weight=item["weight"]) for item in skills_data
+        ]
+    
     db.commit()
     db.refresh(opportunity)
+    OpportunityMatrix.refresh_opportunity(db, opportunity)
     return opportunity
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 
@@ -6,6 +6,11 @@ from app import deps
 from app.db import models
 from app import schemas
 from app.services.matching import calculate_readiness_score
+from app.services.embedding_store import EmbeddingStore
+from app.services.match_scores import MatchScoreStore
+from app.services.domain_filter import DomainFilter
+from app.services.research_service import ResearchService
+from app.core.cache import cache, mentor_tag, student_tag
 
 router = APIRouter()
 
@@ -45,8 +50,9 @@ def read_users_me(
     return user
 
 @router.put("/me/student", response_model=schemas.StudentProfileResponse)
-def update_student_profile(
+async def update_student_profile(
     profile_in: schemas.StudentProfileUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_user)
 ):
@@ -103,12 +109,21 @@ def update_student_profile(
     profile.readiness_score = calculate_readiness_score(profile, current_user.skills)
     
     db.commit()
+    
+    # Keep the stored matching embedding in sync (no-op unless interests/bio/skills changed)
+    await EmbeddingStore.refresh_student_embedding(db, profile)
+    
+    # Drop this student's cached research gaps and re-score their match row
+    cache.invalidate_tags(student_tag(profile.id))
+    background_tasks.add_task(MatchScoreStore.rescore_student_job, profile.id)
+    
     db.refresh(profile)
     return profile
 
 @router.put("/me/mentor", response_model=schemas.MentorProfileResponse)
-def update_mentor_profile(
+async def update_mentor_profile(
     profile_in: schemas.MentorProfileUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_user)
 ):
@@ -133,11 +148,24 @@ def update_mentor_profile(
         for field, value in profile_data.items():
             setattr(profile, field, value)
             
-    # Update Publications
+    # Update Publications (replaced wholesale; the old ones' topic tags leave the trends
+    # and the new ones are tagged and counted in the same transaction)
     if pub_data is not None:
+        ResearchService.remove_publications(db, [p.id for p in profile.publications])
         profile.publications = [models.Publication(**item) for item in pub_data]
+        db.flush()
+        ResearchService.tag_publications(db, profile.publications)
             
     db.commit()
+    
+    # Keep the stored matching embedding and Lens 1 taxonomy in sync (no-ops unless their inputs changed)
+    await EmbeddingStore.refresh_mentor_embedding(db, profile)
+    DomainFilter.refresh_mentor(db, profile)
+    
+    # Drop cached research gaps for this mentor and re-score their column for every student
+    cache.invalidate_tags(mentor_tag(profile.id))
+    background_tasks.add_task(MatchScoreStore.rescore_mentor_job, profile.id)
+    
     db.refresh(profile)
     return profile
 
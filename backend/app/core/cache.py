@@ -1,36 +1,600 @@
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
 import time
 
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Invalidation tags. Cached results are tagged with every profile they were computed
+# from, so a profile write drops only the entries that depend on it.
+def student_tag(student_id: int) -> str:
+    return f"student:{student_id}"
+
+def mentor_tag(mentor_id: int) -> str:
+    return f"mentor:{mentor_id}"
+
+
+def _estimate_size(value: Any) -> int:
+    # Cached values are JSON-like (match lists, research gaps); their serialized
+    # length is a cheap, stable proxy for memory footprint.
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class CacheBackend:
+    """
+    Storage behind SimpleCache. Values must be JSON-serializable for the
+    shared backends (Redis/SQLite) so every worker process can read them.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_seconds: float, tags: Iterable[str] = (),
+            generations: Optional[Dict[str, int]] = None) -> bool:
+        """
+        Stores the entry. With `generations` (from tag_generations), the write is
+        skipped if any tag was invalidated since, by any process sharing the
+        backend. Returns whether the entry was stored.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def tag_generations(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Current generation of each tag; invalidate_tags bumps it."""
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Deletes every entry carrying any of the tags and bumps their generations. Returns the number removed."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> bool:
+        """Cross-process compute lock for a key. Single-process backends always succeed."""
+        return True
+
+    def release_lock(self, key: str):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Per-process LRU with per-key TTL, bounded by entry count and approximate
+    size in bytes. Expired keys are dropped on access and by a sweep thread.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, sweep_interval: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._sweeper: Optional[threading.Thread] = None
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        item = self._cache.pop(key, None)
+        if item is not None:
+            self._bytes -= item["size"]
+            for tag in item["tags"]:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            if item["expires_at"] <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._cache.move_to_end(key)
+            return item["value"]
+
+    def set(self, key: str, value: Any, ttl_seconds: float, tags: Iterable[str] = (),
+            generations: Optional[Dict[str, int]] = None) -> bool:
+        size = _estimate_size(value)
+        tags = tuple(tags)
+        with self._lock:
+            if generations is not None and self._stale(tags, generations):
+                return False
+            self._remove(key)
+            self._cache[key] = {
+                "value": value,
+                "expires_at": time.time() + ttl_seconds,
+                "size": size,
+                "tags": tags
+            }
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._cache and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._cache)))
+                self.evictions += 1
+        self._ensure_sweeper()
+        return True
+
+    def _stale(self, tags: Iterable[str], generations: Dict[str, int]) -> bool:
+        return any(self._generations.get(tag, 0) != generations.get(tag, 0) for tag in tags)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def tag_generations(self, tags: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {tag: self._generations.get(tag, 0) for tag in tags}
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._cache = OrderedDict()
+            self._tags = {}
+            self._bytes = 0
+            # Generations are kept: a load that started before clear() is still stale
+
+    def sweep(self) -> int:
+        """Drops every expired entry. Returns the number removed."""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, item in self._cache.items() if item["expires_at"] <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Cache sweep failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    File-backed cache shared by every worker process on one host.
+    WAL mode lets readers proceed while another worker writes.
+    """
+
+    PRUNE_EVERY = 200 # Writes between prune passes
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.evictions = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_updated_at ON cache_entries (updated_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_locks (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_tags_key ON cache_tags (key)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_tag_generations (tag TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl_seconds: float, tags: Iterable[str] = (),
+            generations: Optional[Dict[str, int]] = None) -> bool:
+        now = time.time()
+        tags = list(tags)
+        conn = self._conn()
+        with conn:
+            # IMMEDIATE takes the write lock first, so no invalidation lands between the check and the write
+            conn.execute("BEGIN IMMEDIATE")
+            if generations is not None and self._read_generations(conn, tags) != {t: generations.get(t, 0) for t in tags}:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl_seconds, now)
+            )
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            conn.executemany("INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", [(t, key) for t in tags])
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(conn)
+        return True
+
+    def _prune(self, conn: sqlite3.Connection):
+        removed = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                "DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_entries ORDER BY updated_at LIMIT ?)",
+                (overflow,)
+            ).rowcount
+        conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+        self.evictions += removed
+
+    def delete(self, key: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+
+    @staticmethod
+    def _read_generations(conn: sqlite3.Connection, tags: List[str]) -> Dict[str, int]:
+        generations = {tag: 0 for tag in tags}
+        if tags:
+            marks = ",".join("?" * len(tags))
+            generations.update(conn.execute(
+                f"SELECT tag, generation FROM cache_tag_generations WHERE tag IN ({marks})", tags
+            ).fetchall())
+        return generations
+
+    def tag_generations(self, tags: Iterable[str]) -> Dict[str, int]:
+        return self._read_generations(self._conn(), list(tags))
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        marks = ",".join("?" * len(tags))
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO cache_tag_generations (tag, generation) VALUES (?, 1) "
+                "ON CONFLICT (tag) DO UPDATE SET generation = generation + 1",
+                [(t,) for t in tags]
+            )
+            keys = [r[0] for r in conn.execute(f"SELECT DISTINCT key FROM cache_tags WHERE tag IN ({marks})", tags)]
+            conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(k,) for k in keys])
+            conn.executemany("DELETE FROM cache_tags WHERE key = ?", [(k,) for k in keys])
+        return len(keys)
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries")
+        conn.execute("DELETE FROM cache_tags")
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_locks WHERE key = ? AND expires_at <= ?", (key, now))
+        return conn.execute(
+            "INSERT OR IGNORE INTO cache_locks (key, expires_at) VALUES (?, ?)", (key, now + ttl_seconds)
+        ).rowcount == 1
+
+    def release_lock(self, key: str):
+        self._conn().execute("DELETE FROM cache_locks WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        return {"entries": entries, "max_entries": self.max_entries, "evictions": self.evictions, "path": self.path}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Cache shared across workers and hosts through any Redis-protocol server.
+    Expiry and eviction are delegated to the server (SET ... EX, maxmemory policy).
+    Guarded writes WATCH the tags' generation counters, so an invalidation from
+    any worker between the check and the write aborts the write.
+    """
+
+    GENERATION_TTL = 7 * 24 * 3600 # Far longer than any load; an expired counter reads as a change
+
+    def __init__(self, url: str = None, client=None, prefix: str = "researchgate:cache:"):
+        # Only needed when CACHE_BACKEND=redis
+        import redis
+        if client is None:
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._watch_error = redis.WatchError
+
+    def _generation_key(self, tag: str) -> str:
+        return self.prefix + "gen:" + tag
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl_seconds: float, tags: Iterable[str] = (),
+            generations: Optional[Dict[str, int]] = None) -> bool:
+        ttl = max(1, int(ttl_seconds))
+        tags = list(tags)
+        with self.client.pipeline() as pipe:
+            try:
+                if generations is not None and tags:
+                    pipe.watch(*(self._generation_key(t) for t in tags))
+                    current = pipe.mget([self._generation_key(t) for t in tags])
+                    if [int(g or 0) for g in current] != [generations.get(t, 0) for t in tags]:
+                        return False
+                    pipe.multi()
+                pipe.set(self.prefix + key, json.dumps(value), ex=ttl)
+                for tag in tags:
+                    # A tag set lives as long as its longest-lived member (EXPIRE GT/NX, Redis 7+)
+                    pipe.sadd(self.prefix + "tag:" + tag, key)
+                    pipe.expire(self.prefix + "tag:" + tag, ttl, gt=True)
+                    pipe.expire(self.prefix + "tag:" + tag, ttl, nx=True)
+                pipe.execute()
+            except self._watch_error:
+                # A tag was invalidated after the check
+                return False
+        return True
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def tag_generations(self, tags: Iterable[str]) -> Dict[str, int]:
+        tags = list(tags)
+        if not tags:
+            return {}
+        current = self.client.mget([self._generation_key(t) for t in tags])
+        return {tag: int(g or 0) for tag, g in zip(tags, current)}
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        # Bump first: a load that reads the entries' old inputs can no longer write
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self._generation_key(tag))
+            pipe.expire(self._generation_key(tag), self.GENERATION_TTL)
+        pipe.execute()
+        tag_keys = [self.prefix + "tag:" + t for t in tags]
+        members = self.client.sunion(tag_keys)
+        keys = [self.prefix + (m.decode() if isinstance(m, bytes) else m) for m in members]
+        self.client.delete(*(keys + tag_keys))
+        return len(keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*", count=500))
+        for i in range(0, len(keys), 500):
+            self.client.delete(*keys[i:i + 500])
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> bool:
+        return bool(self.client.set(self.prefix + "lock:" + key, "1", nx=True, ex=max(1, int(ttl_seconds))))
+
+    def release_lock(self, key: str):
+        self.client.delete(self.prefix + "lock:" + key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"prefix": self.prefix}
+
+
+def create_backend(name: str) -> CacheBackend:
+    """
+    CACHE_BACKEND selects the storage: "memory" (per process), "sqlite" (shared
+    by workers on one host, CACHE_URL is the file path) or "redis" (CACHE_URL is
+    the redis:// URL).
+    """
+    if name == "redis":
+        return RedisBackend(url=settings.CACHE_URL or "redis://localhost:6379/0")
+    if name == "sqlite":
+        return SQLiteBackend(settings.CACHE_URL or "cache.sqlite3", settings.CACHE_MAX_ENTRIES)
+    return MemoryBackend(
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        max_bytes=settings.CACHE_MAX_BYTES,
+        sweep_interval=settings.CACHE_SWEEP_INTERVAL
+    )
+
+
 class SimpleCache:
+    """
+    Process-wide application cache (research gaps, ...).
+
+    Storage is pluggable (see create_backend); routers use the same API whether
+    values live in process memory or in a store shared by every worker.
+    get_or_set() is single-flight: concurrent misses share one computation in
+    this process, and shared backends also hold a cross-process compute lock.
+    Loads don't write back results that a tag invalidation (from any worker
+    sharing the backend) made stale while they ran.
+    Backend errors degrade to cache misses instead of failing the request.
+    """
     _instance = None
-    
+    _instance_lock = threading.Lock()
+
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(SimpleCache, cls).__new__(cls)
-            cls._instance._cache: Dict[str, Dict[str, Any]] = {}
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super(SimpleCache, cls).__new__(cls)
+                instance._setup(create_backend(settings.CACHE_BACKEND))
+                cls._instance = instance
         return cls._instance
 
+    def _setup(self, backend: CacheBackend):
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._counters = {
+            "hits": 0, "misses": 0, "errors": 0, "loads": 0, "coalesced": 0, "invalidations": 0, "stale_loads": 0
+        }
+
+    def use_backend(self, backend: CacheBackend):
+        self._setup(backend)
+
     def get(self, key: str) -> Optional[Any]:
-        if key in self._cache:
-            item = self._cache[key]
-            if item["expires_at"] > time.time():
-                return item["value"]
-            else:
-                del self._cache[key]
-        return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Cache get failed for {key}: {str(e)}")
+            self._counters["errors"] += 1
+            value = None
+        self._counters["hits" if value is not None else "misses"] += 1
+        return value
 
-    def set(self, key: str, value: Any, ttl_seconds: int = 3600):
-        self._cache[key] = {
-            "value": value,
-            "expires_at": time.time() + ttl_seconds
-        }
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600, tags: Iterable[str] = (),
+            generations: Optional[Dict[str, int]] = None) -> bool:
+        """Stores the value; with `generations` (see tag_generations), only if none of its tags was invalidated since."""
+        try:
+            return self.backend.set(key, value, ttl_seconds, tags=tags, generations=generations)
+        except Exception as e:
+            logger.error(f"Cache set failed for {key}: {str(e)}")
+            self._counters["errors"] += 1
+            return False
+
+    def tag_generations(self, tags: Iterable[str]) -> Optional[Dict[str, int]]:
+        try:
+            return self.backend.tag_generations(tags)
+        except Exception as e:
+            logger.error(f"Cache generation read failed for {tags}: {str(e)}")
+            self._counters["errors"] += 1
+            return None
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Drops every cached entry that depends on any of the given tags."""
+        try:
+            removed = self.backend.invalidate_tags(tags)
+        except Exception as e:
+            logger.error(f"Cache invalidation failed for {tags}: {str(e)}")
+            self._counters["errors"] += 1
+            return 0
+        self._counters["invalidations"] += removed
+        return removed
 
     def delete(self, key: str):
-        if key in self._cache:
-            del self._cache[key]
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logger.error(f"Cache delete failed for {key}: {str(e)}")
+            self._counters["errors"] += 1
 
     def clear(self):
-        self._cache = {}
+        self.backend.clear()
+
+    async def _await_other_worker(self, key: str) -> Optional[Any]:
+        # Another process holds the compute lock; poll for its result until the lock would expire
+        deadline = time.time() + settings.CACHE_LOCK_TTL
+        while time.time() < deadline:
+            await asyncio.sleep(0.2)
+            value = self.get(key)
+            if value is not None:
+                return value
+        return None
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl_seconds: int = 3600,
+                         cache_if: Optional[Callable[[Any], bool]] = None, tags: Iterable[str] = ()) -> Any:
+        """
+        Returns the cached value, or runs `loader` once per key and caches its result.
+        Concurrent callers for the same missing key await the same computation.
+        `cache_if` can veto caching a result (e.g. empty fallbacks from a failed AI call).
+        `tags` are the invalidation tags of the inputs the loader reads; they're
+        known up front so their generations can be captured before the load.
+        """
+        tags = list(tags)
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is loop:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        locked = False
+        try:
+            try:
+                locked = self.backend.acquire_lock(key, settings.CACHE_LOCK_TTL)
+            except Exception as e:
+                logger.error(f"Cache lock failed for {key}: {str(e)}")
+                locked = True # Compute locally rather than wait on a broken backend
+
+            value = None if locked else await self._await_other_worker(key)
+            if value is None:
+                self._counters["loads"] += 1
+                generations = self.tag_generations(tags)
+                value = await loader()
+                # A profile write landed mid-computation (in any worker): serve this result but don't cache it
+                if generations is not None and (cache_if is None or cache_if(value)):
+                    if not self.set(key, value, ttl_seconds=ttl_seconds, tags=tags, generations=generations):
+                        self._counters["stale_loads"] += 1
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; mark it retrieved so it isn't logged as unhandled
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if locked:
+                try:
+                    self.backend.release_lock(key)
+                except Exception as e:
+                    logger.error(f"Cache unlock failed for {key}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            backend_stats = self.backend.stats()
+        except Exception as e:
+            backend_stats = {"error": str(e)}
+        return {"backend": type(self.backend).__name__, **self._counters, **backend_stats}
 
 cache = SimpleCache()
@@ -20,6 +20,49 @@ class Settings(BaseSettings):
     TWILIO_WHATSAPP_NUMBER: str = "+12548575066" # User provided number
     TWILIO_CONTACT_NUMBER: str = "+1234567890" # Number for students to contact
 
+    # AI Execution
+    AI_MAX_CONCURRENCY: int = 8 # Max Gemini calls in flight per worker process
+    AI_CALL_TIMEOUT: float = 60.0 # Seconds before a single Gemini call is abandoned
+    GAPS_BATCH_CONCURRENCY: int = 5 # Research-gap generations one batch request runs at once
+
+    # Research Pipeline (bulk ingestion + trend analysis)
+    RESEARCH_PIPELINE_CONCURRENCY: int = 4 # Mentors processed at once
+    RESEARCH_PIPELINE_RATE: float = 30.0 # Max LLM-backed steps started per minute, across all mentors (0 = unlimited)
+
+    # Research Trends
+    TOPIC_SIMILARITY_THRESHOLD: float = 0.7 # Min cosine similarity between a publication and a topic centroid to tag it
+
+    # Background Jobs (app.services.job_queue)
+    JOB_WORKERS: int = 4 # Jobs run concurrently per process (per-type limits apply on top)
+    JOB_POLL_INTERVAL: float = 1.0 # Seconds an idle worker waits before polling the queue again
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 10.0 # Seconds before the first retry; doubles per attempt
+    JOB_LEASE_SECONDS: float = 60.0 # A running job renews its lease every third of this; unrenewed (crashed worker) it is requeued
+
+    # Application Cache (research gaps, ...)
+    CACHE_BACKEND: str = "memory" # memory (per process), sqlite (shared on one host), redis (shared)
+    CACHE_URL: str = "" # sqlite file path or redis:// URL
+    CACHE_LOCK_TTL: float = 120.0 # Max seconds other workers wait for an in-progress computation
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_SWEEP_INTERVAL: float = 60.0 # Seconds between expired-key sweeps
+
+    # LLM Response Cache
+    LLM_CACHE_BACKEND: str = "memory" # memory, database, or none
+    LLM_CACHE_TTL: int = 604800 # 7 days
+    LLM_CACHE_MAX_ENTRIES: int = 5000
+
+    # Matching Engine
+    VECTOR_INDEX_TYPE: str = "auto" # flat, ivf, or auto (ivf from 20k vectors; flat is exact and fast enough below)
+    # IVF buckets scanned per query (of ~sqrt(n)): recall vs latency. Measured recall@50 on
+    # unclustered 20k x 64 vectors: 8 -> 0.29, 32 -> 0.65, 64 -> 0.86 (real embeddings cluster
+    # and reach ~1.0 at 8). Raise it, or use flat, when candidate recall matters more than latency.
+    VECTOR_INDEX_NPROBE: int = 32
+    MATCH_BATCH_TOP_K: int = 50 # Mentors kept per student by the batch precompute
+    MATCH_BATCH_CHUNK_SIZE: int = 1024 # Students scored per task
+    MATCH_BATCH_MENTOR_BLOCK: int = 4096 # Mentors per matrix block (bounds memory per task)
+    MATCH_BATCH_WORKERS: int = 0 # Process pool size; 0 = one per CPU
+
     class Config:
         env_file = ".env"
 
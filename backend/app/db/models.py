@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Text, Table, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Text, Table, DateTime, Float, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.database import Base
@@ -166,6 +166,18 @@ class StudentProfile(Base):
     educations = relationship("Education", back_populates="student_profile", cascade="all, delete-orphan")
     projects = relationship("Project", back_populates="student_profile", cascade="all, delete-orphan")
     publications = relationship("Publication", back_populates="student_profile", cascade="all, delete-orphan")
+    embedding = relationship("StudentEmbedding", back_populates="student", uselist=False, cascade="all, delete-orphan")
+
+class StudentEmbedding(Base):
+    __tablename__ = "student_embeddings"
+
+    student_id = Column(Integer, ForeignKey("student_profiles.id"), primary_key=True)
+    text_hash = Column(String(64), index=True) # sha256 of the exact text that was embedded
+    vector = Column(LargeBinary) # Packed float32 values
+    dimensions = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    student = relationship("StudentProfile", back_populates="embedding")
 
 class WorkExperience(Base):
     __tablename__ = "work_experiences"
@@ -237,6 +249,37 @@ class ResearchTopic(Base):
 
     mentor_trends = relationship("MentorTopicTrend", back_populates="topic")
 
+class PublicationTopic(Base):
+    """Which research topics a publication was tagged with by trend analysis."""
+    __tablename__ = "publication_topics"
+
+    publication_id = Column(Integer, ForeignKey("publications.id"), primary_key=True)
+    topic_id = Column(Integer, ForeignKey("research_topics.id"), primary_key=True, index=True)
+
+    publication = relationship("Publication")
+    topic = relationship("ResearchTopic")
+
+class PublicationEmbedding(Base):
+    __tablename__ = "publication_embeddings"
+
+    publication_id = Column(Integer, ForeignKey("publications.id", ondelete="CASCADE"), primary_key=True)
+    text_hash = Column(String(64), index=True) # sha256 of the title + abstract that was embedded
+    vector = Column(LargeBinary) # Packed float32 values
+    dimensions = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class TopicEmbedding(Base):
+    """Topic vectors publications are tagged against by cosine similarity."""
+    __tablename__ = "topic_embeddings"
+
+    topic_id = Column(Integer, ForeignKey("research_topics.id"), primary_key=True)
+    text_hash = Column(String(64)) # sha256 of the topic name
+    vector = Column(LargeBinary) # Packed float32 embedding of the topic name
+    centroid = Column(LargeBinary) # Mean of the name vector and every tagged publication's (unit) vector
+    member_count = Column(Integer, default=0) # Publications folded into the centroid
+    dimensions = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class MentorTopicTrend(Base):
     __tablename__ = "mentor_topic_trends"
 
@@ -250,6 +293,19 @@ class MentorTopicTrend(Base):
     mentor = relationship("MentorProfile", back_populates="topic_trends")
     topic = relationship("ResearchTopic", back_populates="mentor_trends")
 
+class MentorTopicYearCount(Base):
+    """
+    How many of a mentor's dated publications are tagged with a topic, per year.
+    Kept incrementally as tags are added or removed; MentorTopicTrend rows are
+    derived from these.
+    """
+    __tablename__ = "mentor_topic_year_counts"
+
+    mentor_id = Column(Integer, ForeignKey("mentor_profiles.id"), primary_key=True)
+    topic_id = Column(Integer, ForeignKey("research_topics.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+
 class MentorProfile(Base):
     __tablename__ = "mentor_profiles"
 
@@ -292,6 +348,18 @@ class MentorProfile(Base):
     user = relationship("User", back_populates="mentor_profile")
     publications = relationship("Publication", back_populates="mentor_profile", cascade="all, delete-orphan")
     topic_trends = relationship("MentorTopicTrend", back_populates="mentor", cascade="all, delete-orphan")
+    embedding = relationship("MentorEmbedding", back_populates="mentor", uselist=False, cascade="all, delete-orphan")
+
+class MentorEmbedding(Base):
+    __tablename__ = "mentor_embeddings"
+
+    mentor_id = Column(Integer, ForeignKey("mentor_profiles.id"), primary_key=True)
+    text_hash = Column(String(64), index=True) # sha256 of the exact text that was embedded
+    vector = Column(LargeBinary) # Packed float32 values
+    dimensions = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    mentor = relationship("MentorProfile", back_populates="embedding")
 
 class Skill(Base):
     __tablename__ = "skills"
@@ -538,3 +606,135 @@ class SavedResearchGap(Base):
 
     student = relationship("User", foreign_keys=[student_id])
     mentor = relationship("MentorProfile", foreign_keys=[mentor_id])
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache_entries"
+
+    key = Column(String(64), primary_key=True) # sha256 of model name + prompt
+    model = Column(String)
+    value = Column(Text) # JSON-encoded parsed response
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at = Column(DateTime, index=True)
+
+class MentorMatchScore(Base):
+    """
+    Persisted 3-Lens score for a student's candidate mentors (see StudentMatchState).
+    The fingerprints hash each side's scoring inputs, so a profile write only
+    re-scores the pairs whose inputs actually changed.
+    """
+    __tablename__ = "mentor_match_scores"
+    __table_args__ = (
+        Index("ix_mentor_match_scores_student_score", "student_id", "match_score"),
+    )
+
+    student_id = Column(Integer, ForeignKey("student_profiles.id"), primary_key=True)
+    mentor_id = Column(Integer, ForeignKey("mentor_profiles.id"), primary_key=True, index=True)
+    match_score = Column(Float) # Final score (0-100)
+    semantic_score = Column(Float) # Lens 2 cosine similarity (0-1)
+    alignment_score = Column(Float) # Lens 3 points (0-40)
+    student_fingerprint = Column(String(64))
+    mentor_fingerprint = Column(String(64))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    student = relationship("StudentProfile")
+    mentor = relationship("MentorProfile")
+
+class StudentMatchState(Base):
+    """
+    What a student's mentor_match_scores rows cover: their best `candidate_count`
+    candidate mentors, or every Lens-1 eligible mentor when `complete`. Eligible
+    pairs without a row were pruned, not missed, so they're never treated as stale.
+    """
+    __tablename__ = "student_match_states"
+
+    student_id = Column(Integer, ForeignKey("student_profiles.id"), primary_key=True)
+    student_fingerprint = Column(String(64)) # Profile the row set was built for
+    candidate_count = Column(Integer, default=0) # Reads up to this many rows are exact
+    complete = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class MentorDomainTaxonomy(Base):
+    """
+    Lens 1 input for a mentor: preferred_backgrounds normalized (lowercased,
+    aliases expanded) once per mentor write instead of once per match.
+    """
+    __tablename__ = "mentor_domain_taxonomies"
+
+    mentor_id = Column(Integer, ForeignKey("mentor_profiles.id"), primary_key=True)
+    terms = Column(Text) # JSON list of normalized background terms; NULL = open to every major
+    source = Column(Text) # The preferred_backgrounds value the terms were computed from
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    mentor = relationship("MentorProfile")
+
+class AIJob(Base):
+    """
+    A queued long-running task (LLM generation, publication ingestion, ...).
+    Rows are claimed by the job workers in app.services.job_queue and polled
+    by clients through GET /jobs/{id}.
+    """
+    __tablename__ = "ai_jobs"
+    __table_args__ = (
+        Index("ix_ai_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, index=True) # Registered handler name, e.g. "cover_letter"
+    status = Column(String, default="queued") # queued, running, succeeded, failed
+    payload = Column(Text) # JSON handler arguments
+    result = Column(Text, nullable=True) # JSON handler return value
+    progress = Column(Text, nullable=True) # JSON progress a long handler reports while running
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True) # Who may poll it
+    created_at = Column(DateTime, default=datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.utcnow) # Retry backoff: not claimed before this
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True) # Renewed while running; expired leases are requeued
+
+    user = relationship("User")
+
+
+class ScheduledJob(Base):
+    """
+    One row per singleton job key (e.g. the yearly trend refresh), pointing at
+    the job last queued under it. JobQueue.enqueue_unique claims the key with a
+    conditional UPDATE, so every worker process can schedule it at startup and
+    only one job is queued.
+    """
+    __tablename__ = "scheduled_jobs"
+
+    key = Column(String, primary_key=True)
+    job_id = Column(Integer, ForeignKey("ai_jobs.id"), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DataVersion(Base):
+    """
+    Write counter for data that process-wide caches are built from (e.g. the
+    opportunity skill matrix). Writers bump it, so other processes notice edits
+    that a row count or max id can't reveal.
+    """
+    __tablename__ = "data_versions"
+
+    key = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ResearchPipelineState(Base):
+    """
+    Per-mentor checkpoint of the bulk ingestion / trend-analysis pipeline.
+    A mentor is due again when it has no publications or its publication count
+    changed since the last analysis, so an interrupted run resumes where it stopped.
+    """
+    __tablename__ = "research_pipeline_states"
+
+    mentor_id = Column(Integer, ForeignKey("mentor_profiles.id"), primary_key=True)
+    ingested_at = Column(DateTime, nullable=True)
+    analyzed_at = Column(DateTime, nullable=True)
+    publication_count = Column(Integer, default=0) # Publications the last analysis saw
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    mentor = relationship("MentorProfile")
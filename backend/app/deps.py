@@ -7,6 +7,7 @@ from app.db.database import get_db
 from app.db.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
@@ -26,3 +27,15 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if user is None:
         raise credentials_exception
     return user
+
+def get_current_user_optional(token: str = Depends(oauth2_scheme_optional), db: Session = Depends(get_db)):
+    """
+    Like get_current_user, but returns None for anonymous requests and for
+    stale or invalid tokens, so public endpoints don't start answering 401.
+    """
+    if token is None:
+        return None
+    try:
+        return get_current_user(token, db)
+    except HTTPException:
+        return None
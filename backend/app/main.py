@@ -20,9 +20,13 @@ from app.api.analytics import router as analytics_router
 from app.api.resume import router as resume_router
 from app.api.ai import router as ai_router
 from app.api.matches import router as matches_router
-from app.api.intelligence import router as intelligence_router
+from app.api.intelligence import router as intelligence_router, schedule_trend_refresh
 from app.api.realworld import router as realworld_router
+from app.api.jobs import router as jobs_router
 from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.embedding_store import EmbeddingStore
+from app.services.job_queue import JobQueue
 import logging
 
 
@@ -85,6 +89,35 @@ app.include_router(ai_router, prefix="/ai", tags=["AI Features"])
 app.include_router(matches_router, prefix="/matches", tags=["Matching Engine"])
 app.include_router(intelligence_router, prefix="/intelligence", tags=["Research Intelligence"])
 app.include_router(realworld_router, prefix="/realworld", tags=["Real World & Beehive"])
+app.include_router(jobs_router, prefix="/jobs", tags=["Background Jobs"])
+
+@app.on_event("startup")
+def build_vector_indexes():
+    # Matching falls back to a full scan if the index can't be built
+    db = SessionLocal()
+    try:
+        index = EmbeddingStore.build_mentor_index(db)
+        logger.info(f"Mentor vector index ready: {type(index).__name__} with {len(index)} vectors")
+        index = EmbeddingStore.build_student_index(db)
+        logger.info(f"Student vector index ready: {type(index).__name__} with {len(index)} vectors")
+    except Exception as e:
+        logger.warning(f"Could not build vector indexes: {str(e)}")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def start_job_workers():
+    JobQueue.start()
+    # Keeps the yearly trend-status refresh scheduled
+    db = SessionLocal()
+    try:
+        schedule_trend_refresh(db)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await JobQueue.stop()
 
 @app.get("/")
 def root():
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, HttpUrl
-from typing import Optional, List
+from typing import Any, Optional, List
 from enum import Enum
 from datetime import datetime
 
@@ -393,10 +393,18 @@ class OpportunityResponse(OpportunityBase):
     created_at: datetime
     required_skills: List[OpportunitySkillResponse] = []
     mentor: Optional[UserResponse] = None
+    # Only set when listing with with_match=true
+    match_score: Optional[float] = None
+    match_summary: Optional[dict] = None
     
     class Config:
         from_attributes = True
 
+class OpportunityRecommendation(BaseModel):
+    opportunity: OpportunityResponse
+    match_score: float
+    details: dict
+
 # --- Application Schemas ---
 class ApplicationBase(BaseModel):
     cover_letter: Optional[str] = None
@@ -424,3 +432,23 @@ class ApplicationResponse(ApplicationBase):
 
     class Config:
         from_attributes = True
+
+# --- Background Job Schemas ---
+class JobAcceptedResponse(BaseModel):
+    # 202 body of an endpoint that queued its work; poll status_url (a JobResponse)
+    job_id: int
+    status: str
+    status_url: str
+    message: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: int
+    type: str
+    status: str # queued, running, succeeded, failed
+    result: Optional[Any] = None
+    progress: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# The Gemini SDK is synchronous. Every call goes through this dedicated pool so a slow
+# LLM request never blocks the event loop or starves the default executor used by the
+# rest of the app. Threads outlive a timed-out await, hence the extra headroom.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.AI_MAX_CONCURRENCY * 2,
+    thread_name_prefix="ai-worker"
+)
+
+_semaphore = None
+_semaphore_loop = None
+
+_stats = {
+    "calls": 0,
+    "errors": 0,
+    "timeouts": 0,
+    "in_flight": 0,
+    "started_at": time.time(),
+}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+async def run(fn, *args, timeout: float = None, **kwargs):
+    """
+    Runs a blocking AI SDK call on the AI thread pool.
+    At most AI_MAX_CONCURRENCY calls are in flight per process; each call is
+    bounded by `timeout` (AI_CALL_TIMEOUT by default) and raises asyncio.TimeoutError.
+    """
+    timeout = timeout or settings.AI_CALL_TIMEOUT
+    async with _get_semaphore():
+        _stats["calls"] += 1
+        _stats["in_flight"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            return await asyncio.wait_for(loop.run_in_executor(_executor, call), timeout)
+        except asyncio.TimeoutError:
+            _stats["timeouts"] += 1
+            logger.error(f"AI call {getattr(fn, '__name__', fn)} timed out after {timeout}s")
+            raise
+        except Exception:
+            _stats["errors"] += 1
+            raise
+        finally:
+            _stats["in_flight"] -= 1
+
+async def stream(fn, *args, timeout: float = None, **kwargs):
+    """
+    Async-iterates a blocking SDK call that returns an iterator (e.g. a streamed
+    generate_content). The iteration runs on the AI thread pool and items are
+    handed over as they arrive. Shares the AI_MAX_CONCURRENCY slots with run();
+    the whole stream is bounded by `timeout` and raises asyncio.TimeoutError.
+    """
+    timeout = timeout or settings.AI_CALL_TIMEOUT
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in fn(*args, **kwargs):
+                if stopped.is_set(): # Consumer went away (client disconnected, timeout)
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (done, e))
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+
+    async with _get_semaphore():
+        _stats["calls"] += 1
+        _stats["in_flight"] += 1
+        deadline = loop.time() + timeout
+        try:
+            loop.run_in_executor(_executor, produce)
+            while True:
+                item, error = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        except asyncio.TimeoutError:
+            _stats["timeouts"] += 1
+            logger.error(f"AI stream {getattr(fn, '__name__', fn)} timed out after {timeout}s")
+            raise
+        except Exception:
+            _stats["errors"] += 1
+            raise
+        finally:
+            stopped.set()
+            _stats["in_flight"] -= 1
+
+def stats() -> dict:
+    """Counters for monitoring AI usage (calls, errors, timeouts, in-flight)."""
+    return dict(_stats)
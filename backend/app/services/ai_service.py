@@ -1,8 +1,12 @@
 import google.generativeai as genai
 from app.core.config import settings
+from app.services import ai_executor
+from app.services.llm_cache import llm_cache
+import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
+from typing import Optional
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,11 +18,89 @@ if settings.GEMINI_API_KEY:
 # Use Gemini 1.5 Flash
 MODEL_NAME = "gemini-2.5-flash" 
 
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_DIM = 768 # Size of the fallback vector
+EMBEDDING_BATCH_SIZE = 100 # Max texts per batchEmbedContents request
+EMBEDDING_COALESCE_WINDOW = 0.005 # Seconds to wait for concurrent get_embedding calls to share a batch
+
 def get_model():
     if not settings.GEMINI_API_KEY:
         raise Exception("GEMINI_API_KEY is not set in the environment variables.")
     return genai.GenerativeModel(MODEL_NAME)
 
+async def _generate_content(model, prompt: str):
+    """
+    Runs the blocking generate_content call on the AI executor, so it never
+    stalls the event loop and is bounded by the per-call timeout.
+    """
+    return await ai_executor.run(
+        model.generate_content,
+        prompt,
+        request_options={"timeout": settings.AI_CALL_TIMEOUT}
+    )
+
+def _parse_json_response(text: str):
+    # Clean up response text to ensure it's valid JSON
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text)
+
+async def _cached_generate(model, prompt: str, parse=None):
+    """
+    generate_content behind the content-addressed LLM cache (model name + prompt).
+    Only successfully parsed responses are stored, so failures are retried.
+    """
+    key = llm_cache.make_key(MODEL_NAME, prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await _generate_content(model, prompt)
+    result = parse(response.text) if parse else response.text.strip()
+    llm_cache.set(key, MODEL_NAME, result)
+    return result
+
+def _chunk_text(chunk) -> str:
+    # Chunks without text parts (e.g. a safety-blocked tail) raise on .text
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+async def _stream_generate(model, prompt: str, parse=None):
+    """
+    Streaming counterpart of _cached_generate. Yields ("token", text) as chunks
+    arrive, then ("result", value) with the full (parsed) response, which is
+    written to the same LLM cache entry. A cache hit is replayed at once.
+    """
+    key = llm_cache.make_key(MODEL_NAME, prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        if isinstance(cached, str):
+            yield "token", cached
+        yield "result", cached
+        return
+
+    parts = []
+    async for chunk in ai_executor.stream(
+        model.generate_content,
+        prompt,
+        stream=True,
+        request_options={"timeout": settings.AI_CALL_TIMEOUT}
+    ):
+        text = _chunk_text(chunk)
+        if text:
+            parts.append(text)
+            yield "token", text
+
+    full_text = "".join(parts)
+    result = parse(full_text) if parse else full_text.strip()
+    llm_cache.set(key, MODEL_NAME, result)
+    yield "result", result
+
 async def analyze_match(resume_text: str, job_description: str) -> dict:
     """
     Analyzes the match between a resume and a job description.
@@ -44,16 +126,7 @@ async def analyze_match(resume_text: str, job_description: str) -> dict:
         Output ONLY the JSON.
         """
         
-        response = model.generate_content(prompt)
-        
-        # Clean up response text to ensure it's valid JSON
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        return await _cached_generate(model, prompt, parse=_parse_json_response)
         
     except Exception as e:
         logger.error(f"Error in analyze_match: {str(e)}")
@@ -71,10 +144,11 @@ async def analyze_match(resume_text: str, job_description: str) -> dict:
             "explanation": "Could not analyze match due to an internal error."
         }
 
-async def generate_improvement_plan(resume_text: str, job_description: str, days_remaining: int) -> list:
+async def generate_improvement_plan(resume_text: str, job_description: str, days_remaining: int, raise_errors: bool = False) -> list:
     """
     Generates a detailed, step-by-step improvement plan based on the resume and job description.
     Returns a list of plan items with estimated hours and deadlines.
+    raise_errors=True re-raises instead of returning the fallback (job queue retries).
     """
     try:
         model = get_model()
@@ -108,29 +182,16 @@ async def generate_improvement_plan(resume_text: str, job_description: str, days
         Output ONLY the JSON ARRAY.
         """
         
-        response = model.generate_content(prompt)
-        
-        # Clean up response text to ensure it's valid JSON
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        return await _cached_generate(model, prompt, parse=_parse_json_response)
         
     except Exception as e:
         logger.error(f"Error in generate_improvement_plan: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-async def generate_cover_letter(resume_text: str, job_description: str) -> str:
-    """
-    Generates a custom cover letter based on the resume and job description.
-    """
-    try:
-        model = get_model()
-        
-        prompt = f"""
+def _cover_letter_prompt(resume_text: str, job_description: str) -> str:
+    return f"""
         You are a professional career coach. Write a compelling, personalized cover letter for the candidate based on their Resume and the Job Description below.
         
         Job Description:
@@ -147,45 +208,157 @@ async def generate_cover_letter(resume_text: str, job_description: str) -> str:
         
         Output ONLY the cover letter text.
         """
+
+async def generate_cover_letter(resume_text: str, job_description: str, raise_errors: bool = False) -> str:
+    """
+    Generates a custom cover letter based on the resume and job description.
+    raise_errors=True re-raises instead of returning the fallback (job queue retries).
+    """
+    try:
+        model = get_model()
         
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        prompt = _cover_letter_prompt(resume_text, job_description)
+        
+        return await _cached_generate(model, prompt)
         
     except Exception as e:
         logger.error(f"Error in generate_cover_letter: {str(e)}")
+        if raise_errors:
+            raise
         if "GEMINI_API_KEY is not set" in str(e):
              return "Please add GEMINI_API_KEY to your .env file to enable AI features."
         return "Error generating cover letter. Please try again later."
 
+async def stream_cover_letter(resume_text: str, job_description: str):
+    """
+    Streaming generate_cover_letter: yields ("token", text) chunks, then
+    ("result", cover_letter), or ("error", message) if generation fails.
+    """
+    try:
+        model = get_model()
+        prompt = _cover_letter_prompt(resume_text, job_description)
+        async for event in _stream_generate(model, prompt):
+            yield event
+    except Exception as e:
+        logger.error(f"Error in stream_cover_letter: {str(e)}")
+        if "GEMINI_API_KEY is not set" in str(e):
+            yield "error", "Please add GEMINI_API_KEY to your .env file to enable AI features."
+        else:
+            yield "error", "Error generating cover letter. Please try again later."
+
+def _embed_batch_sync(texts: list[str]) -> list:
+    # Blocking SDK call; always run via a worker thread
+    result = genai.embed_content(
+        model=EMBEDDING_MODEL,
+        content=texts,
+        task_type="retrieval_document",
+        title="Matching Embedding"
+    )
+    return result['embedding']
+
+async def get_embeddings(texts: list[str]) -> list:
+    """
+    Generates vector embeddings for many texts at once.
+    Identical texts are embedded once, requests are split into provider-sized
+    batches and the blocking SDK calls run off the event loop.
+    Returns one vector per input text, in order ([] for empty texts).
+    """
+    unique = list(dict.fromkeys(t for t in texts if t))
+    if not unique:
+        return [[] for _ in texts]
+
+    if not settings.GEMINI_API_KEY:
+        # Return dummy zero vectors if no API key (for dev/testing without key)
+        logger.warning("GEMINI_API_KEY not set. Returning dummy embeddings.")
+        return [[0.0] * EMBEDDING_DIM if t else [] for t in texts]
+
+    async def embed_batch(batch: list[str]) -> list:
+        try:
+            return await ai_executor.run(_embed_batch_sync, batch)
+        except Exception as e:
+            logger.error(f"Error in get_embeddings: {str(e)}")
+            return [[0.0] * EMBEDDING_DIM for _ in batch] # Fallback
+
+    batches = [unique[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(unique), EMBEDDING_BATCH_SIZE)]
+    results = await asyncio.gather(*(embed_batch(b) for b in batches))
+
+    vectors = {}
+    for batch, batch_vectors in zip(batches, results):
+        vectors.update(zip(batch, batch_vectors))
+    return [list(vectors[t]) if t else [] for t in texts]
+
+class EmbeddingCoalescer:
+    """
+    Micro-batcher for single-text embedding requests.
+    Calls that arrive within `window` seconds of each other are merged into
+    one get_embeddings() batch; a full batch is flushed immediately.
+    """
+
+    def __init__(self, window: float = EMBEDDING_COALESCE_WINDOW, max_batch: int = EMBEDDING_BATCH_SIZE):
+        self.window = window
+        self.max_batch = max_batch
+        self._loop = None
+        self._pending = {}
+        self._flush_handle = None
+
+    async def submit(self, text: str) -> list:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Pending futures are bound to their loop; start fresh on a new one
+            self._loop = loop
+            self._pending = {}
+            self._flush_handle = None
+
+        future = loop.create_future()
+        self._pending.setdefault(text, []).append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            self._loop.create_task(self._run(pending))
+
+    async def _run(self, pending: dict):
+        texts = list(pending)
+        try:
+            vectors = await get_embeddings(texts)
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for text, vec in zip(texts, vectors):
+            for future in pending[text]:
+                if not future.done():
+                    future.set_result(list(vec))
+
+_embedding_coalescer = EmbeddingCoalescer()
+
 async def get_embedding(text: str) -> list:
     """
     Generates a vector embedding for the given text using Gemini.
+    Concurrent calls are coalesced into a single batch request.
     """
     if not text:
         return []
-    try:
-        if not settings.GEMINI_API_KEY:
-             # Return a dummy zero vector if no API key (for dev/testing without key)
-             # In production, this should raise an error or be handled
-             logger.warning("GEMINI_API_KEY not set. Returning dummy embedding.")
-             return [0.0] * 768 
-
-        # Use the embedding model
-        result = genai.embed_content(
-            model="models/gemini-embedding-001",
-            content=text,
-            task_type="retrieval_document",
-            title="Matching Embedding"
-        )
-        return result['embedding']
-    except Exception as e:
-        logger.error(f"Error in get_embedding: {str(e)}")
-        return [0.0] * 768 # Fallback
+    return await _embedding_coalescer.submit(text)
 
-async def generate_simulated_publications(mentor_name: str, research_areas: str, bio: str) -> list:
+async def generate_simulated_publications(mentor_name: str, research_areas: str, bio: str, raise_errors: bool = False) -> list:
     """
     Generates a list of simulated recent publications for a mentor based on their profile.
     Used for the 'Ingestion' phase demo to populate the database with realistic data.
+    raise_errors=True re-raises instead of returning the fallback (job queue retries).
     """
     try:
         model = get_model()
@@ -214,21 +387,18 @@ async def generate_simulated_publications(mentor_name: str, research_areas: str,
         Output ONLY the JSON ARRAY.
         """
         
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        response = await _generate_content(model, prompt)
+        return _parse_json_response(response.text)
     except Exception as e:
         logger.error(f"Error in generate_simulated_publications: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-async def extract_research_topics(abstracts: list[str]) -> list[str]:
+async def extract_research_topics(abstracts: list[str], raise_errors: bool = False) -> list[str]:
     """
     Extracts high-level research topics from a list of abstracts.
+    raise_errors=True re-raises instead of returning the fallback (job queue retries).
     """
     try:
         model = get_model()
@@ -248,32 +418,30 @@ async def extract_research_topics(abstracts: list[str]) -> list[str]:
         Output ONLY the JSON ARRAY.
         """
         
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        return await _cached_generate(model, prompt, parse=_parse_json_response)
     except Exception as e:
         logger.error(f"Error in extract_research_topics: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-async def generate_research_gaps(mentor_name: str, mentor_domains: list[str], student_skills: list[str], mentor_abstracts: list[str]) -> list:
+async def generate_research_gaps(mentor_name: Optional[str], mentor_domains: list[str], student_skills: list[str],
+                                 mentor_abstracts: list[str], raise_errors: bool = False) -> list:
     """
     Identifies research gaps by combining mentor domains with student skills (method-domain gaps).
+    raise_errors=True re-raises instead of returning the fallback (per-pair errors in /gaps/batch).
     """
     try:
         model = get_model()
         
         # Context preparation
+        lab = f"Professor {mentor_name}'s lab" if mentor_name else "the mentor's lab"
         domains_str = ", ".join(mentor_domains)
         skills_str = ", ".join(student_skills)
         abstracts_context = "\n".join(mentor_abstracts[:5]) # Use top 5 recent abstracts for context
         
         prompt = f"""
-        You are a PhD Research Advisor. Your goal is to suggest 3 novel "Research Gaps" for a student applying to Professor {mentor_name}'s lab.
+        You are a PhD Research Advisor. Your goal is to suggest 3 novel "Research Gaps" for a student applying to {lab}.
         
         Context:
         - Mentor's Active Research Domains: {domains_str}
@@ -301,43 +469,33 @@ async def generate_research_gaps(mentor_name: str, mentor_domains: list[str], st
         Output ONLY the JSON ARRAY.
         """
         
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        response = await _generate_content(model, prompt)
+        return _parse_json_response(response.text)
     except Exception as e:
         logger.error(f"Error in generate_research_gaps: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-async def generate_proposal_guidance(student_profile: dict, mentor_profile: dict, research_gap: dict) -> dict:
-    """
-    Generates structured proposal guidance, supervisor talking points, and a readiness check.
-    """
-    try:
-        model = get_model()
-
-        student_context = f"""
+def _proposal_guidance_prompt(student_profile: dict, mentor_profile: dict, research_gap: dict) -> str:
+    student_context = f"""
         Skills: {', '.join(student_profile.get('skills', []))}
         Degree: {student_profile.get('degree', 'N/A')}
         Major: {student_profile.get('major', 'N/A')}
         Bio: {student_profile.get('bio', 'N/A')}
         """
 
-        mentor_context = f"""
+    mentor_context = f"""
         Name: {mentor_profile.get('name', 'N/A')}
         Research Areas: {mentor_profile.get('research_areas', 'N/A')}
         """
 
-        gap_context = f"""
+    gap_context = f"""
         Gap Title: {research_gap.get('title', 'N/A')}
         Gap Description: {research_gap.get('description', 'N/A')}
         """
 
-        prompt = f"""
+    return f"""
         You are a PhD Application Strategist. Help a student prepare a research proposal direction for a specific mentor.
 
         Student Profile:
@@ -372,17 +530,22 @@ async def generate_proposal_guidance(student_profile: dict, mentor_profile: dict
         Output ONLY the JSON object.
         """
 
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
+async def generate_proposal_guidance(student_profile: dict, mentor_profile: dict, research_gap: dict, raise_errors: bool = False) -> dict:
+    """
+    Generates structured proposal guidance, supervisor talking points, and a readiness check.
+    raise_errors=True re-raises instead of returning the fallback (job queue retries).
+    """
+    try:
+        model = get_model()
+
+        prompt = _proposal_guidance_prompt(student_profile, mentor_profile, research_gap)
 
-        return json.loads(text)
+        return await _cached_generate(model, prompt, parse=_parse_json_response)
 
     except Exception as e:
         logger.error(f"Error in generate_proposal_guidance: {str(e)}")
+        if raise_errors:
+            raise
         return {
             "proposal_direction": {
                 "problem_statement": "Error generating guidance.",
@@ -398,3 +561,20 @@ async def generate_proposal_guidance(student_profile: dict, mentor_profile: dict
                 "suggestions": ["Please try again later."]
             }
         }
+
+async def stream_proposal_guidance(student_profile: dict, mentor_profile: dict, research_gap: dict):
+    """
+    Streaming generate_proposal_guidance: yields ("token", text) chunks of the
+    JSON as it is written, then ("result", guidance dict), or ("error", message).
+    """
+    try:
+        model = get_model()
+        prompt = _proposal_guidance_prompt(student_profile, mentor_profile, research_gap)
+        async for event in _stream_generate(model, prompt, parse=_parse_json_response):
+            yield event
+    except Exception as e:
+        logger.error(f"Error in stream_proposal_guidance: {str(e)}")
+        if "GEMINI_API_KEY is not set" in str(e):
+            yield "error", "Please add GEMINI_API_KEY to your .env file to enable AI features."
+        else:
+            yield "error", "Error generating guidance. Please try again later."
@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session, selectinload
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+from app.services.domain_filter import DomainFilter
+from app.services.embedding_store import EmbeddingStore, decode_vector
+from app.services.match_scores import mentor_fingerprint, student_fingerprint
+from app.services.matching_engine import MatchingEngine, MATCH_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Mentor-side arrays, shared read-only by every chunk a worker scores
+_mentor_state: Optional[Dict[str, np.ndarray]] = None
+
+
+def _init_worker(state: Dict[str, np.ndarray]):
+    global _mentor_state
+    _mentor_state = state
+
+def _merge_top_k(best: tuple, block: tuple, k: int) -> tuple:
+    # Keep the k best columns per row across the running best and a new block
+    final, sim, align, idx = (np.concatenate([b, n], axis=1) for b, n in zip(best, block))
+    if final.shape[1] > k:
+        part = np.argpartition(-final, k - 1, axis=1)[:, :k]
+        final, sim, align, idx = (np.take_along_axis(a, part, axis=1) for a in (final, sim, align, idx))
+    return final, sim, align, idx
+
+def _score_chunk(task: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Scores one chunk of students against every mentor, one mentor block at a time.
+    Same formula as MatchingEngine._score_batch, written as whole-matrix operations.
+    Returns the top_k (final, semantic, alignment, mentor index) per student.
+    """
+    m = _mentor_state
+    k = int(task["top_k"])
+    n = len(task["student_ids"])
+    eligible = task["eligibility"][task["major_codes"]] # LENS 1 rows for this chunk (n x M)
+    empty = np.empty((n, 0), dtype=np.float32)
+    best = (empty, empty, empty, np.empty((n, 0), dtype=np.int64))
+
+    for start in range(0, len(m["ids"]), int(m["block"])):
+        end = min(start + int(m["block"]), len(m["ids"]))
+
+        # LENS 2: cosine similarity as one matrix product
+        sim = task["matrix"] @ m["matrix"][start:end].T
+
+        # LENS 3: academic fit, skill overlap and availability as broadcasts
+        level = np.where(m["is_academic"][None, start:end], task["academic_fit"][:, None], task["industry_fit"][:, None])
+        counts = m["requirement_counts"][None, start:end]
+        overlap = np.divide(
+            task["skills"] @ m["requirements"][start:end].T, counts,
+            out=np.ones((n, end - start), dtype=np.float32), where=counts > 0 # No expectations: full points
+        )
+        align = level + 20 * overlap + m["accepting"][None, start:end]
+
+        final = np.minimum(100.0, sim * 100 * 0.6 + align)
+        final = np.where(eligible[:, start:end] & (final > MATCH_THRESHOLD), final, -np.inf).astype(np.float32)
+        idx = np.broadcast_to(np.arange(start, end, dtype=np.int64), final.shape)
+        best = _merge_top_k(best, (final, sim.astype(np.float32), align.astype(np.float32), idx), k)
+
+    final, sim, align, idx = best
+    return {"student_ids": task["student_ids"], "final": final, "semantic": sim, "alignment": align, "mentor_index": idx}
+
+
+class BatchMatcher:
+    """
+    Precomputes every student's top-K mentors into mentor_match_scores.
+
+    Students are streamed in chunks; each chunk is scored against all mentors
+    as blocked matrix products (Lens 1 and Lens 3 as bulk masks) on a process
+    pool, and only the top-K rows per student are written back. Online reads
+    (MatchScoreStore.top_matches) then never score anything on the request path
+    for limits up to K; student_match_states records that each list is a top-K.
+    """
+
+    def __init__(self, db: Session, top_k: int = None, chunk_size: int = None,
+                 mentor_block: int = None, workers: int = None):
+        self.db = db
+        self.top_k = top_k or settings.MATCH_BATCH_TOP_K
+        self.chunk_size = chunk_size or settings.MATCH_BATCH_CHUNK_SIZE
+        self.mentor_block = mentor_block or settings.MATCH_BATCH_MENTOR_BLOCK
+        self.workers = workers or settings.MATCH_BATCH_WORKERS or os.cpu_count() or 1
+        self.mentors: List[models.MentorProfile] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.major_codes: Dict[Optional[str], int] = {}
+        self.eligibility_rows: List[np.ndarray] = []
+
+    def _active_mentors(self) -> List[models.MentorProfile]:
+        return MatchingEngine.mentor_pool_query(self.db).order_by(models.MentorProfile.id).all()
+
+    def _student_pages(self):
+        # Keyset pagination keeps memory flat however many students there are
+        last_id = 0
+        while True:
+            page = self.db.query(models.StudentProfile).join(models.User).filter(
+                models.User.is_active == True,
+                models.StudentProfile.id > last_id
+            ).options(selectinload(models.StudentProfile.projects)).order_by(models.StudentProfile.id).limit(self.chunk_size).all()
+            if not page:
+                return
+            last_id = page[-1].id
+            yield page
+
+    async def backfill_embeddings(self):
+        """Embeds every profile whose text changed since its vector was stored."""
+        await EmbeddingStore.load_mentor_vectors(self.db, self._active_mentors())
+        for page in self._student_pages():
+            await EmbeddingStore.load_student_vectors(self.db, page)
+            self.db.expunge_all()
+
+    def _stored_vectors(self, model, owner_field: str, ids: List[int]) -> Dict[int, List[float]]:
+        owner_col = getattr(model, owner_field)
+        return {r[0]: decode_vector(r.vector) for r in self.db.query(owner_col, model.vector).filter(owner_col.in_(ids))}
+
+    def _build_mentor_state(self) -> Dict[str, np.ndarray]:
+        self.mentors = self._active_mentors()
+        self.domain_index = DomainFilter.get_index(self.db)
+        mentors = self.mentors
+        vectors = self._stored_vectors(models.MentorEmbedding, "mentor_id", [m.id for m in mentors])
+
+        requirement_sets = [MatchingEngine._mentor_requirement_set(m) for m in mentors]
+        for reqs in requirement_sets:
+            for token in reqs:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+        requirements = np.zeros((len(mentors), len(self.vocabulary)), dtype=np.float32)
+        for row, reqs in enumerate(requirement_sets):
+            requirements[row, [self.vocabulary[t] for t in reqs]] = 1.0
+
+        return {
+            "ids": np.array([m.id for m in mentors], dtype=np.int64),
+            "matrix": MatchingEngine._normalized_matrix([vectors.get(m.id) for m in mentors]),
+            "is_academic": np.array([m.mentor_type == 'academic_supervisor' for m in mentors], dtype=bool),
+            "accepting": np.array([{'Yes': 10.0, 'Maybe': 5.0}.get(m.accepting_phd_students, 0.0) for m in mentors], dtype=np.float32),
+            "requirements": requirements,
+            "requirement_counts": requirements.sum(axis=1),
+            "block": np.int64(self.mentor_block)
+        }
+
+    def _major_code(self, major: Optional[str]) -> int:
+        # LENS 1 only depends on the student's major: one eligibility row per distinct major
+        code = self.major_codes.get(major)
+        if code is None:
+            code = len(self.major_codes)
+            self.major_codes[major] = code
+            self.eligibility_rows.append(np.array([
+                MatchingEngine._mentor_admits(self.domain_index, major, m) for m in self.mentors
+            ], dtype=bool))
+        return code
+
+    def _chunk_task(self, students: List[models.StudentProfile], dim: int) -> Dict[str, np.ndarray]:
+        vectors = self._stored_vectors(models.StudentEmbedding, "student_id", [s.id for s in students])
+        skills = np.zeros((len(students), len(self.vocabulary)), dtype=np.float32)
+        for row, student in enumerate(students):
+            cols = [self.vocabulary[t] for t in MatchingEngine._student_skill_set(student) if t in self.vocabulary]
+            skills[row, cols] = 1.0
+
+        codes = np.array([self._major_code(s.major) for s in students], dtype=np.int64)
+        used = np.unique(codes)
+        return {
+            "student_ids": np.array([s.id for s in students], dtype=np.int64),
+            "matrix": MatchingEngine._normalized_matrix([vectors.get(s.id) for s in students], dim),
+            "academic_fit": np.array([10.0 if s.is_phd_seeker else 5.0 if s.degree and "master" in s.degree.lower() else 0.0 for s in students], dtype=np.float32),
+            "industry_fit": np.array([10.0 if s.projects else 0.0 for s in students], dtype=np.float32),
+            "skills": skills,
+            # Only ship the eligibility rows this chunk uses, re-indexed to 0..len(used)
+            "eligibility": np.stack([self.eligibility_rows[c] for c in used]),
+            "major_codes": np.searchsorted(used, codes),
+            "top_k": np.int64(self.top_k)
+        }
+
+    def _persist(self, result: Dict[str, np.ndarray], student_fps: Dict[int, str], mentor_fps: List[str]) -> int:
+        table = models.MentorMatchScore.__table__
+        states = models.StudentMatchState.__table__
+        now = datetime.utcnow()
+        rows, state_rows = [], []
+        for i, student_id in enumerate(result["student_ids"].tolist()):
+            student_fp = student_fps.pop(student_id)
+            kept = np.flatnonzero(np.isfinite(result["final"][i]))
+            # Exact top-K over every eligible mentor; complete when fewer than K qualified
+            state_rows.append({
+                "student_id": student_id,
+                "student_fingerprint": student_fp,
+                "candidate_count": self.top_k,
+                "complete": len(kept) < self.top_k,
+                "updated_at": now
+            })
+            for j in kept:
+                mentor_row = int(result["mentor_index"][i, j])
+                rows.append({
+                    "student_id": student_id,
+                    "mentor_id": self.mentors[mentor_row].id,
+                    "match_score": float(result["final"][i, j]),
+                    "semantic_score": float(result["semantic"][i, j]),
+                    "alignment_score": float(result["alignment"][i, j]),
+                    "student_fingerprint": student_fp,
+                    "mentor_fingerprint": mentor_fps[mentor_row],
+                    "updated_at": now
+                })
+        # Replace each student's row set (and what it covers) with its fresh top-K
+        student_ids = result["student_ids"].tolist()
+        self.db.execute(table.delete().where(table.c.student_id.in_(student_ids)))
+        self.db.execute(states.delete().where(states.c.student_id.in_(student_ids)))
+        if rows:
+            self.db.execute(table.insert(), rows)
+        if state_rows:
+            self.db.execute(states.insert(), state_rows)
+        self.db.commit()
+        return len(rows)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Scores every active student. Expects embeddings to be backfilled already.
+        """
+        started = time.time()
+        state = self._build_mentor_state()
+        mentor_fps = [mentor_fingerprint(m) for m in self.mentors]
+        dim = state["matrix"].shape[1]
+        stats = {"students": 0, "mentors": len(self.mentors), "pairs_written": 0, "workers": self.workers}
+        if not self.mentors:
+            stats["seconds"] = round(time.time() - started, 2)
+            return stats
+
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(state,))
+        else:
+            _init_worker(state)
+
+        pending, fingerprints = set(), {}
+        try:
+            for page in self._student_pages():
+                fingerprints.update({s.id: student_fingerprint(s) for s in page})
+                task = self._chunk_task(page, dim)
+                stats["students"] += len(page)
+                self.db.expunge_all()
+
+                if pool is None:
+                    stats["pairs_written"] += self._persist(_score_chunk(task), fingerprints, mentor_fps)
+                    continue
+
+                pending.add(pool.submit(_score_chunk, task))
+                # Bound the number of chunks held in memory at once
+                while len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stats["pairs_written"] += self._persist(future.result(), fingerprints, mentor_fps)
+            for future in pending:
+                stats["pairs_written"] += self._persist(future.result(), fingerprints, mentor_fps)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        stats["seconds"] = round(time.time() - started, 2)
+        return stats
+
+    @classmethod
+    def run_in_new_session(cls, **options) -> Dict[str, Any]:
+        """
+        run() with a session opened on the calling thread, for running in an
+        executor: sessions must not be shared across threads.
+        """
+        db = SessionLocal()
+        try:
+            return cls(db, **options).run()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+async def run_batch_matching(top_k: int = None, chunk_size: int = None, workers: int = None) -> Dict[str, Any]:
+    """
+    Backfills embeddings, then precomputes every student's top-K mentors.
+    The scoring pass runs off the event loop. Inside the API it is the
+    batch_matching job (workers=1), whose concurrency of 1 keeps runs from
+    overlapping; the process pool is for the precompute_matches.py CLI.
+    """
+    options = {"top_k": top_k, "chunk_size": chunk_size, "workers": workers}
+    db = SessionLocal()
+    try:
+        await BatchMatcher(db, **options).backfill_embeddings()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Batch matching failed: {str(e)}")
+        raise
+    finally:
+        db.close()
+    
+    try:
+        stats = await asyncio.get_running_loop().run_in_executor(None, lambda: BatchMatcher.run_in_new_session(**options))
+    except Exception as e:
+        logger.error(f"Batch matching failed: {str(e)}")
+        raise
+    stats["finished_at"] = datetime.utcnow().isoformat()
+    logger.info(f"Batch matching complete: {stats}")
+    return stats
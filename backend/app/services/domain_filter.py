@@ -0,0 +1,223 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.db import models
+
+logger = logging.getLogger(__name__)
+
+# Broad categories students and mentors abbreviate (e.g. "CS" for "Computer Science")
+ALIASES = {
+    "cs": "computer science",
+    "cse": "computer science",
+    "ece": "electrical engineering",
+    "ee": "electrical engineering",
+    "ml": "machine learning",
+    "ai": "artificial intelligence"
+}
+
+
+def normalize_major(major: Optional[str]) -> Optional[str]:
+    """None means no major given (Lens 1 can't filter the student)."""
+    if not major:
+        return None
+    term = major.lower().strip()
+    return ALIASES.get(term, term)
+
+def normalize_backgrounds(preferred_backgrounds: Optional[str]) -> Optional[List[str]]:
+    """None means the mentor has no preference (open to every major)."""
+    if not preferred_backgrounds:
+        return None
+    terms = []
+    for bg in preferred_backgrounds.split(','):
+        term = bg.lower().strip()
+        term = ALIASES.get(term, term)
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def term_matches(major: str, term: str) -> bool:
+    # Direct match or substring match either way (e.g. "computer science" in "computer science & ai")
+    return major in term or term in major
+
+
+class DomainFilterIndex:
+    """
+    Inverted index from normalized background term to mentor ids.
+    Eligible mentors for a major are resolved once per distinct major (terms are
+    matched by substring, so a direct dict lookup isn't enough) and then cached,
+    making Lens 1 a set membership test per mentor.
+    """
+
+    def __init__(self):
+        self._mentor_terms: Dict[int, Optional[tuple]] = {}
+        self._term_mentors: Dict[str, set] = {}
+        self._open: set = set()
+        self._by_major: Dict[str, FrozenSet[int]] = {}
+        self._lock = threading.Lock()
+
+    def _discard(self, mentor_id: int):
+        terms = self._mentor_terms.pop(mentor_id, None)
+        self._open.discard(mentor_id)
+        for term in terms or ():
+            ids = self._term_mentors.get(term)
+            if ids is not None:
+                ids.discard(mentor_id)
+                if not ids:
+                    del self._term_mentors[term]
+
+    def set_mentor(self, mentor_id: int, terms: Optional[List[str]]):
+        terms = tuple(terms) if terms is not None else None
+        with self._lock:
+            if mentor_id in self._mentor_terms and self._mentor_terms[mentor_id] == terms:
+                return # Unchanged: keep the per-major cache
+            self._discard(mentor_id)
+            self._mentor_terms[mentor_id] = terms
+            if terms is None:
+                self._open.add(mentor_id)
+            else:
+                for term in terms:
+                    self._term_mentors.setdefault(term, set()).add(mentor_id)
+            self._by_major = {}
+
+    def remove_mentor(self, mentor_id: int):
+        with self._lock:
+            self._discard(mentor_id)
+            self._by_major = {}
+
+    def eligible_mentor_ids(self, major: Optional[str]) -> Optional[FrozenSet[int]]:
+        """Mentors whose Lens 1 admits this major. None means every mentor does."""
+        normalized = normalize_major(major)
+        if normalized is None:
+            return None
+        with self._lock:
+            eligible = self._by_major.get(normalized)
+            if eligible is None:
+                ids = set(self._open)
+                for term, mentor_ids in self._term_mentors.items():
+                    if term_matches(normalized, term):
+                        ids.update(mentor_ids)
+                eligible = frozenset(ids)
+                self._by_major[normalized] = eligible
+            return eligible
+
+    def passes(self, major: Optional[str], mentor_id: int) -> bool:
+        eligible = self.eligible_mentor_ids(major)
+        return eligible is None or mentor_id in eligible
+
+    def __contains__(self, mentor_id: int) -> bool:
+        return mentor_id in self._mentor_terms
+
+    def __len__(self) -> int:
+        return len(self._mentor_terms)
+
+
+class DomainFilter:
+    """
+    Stored mentor taxonomy (mentor_domain_taxonomies) plus the process-wide
+    inverted index built from it. Mentor writes update both; other worker
+    processes pick the change up within REFRESH_INTERVAL seconds by applying
+    the rows updated since their last check, not by rebuilding.
+    """
+
+    REFRESH_INTERVAL = 5.0
+    # Deltas re-read rows this far back, so writes committed late or stamped by
+    # a slightly slow clock in another process aren't missed (re-applying is a no-op)
+    DELTA_OVERLAP = timedelta(seconds=60)
+
+    _index: Optional[DomainFilterIndex] = None
+    _version = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _upsert(db: Session, mentor_id: int, preferred_backgrounds: Optional[str], row=None) -> Optional[List[str]]:
+        terms = normalize_backgrounds(preferred_backgrounds)
+        if row is None:
+            row = models.MentorDomainTaxonomy(mentor_id=mentor_id)
+            db.add(row)
+        row.terms = json.dumps(terms) if terms is not None else None
+        row.source = preferred_backgrounds
+        row.updated_at = datetime.utcnow()
+        return terms
+
+    @classmethod
+    def refresh_mentor(cls, db: Session, mentor: models.MentorProfile):
+        """
+        Call after a mentor write: recomputes and stores the mentor's normalized
+        backgrounds and updates this process's index in place.
+        """
+        row = db.query(models.MentorDomainTaxonomy).filter(models.MentorDomainTaxonomy.mentor_id == mentor.id).first()
+        if row is not None and row.source == mentor.preferred_backgrounds:
+            return
+        terms = cls._upsert(db, mentor.id, mentor.preferred_backgrounds, row)
+        db.commit()
+        if cls._index is not None:
+            cls._index.set_mentor(mentor.id, terms)
+
+    @classmethod
+    def _current_version(cls, db: Session):
+        return tuple(db.query(
+            func.max(models.MentorDomainTaxonomy.updated_at), func.count(models.MentorDomainTaxonomy.mentor_id)
+        ).one())
+
+    @classmethod
+    def _build(cls, db: Session) -> DomainFilterIndex:
+        rows = db.query(
+            models.MentorProfile.id, models.MentorProfile.preferred_backgrounds, models.MentorDomainTaxonomy
+        ).outerjoin(models.MentorDomainTaxonomy, models.MentorDomainTaxonomy.mentor_id == models.MentorProfile.id).all()
+
+        index = DomainFilterIndex()
+        backfilled = 0
+        for mentor_id, preferred_backgrounds, taxonomy in rows:
+            if taxonomy is None or taxonomy.source != preferred_backgrounds:
+                # Mentors written before the taxonomy existed (or edited outside the API)
+                terms = cls._upsert(db, mentor_id, preferred_backgrounds, taxonomy)
+                backfilled += 1
+            else:
+                terms = json.loads(taxonomy.terms) if taxonomy.terms is not None else None
+            index.set_mentor(mentor_id, terms)
+        if backfilled:
+            db.commit()
+            logger.info(f"Backfilled domain taxonomy for {backfilled} mentors")
+        return index
+
+    @classmethod
+    def _apply_changes(cls, db: Session, index: DomainFilterIndex, since: Optional[datetime]) -> int:
+        """Applies the taxonomy rows updated since `since` (minus DELTA_OVERLAP) to the index."""
+        query = db.query(models.MentorDomainTaxonomy.mentor_id, models.MentorDomainTaxonomy.terms)
+        if since is not None:
+            query = query.filter(models.MentorDomainTaxonomy.updated_at >= since - cls.DELTA_OVERLAP)
+        rows = query.all()
+        for mentor_id, terms in rows:
+            index.set_mentor(mentor_id, json.loads(terms) if terms is not None else None)
+        return len(rows)
+
+    @classmethod
+    def get_index(cls, db: Session) -> DomainFilterIndex:
+        """
+        Returns the inverted index. When taxonomy rows were written since the
+        last check (by any process), only those mentors are updated; the index
+        is rebuilt only on first use or when rows disappeared.
+        """
+        now = time.time()
+        if cls._index is not None and now - cls._checked_at < cls.REFRESH_INTERVAL:
+            return cls._index
+        with cls._lock:
+            version = cls._current_version(db)
+            if cls._index is not None and version != cls._version:
+                applied = cls._apply_changes(db, cls._index, cls._version[0])
+                logger.info(f"Applied {applied} domain taxonomy changes")
+                if len(cls._index) != version[1]:
+                    # Rows were deleted: deltas can't express that
+                    cls._index = None
+            if cls._index is None:
+                cls._index = cls._build(db)
+                version = cls._current_version(db)
+            cls._version = version
+            cls._checked_at = now
+        return cls._index
@@ -0,0 +1,393 @@
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+import numpy as np
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.services import ai_service
+from app.services.label_index import LabelIndex, get_label_index, set_label_index
+from app.services.vector_index import VectorIndex, create_index, get_index, set_index
+
+MENTOR_INDEX = "mentors"
+STUDENT_INDEX = "students"
+STUDENT_MAJOR_INDEX = "student_majors"
+
+logger = logging.getLogger(__name__)
+
+
+def mentor_embedding_text(mentor: models.MentorProfile) -> str:
+    """The exact text the matching engine embeds for a mentor."""
+    return f"{mentor.research_areas or ''} {mentor.bio or ''}"
+
+def student_embedding_text(student: models.StudentProfile) -> str:
+    """The exact text the matching engine embeds for a student."""
+    return f"{student.research_interests or ''} {student.bio or ''} {student.primary_skills or ''}"
+
+def publication_embedding_text(publication) -> str:
+    """The text a publication is embedded and keyword-tagged by (title + abstract)."""
+    return f"{publication.title or ''} {publication.description or ''}"
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode_vector(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+def decode_vector(blob: Optional[bytes]) -> List[float]:
+    if not blob:
+        return []
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+def _is_usable(vec: List[float]) -> bool:
+    # ai_service falls back to an all-zero vector when the key is missing or the call fails.
+    # Never persist those, otherwise the hash would match and we'd never retry.
+    return bool(vec) and any(vec)
+
+def _index_vector(name: str, item_id: int, vec: List[float]):
+    index = get_index(name)
+    if index is not None:
+        index.upsert(item_id, vec)
+
+def _index_mentor(mentor_id: int, vec: List[float]):
+    _index_vector(MENTOR_INDEX, mentor_id, vec)
+
+def _index_student(student_id: int, vec: List[float]):
+    _index_vector(STUDENT_INDEX, student_id, vec)
+
+# (embedding model, owner column, profile model) each vector index is built from
+_INDEX_SOURCES = {
+    MENTOR_INDEX: (models.MentorEmbedding, "mentor_id", models.MentorProfile),
+    STUDENT_INDEX: (models.StudentEmbedding, "student_id", models.StudentProfile)
+}
+
+
+class EmbeddingStore:
+    """
+    Persisted profile, publication and topic embeddings, keyed by a hash of the
+    embedded text. A vector is only recomputed when the text it was built from changes.
+    """
+
+    REFRESH_INTERVAL = 5.0
+
+    _versions: Dict[str, tuple] = {}
+    _checked_at: Dict[str, float] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _upsert(db: Session, model, owner_field: str, owner_id: int, digest: str, vec: List[float], row=None):
+        if row is None:
+            row = model(**{owner_field: owner_id})
+            db.add(row)
+        row.text_hash = digest
+        row.vector = encode_vector(vec)
+        row.dimensions = len(vec)
+        row.updated_at = datetime.utcnow()
+
+    @staticmethod
+    async def refresh_mentor_embedding(db: Session, mentor: models.MentorProfile) -> List[float]:
+        """
+        Returns the mentor's vector, re-embedding only if research_areas/bio changed.
+        """
+        text = mentor_embedding_text(mentor)
+        digest = text_hash(text)
+
+        stored = db.query(models.MentorEmbedding).filter(models.MentorEmbedding.mentor_id == mentor.id).first()
+        if stored and stored.text_hash == digest:
+            return decode_vector(stored.vector)
+
+        vec = await ai_service.get_embedding(text.strip())
+        if _is_usable(vec):
+            EmbeddingStore._upsert(db, models.MentorEmbedding, "mentor_id", mentor.id, digest, vec, stored)
+            db.commit()
+            _index_mentor(mentor.id, vec)
+        return vec
+
+    @staticmethod
+    async def refresh_student_embedding(db: Session, student: models.StudentProfile) -> List[float]:
+        """
+        Returns the student's vector, re-embedding only if the matching text changed.
+        """
+        text = student_embedding_text(student)
+        digest = text_hash(text)
+
+        # Lens 1 for reverse matching looks students up by major
+        majors = EmbeddingStore.student_major_index(db)
+        major_changed = majors is not None and majors.set(student.id, student.major)
+
+        stored = db.query(models.StudentEmbedding).filter(models.StudentEmbedding.student_id == student.id).first()
+        if stored and stored.text_hash == digest:
+            if major_changed:
+                # Other processes re-read the majors of students whose embedding row changed
+                stored.updated_at = datetime.utcnow()
+                db.commit()
+            return decode_vector(stored.vector)
+
+        vec = await ai_service.get_embedding(text.strip())
+        if _is_usable(vec):
+            EmbeddingStore._upsert(db, models.StudentEmbedding, "student_id", student.id, digest, vec, stored)
+            db.commit()
+            _index_student(student.id, vec)
+        return vec
+
+    @staticmethod
+    async def _load_vectors(db: Session, model, owner_field: str, owners: list, text_fn) -> tuple:
+        """
+        Bulk-loads stored vectors for `owners` in a single query and backfills the
+        missing or stale ones in one batched embedding call.
+        Returns (vectors by owner id, ids of owners that were re-embedded).
+        """
+        ids = [o.id for o in owners]
+        owner_col = getattr(model, owner_field)
+        stored = {getattr(r, owner_field): r for r in db.query(model).filter(owner_col.in_(ids)).all()}
+
+        vectors: Dict[int, List[float]] = {}
+        stale = []
+        for owner in owners:
+            text = text_fn(owner)
+            digest = text_hash(text)
+            row = stored.get(owner.id)
+            if row and row.text_hash == digest:
+                vectors[owner.id] = decode_vector(row.vector)
+            else:
+                stale.append((owner, text, digest))
+
+        fresh_ids = []
+        if stale:
+            logger.info(f"Backfilling embeddings for {len(stale)} {model.__tablename__} rows")
+            fresh = await ai_service.get_embeddings([text.strip() for _, text, _ in stale])
+            for (owner, text, digest), vec in zip(stale, fresh):
+                vectors[owner.id] = vec
+                if _is_usable(vec):
+                    EmbeddingStore._upsert(db, model, owner_field, owner.id, digest, vec, stored.get(owner.id))
+                    fresh_ids.append(owner.id)
+            db.commit()
+        return vectors, fresh_ids
+
+    @staticmethod
+    async def load_mentor_vectors(db: Session, mentors: List[models.MentorProfile]) -> Dict[int, List[float]]:
+        """
+        Bulk-loads stored vectors for the given mentors in a single query.
+        Mentors with no (or a stale) stored vector are embedded once and persisted,
+        so steady-state matching never calls the embedding API for mentors.
+        """
+        if not mentors:
+            return {}
+        vectors, fresh_ids = await EmbeddingStore._load_vectors(
+            db, models.MentorEmbedding, "mentor_id", mentors, mentor_embedding_text
+        )
+        for mentor_id in fresh_ids:
+            _index_mentor(mentor_id, vectors[mentor_id])
+        return vectors
+
+    @staticmethod
+    async def load_student_vectors(db: Session, students: List[models.StudentProfile]) -> Dict[int, List[float]]:
+        """
+        Student counterpart of load_mentor_vectors.
+        """
+        if not students:
+            return {}
+        vectors, fresh_ids = await EmbeddingStore._load_vectors(
+            db, models.StudentEmbedding, "student_id", students, student_embedding_text
+        )
+        for student_id in fresh_ids:
+            _index_student(student_id, vectors[student_id])
+        return vectors
+
+    @staticmethod
+    async def load_publication_vectors(db: Session, publications: list) -> Dict[int, List[float]]:
+        """
+        Vectors for publications (anything with id/title/description). Only
+        publications that are new or whose title/abstract changed are embedded,
+        so re-analysing a mentor costs no embedding calls for unchanged papers.
+        """
+        if not publications:
+            return {}
+        vectors, _ = await EmbeddingStore._load_vectors(
+            db, models.PublicationEmbedding, "publication_id", publications, publication_embedding_text
+        )
+        return vectors
+
+    @staticmethod
+    async def load_topic_embeddings(db: Session, topics: list) -> Dict[int, models.TopicEmbedding]:
+        """
+        TopicEmbedding rows for topics (anything with id/name), keyed by topic id.
+        Topics seen for the first time get their name embedded (one batched call)
+        and start with that vector as their centroid. Topics that couldn't be
+        embedded are left out.
+        """
+        if not topics:
+            return {}
+        stored = {
+            r.topic_id: r for r in db.query(models.TopicEmbedding).filter(
+                models.TopicEmbedding.topic_id.in_([t.id for t in topics])
+            ).all()
+        }
+        missing = [t for t in topics if t.id not in stored]
+        if missing:
+            logger.info(f"Embedding {len(missing)} new research topics")
+            fresh = await ai_service.get_embeddings([t.name for t in missing])
+            for topic, vec in zip(missing, fresh):
+                if _is_usable(vec):
+                    row = models.TopicEmbedding(topic_id=topic.id, member_count=0)
+                    db.add(row)
+                    EmbeddingStore._upsert(db, models.TopicEmbedding, "topic_id", topic.id, text_hash(topic.name), vec, row)
+                    row.centroid = row.vector
+                    stored[topic.id] = row
+            db.commit()
+        return stored
+
+    @staticmethod
+    def stored_publication_vectors(db: Session, publication_ids: List[int]) -> Dict[int, List[float]]:
+        """Stored vectors only (no embedding calls), keyed by publication id."""
+        return {
+            r.publication_id: decode_vector(r.vector) for r in db.query(models.PublicationEmbedding).filter(
+                models.PublicationEmbedding.publication_id.in_(publication_ids)
+            ).all()
+        }
+
+    @staticmethod
+    def _shift_centroids(rows: Dict[int, models.TopicEmbedding], members: Dict[int, List[List[float]]], sign: int):
+        for topic_id, vectors in members.items():
+            row = rows.get(topic_id)
+            if row is None:
+                continue
+            vectors = [v for v in vectors if _is_usable(v) and len(v) == row.dimensions]
+            if sign < 0:
+                vectors = vectors[:row.member_count or 0] # The name vector itself never leaves
+            if not vectors:
+                continue
+            shifted = np.array(vectors, dtype=np.float64)
+            shifted /= np.linalg.norm(shifted, axis=1, keepdims=True)
+            n = (row.member_count or 0) + 1 # The name vector counts as one member
+            m = n + sign * len(vectors)
+            centroid = np.frombuffer(row.centroid, dtype=np.float32).astype(np.float64)
+            centroid = (centroid * n + sign * shifted.sum(axis=0)) / m
+            row.centroid = encode_vector(centroid.tolist())
+            row.member_count = m - 1
+            row.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def add_topic_members(rows: Dict[int, models.TopicEmbedding], members: Dict[int, List[List[float]]]):
+        """
+        Folds newly tagged publications' vectors (as unit vectors) into their
+        topics' centroids. It's a running mean, so the cost is per new tag, not
+        per tagged publication. The caller commits.
+        """
+        EmbeddingStore._shift_centroids(rows, members, 1)
+
+    @staticmethod
+    def remove_topic_members(rows: Dict[int, models.TopicEmbedding], members: Dict[int, List[List[float]]]):
+        """Takes untagged publications' vectors back out of their topics' centroids. The caller commits."""
+        EmbeddingStore._shift_centroids(rows, members, -1)
+
+    @staticmethod
+    def _active_rows(db: Session, name: str, *columns):
+        model, owner_field, profile_model = _INDEX_SOURCES[name]
+        owner_col = getattr(model, owner_field)
+        return db.query(*columns).select_from(model).join(
+            profile_model, profile_model.id == owner_col
+        ).join(models.User, models.User.id == profile_model.user_id).filter(models.User.is_active == True)
+
+    @classmethod
+    def _current_version(cls, db: Session, name: str):
+        model = _INDEX_SOURCES[name][0]
+        return tuple(cls._active_rows(db, name, func.max(model.updated_at), func.count()).one())
+
+    @classmethod
+    def _build_index(cls, db: Session, name: str) -> VectorIndex:
+        model, owner_field, _ = _INDEX_SOURCES[name]
+        version = cls._current_version(db, name)
+        rows = cls._active_rows(db, name, getattr(model, owner_field), model.vector).all()
+
+        index = create_index(settings.VECTOR_INDEX_TYPE, len(rows), settings.VECTOR_INDEX_NPROBE)
+        index.build([r[0] for r in rows], [np.frombuffer(r.vector, dtype=np.float32) for r in rows])
+        set_index(name, index)
+        cls._versions[name] = version
+        cls._checked_at[name] = time.time()
+        return index
+
+    @staticmethod
+    def _build_major_index(db: Session, student_ids: Optional[List[int]] = None):
+        query = db.query(models.StudentProfile.id, models.StudentProfile.major).join(models.User).filter(models.User.is_active == True)
+        if student_ids is None:
+            majors = LabelIndex()
+            majors.build(query)
+            set_label_index(STUDENT_MAJOR_INDEX, majors)
+        else:
+            majors = get_label_index(STUDENT_MAJOR_INDEX)
+            for student_id, major in query.filter(models.StudentProfile.id.in_(student_ids)):
+                majors.set(student_id, major)
+
+    @staticmethod
+    def build_mentor_index(db: Session) -> VectorIndex:
+        """
+        Builds the process-wide mentor index from stored embeddings of active mentors.
+        Writes in this process update it at once; other processes' within REFRESH_INTERVAL.
+        """
+        return EmbeddingStore._build_index(db, MENTOR_INDEX)
+
+    @staticmethod
+    def build_student_index(db: Session) -> VectorIndex:
+        """
+        Builds the process-wide student index (used to rank students for a mentor),
+        plus the major -> student ids index used for Lens 1 in that direction.
+        """
+        EmbeddingStore._build_major_index(db)
+        return EmbeddingStore._build_index(db, STUDENT_INDEX)
+
+    @classmethod
+    def _refresh(cls, db: Session, name: str) -> Optional[VectorIndex]:
+        """
+        Returns the named index, first catching up with embeddings other worker
+        processes wrote since it was loaded (checked at most every REFRESH_INTERVAL).
+        Changed rows are upserted in place; a shrunk active set (deactivated users)
+        rebuilds it. None while the index was never built (callers scan instead).
+        """
+        index = get_index(name)
+        now = time.time()
+        if index is None or now - cls._checked_at.get(name, 0.0) < cls.REFRESH_INTERVAL:
+            return index
+        with cls._lock:
+            version = cls._current_version(db, name)
+            seen = cls._versions.get(name)
+            if version != seen:
+                model, owner_field, _ = _INDEX_SOURCES[name]
+                since = seen[0] if seen and seen[0] else datetime.min
+                # Slack covers rows stamped just before `since` but committed after it
+                rows = cls._active_rows(db, name, getattr(model, owner_field), model.vector).filter(
+                    model.updated_at >= since - timedelta(seconds=60)
+                ).all()
+                for owner_id, vector in rows:
+                    index.upsert(owner_id, np.frombuffer(vector, dtype=np.float32))
+                if name == STUDENT_INDEX:
+                    cls._build_major_index(db, [r[0] for r in rows])
+                if len(index) != version[1]:
+                    if name == STUDENT_INDEX:
+                        cls._build_major_index(db)
+                    index = cls._build_index(db, name)
+                    logger.info(f"Rebuilt {name} vector index: {len(index)} vectors")
+                cls._versions[name] = version
+            cls._checked_at[name] = now
+        return index
+
+    @classmethod
+    def mentor_index(cls, db: Session) -> Optional[VectorIndex]:
+        return cls._refresh(db, MENTOR_INDEX)
+
+    @classmethod
+    def student_index(cls, db: Session) -> Optional[VectorIndex]:
+        return cls._refresh(db, STUDENT_INDEX)
+
+    @classmethod
+    def student_major_index(cls, db: Session) -> Optional[LabelIndex]:
+        """Major -> student ids, kept in step with the student index."""
+        cls._refresh(db, STUDENT_INDEX)
+        return get_label_index(STUDENT_MAJOR_INDEX)
@@ -0,0 +1,343 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class JobHandler:
+    def __init__(self, fn: Callable[..., Awaitable[Any]], concurrency: int, max_attempts: int):
+        self.fn = fn
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+# Registered job types. Routers register the handlers for the work they enqueue.
+_handlers: Dict[str, JobHandler] = {}
+
+# Id of the job the current task runs (inherited by tasks the handler creates)
+_current_job: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_job", default=None)
+
+def handler(job_type: str, concurrency: int = 1, max_attempts: Optional[int] = None):
+    """
+    Registers `async def fn(db, **payload)` as the handler for `job_type`.
+    At most `concurrency` jobs of this type run at once per process. The return
+    value (JSON-encodable) is stored as the job result. ValueError means bad
+    input and fails the job at once; any other exception is retried with backoff.
+    """
+    def decorator(fn):
+        _handlers[job_type] = JobHandler(fn, concurrency, max_attempts or settings.JOB_MAX_ATTEMPTS)
+        return fn
+    return decorator
+
+
+class JobQueue:
+    """
+    Persisted job queue (ai_jobs table) drained by JOB_WORKERS asyncio workers
+    per process. Each job runs with its own session, so nothing request-scoped
+    outlives the request that enqueued it. Claims are conditional UPDATEs, so
+    several processes can share the table. A running job holds a lease renewed
+    by a heartbeat; any process requeues jobs whose lease expired. Progress a
+    handler reports is written to the row with each lease renewal.
+    """
+
+    _tasks = []
+    _running: Dict[str, int] = {}
+    _wake: Optional[asyncio.Event] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _stopping = False
+    _reaped_at = 0.0
+    _progress: Dict[int, Any] = {}
+
+    @classmethod
+    def _new_job(cls, job_type: str, payload: Dict[str, Any], user_id: Optional[int],
+                 run_after: Optional[datetime]) -> models.AIJob:
+        if job_type not in _handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        return models.AIJob(
+            type=job_type,
+            status="queued",
+            payload=json.dumps(payload),
+            max_attempts=_handlers[job_type].max_attempts,
+            user_id=user_id,
+            run_after=run_after or datetime.utcnow()
+        )
+
+    @classmethod
+    def enqueue(cls, db: Session, job_type: str, payload: Dict[str, Any], user_id: Optional[int] = None,
+                run_after: Optional[datetime] = None) -> models.AIJob:
+        job = cls._new_job(job_type, payload, user_id, run_after)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        cls._notify()
+        return job
+
+    @classmethod
+    def enqueue_unique(cls, db: Session, key: str, job_type: str, payload: Dict[str, Any],
+                       run_after: Optional[datetime] = None) -> Optional[models.AIJob]:
+        """
+        Enqueues unless the job last scheduled under `key` is still queued.
+        The key is claimed with a compare-and-set on its scheduled_jobs row, so
+        concurrent callers (e.g. every worker process at startup) queue one job.
+        Returns the new job, or None when one was already queued.
+        """
+        slot = models.ScheduledJob
+        if db.get(slot, key) is None:
+            try:
+                db.add(slot(key=key))
+                db.commit()
+            except IntegrityError:
+                # Another process created the key first
+                db.rollback()
+        
+        current = db.query(slot.job_id).filter(slot.key == key).scalar()
+        if current is not None:
+            status = db.query(models.AIJob.status).filter(models.AIJob.id == current).scalar()
+            if status == "queued":
+                return None
+        
+        job = cls._new_job(job_type, payload, None, run_after)
+        db.add(job)
+        db.flush()
+        claimed = db.query(slot).filter(
+            slot.key == key, slot.job_id == current if current is not None else slot.job_id.is_(None)
+        ).update({"job_id": job.id, "updated_at": datetime.utcnow()}, synchronize_session=False)
+        if not claimed:
+            # Lost the race: another caller queued the job since we read the key
+            db.rollback()
+            return None
+        db.commit()
+        db.refresh(job)
+        cls._notify()
+        return job
+
+    @classmethod
+    def _notify(cls):
+        # Routes may run in the threadpool, so the event is set from the loop's thread
+        if cls._loop is not None and cls._wake is not None:
+            cls._loop.call_soon_threadsafe(cls._wake.set)
+
+    @classmethod
+    def _claim(cls, db: Session) -> Optional[models.AIJob]:
+        open_types = [t for t, h in _handlers.items() if cls._running.get(t, 0) < h.concurrency]
+        if not open_types:
+            return None
+        now = datetime.utcnow()
+        candidates = db.query(models.AIJob.id).filter(
+            models.AIJob.status == "queued",
+            models.AIJob.run_after <= now,
+            models.AIJob.type.in_(open_types)
+        ).order_by(models.AIJob.id).limit(settings.JOB_WORKERS * 2).all()
+        for (job_id,) in candidates:
+            # Only one process wins the queued -> running transition
+            claimed = db.query(models.AIJob).filter(
+                models.AIJob.id == job_id, models.AIJob.status == "queued"
+            ).update({
+                models.AIJob.status: "running",
+                models.AIJob.started_at: now,
+                models.AIJob.lease_expires_at: now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                models.AIJob.attempts: models.AIJob.attempts + 1
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return db.get(models.AIJob, job_id)
+        return None
+
+    @classmethod
+    def report_progress(cls, progress: Any):
+        """
+        Records the running job's progress (JSON-encodable); it reaches the job
+        row with the next lease renewal. No-op outside a job.
+        """
+        job_id = _current_job.get()
+        if job_id is not None:
+            cls._progress[job_id] = progress
+
+    @staticmethod
+    def _renew_lease(job_id: int, attempt: int, progress: Any = None) -> bool:
+        # Own session (and thread): the handler's session may be mid-transaction
+        db = SessionLocal()
+        try:
+            values = {models.AIJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)}
+            if progress is not None:
+                values[models.AIJob.progress] = json.dumps(jsonable_encoder(progress))
+            renewed = db.query(models.AIJob).filter(
+                models.AIJob.id == job_id, models.AIJob.status == "running", models.AIJob.attempts == attempt
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return bool(renewed)
+        finally:
+            db.close()
+
+    @classmethod
+    async def _heartbeat(cls, job_id: int, attempt: int):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                if not await asyncio.to_thread(cls._renew_lease, job_id, attempt, cls._progress.get(job_id)):
+                    logger.warning(f"Job {job_id} lost its lease; its result will be discarded")
+                    return
+            except Exception as e:
+                logger.error(f"Could not renew the lease of job {job_id}: {str(e)}")
+
+    @classmethod
+    async def _execute(cls, db: Session, job: models.AIJob):
+        job_id, attempt, handler = job.id, job.attempts, _handlers[job.type]
+        heartbeat = asyncio.create_task(cls._heartbeat(job_id, attempt))
+        token = _current_job.set(job_id)
+        try:
+            await cls._run_handler(db, job_id, attempt, handler, json.loads(job.payload or "{}"))
+        finally:
+            _current_job.reset(token)
+            heartbeat.cancel()
+            cls._progress.pop(job_id, None)
+
+    @classmethod
+    async def _run_handler(cls, db: Session, job_id: int, attempt: int, handler: JobHandler, payload: Dict[str, Any]):
+        try:
+            result = await handler.fn(db, **payload)
+            job = cls._owned(db, job_id, attempt)
+            if job is None:
+                return
+            job.status = "succeeded"
+            job.result = json.dumps(jsonable_encoder(result))
+            if job_id in cls._progress:
+                job.progress = json.dumps(jsonable_encoder(cls._progress[job_id]))
+            job.error = None
+            job.finished_at = datetime.utcnow()
+        except Exception as e:
+            db.rollback()
+            job = cls._owned(db, job_id, attempt)
+            if job is None:
+                return
+            job.error = str(e)
+            if isinstance(e, ValueError) or job.attempts >= job.max_attempts:
+                logger.error(f"Job {job_id} ({job.type}) failed after {job.attempts} attempts: {str(e)}")
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+            else:
+                delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+                logger.warning(f"Job {job_id} ({job.type}) attempt {job.attempts} failed, retrying in {delay}s: {str(e)}")
+                job.status = "queued"
+                job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        db.commit()
+
+    @staticmethod
+    def _owned(db: Session, job_id: int, attempt: int) -> Optional[models.AIJob]:
+        """The job row if this attempt still holds it (its lease wasn't expired and the job requeued)."""
+        job = db.get(models.AIJob, job_id, populate_existing=True)
+        if job is None or job.status != "running" or job.attempts != attempt:
+            logger.warning(f"Job {job_id} attempt {attempt} finished after losing its lease; result discarded")
+            db.rollback()
+            return None
+        return job
+
+    @classmethod
+    async def _worker(cls):
+        while not cls._stopping:
+            db = SessionLocal()
+            try:
+                cls._reap_if_due(db)
+                job = cls._claim(db)
+                if job is None:
+                    db.close()
+                    cls._wake.clear()
+                    try:
+                        await asyncio.wait_for(cls._wake.wait(), settings.JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                # Counted before the first await, so the per-type limit can't be overshot
+                cls._running[job.type] = cls._running.get(job.type, 0) + 1
+                job_type = job.type
+                try:
+                    await cls._execute(db, job)
+                finally:
+                    cls._running[job_type] -= 1
+                    cls._wake.set() # A slot of this type is free again
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}")
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+            finally:
+                db.close()
+
+    @staticmethod
+    def _requeue_expired(db: Session) -> int:
+        """
+        Jobs whose lease ran out (their worker died or hung): requeued, or failed
+        once out of attempts. Runs from every process's poll loop, so a crashed
+        worker's jobs don't wait for a restart, and live jobs keep their lease.
+        """
+        now = datetime.utcnow()
+        expired = [models.AIJob.status == "running", or_(
+            models.AIJob.lease_expires_at < now,
+            and_(models.AIJob.lease_expires_at.is_(None), models.AIJob.started_at < now - timedelta(seconds=settings.JOB_LEASE_SECONDS))
+        )]
+        failed = db.query(models.AIJob).filter(*expired, models.AIJob.attempts >= models.AIJob.max_attempts).update({
+            models.AIJob.status: "failed",
+            models.AIJob.error: "Worker stopped before the job finished",
+            models.AIJob.finished_at: now
+        }, synchronize_session=False)
+        requeued = db.query(models.AIJob).filter(*expired).update({
+            models.AIJob.status: "queued",
+            models.AIJob.run_after: now
+        }, synchronize_session=False)
+        db.commit()
+        if failed or requeued:
+            logger.warning(f"Expired job leases: {requeued} requeued, {failed} failed")
+        return requeued + failed
+
+    @classmethod
+    def _reap_if_due(cls, db: Session):
+        now = time.monotonic()
+        if now - cls._reaped_at >= settings.JOB_LEASE_SECONDS / 3:
+            cls._reaped_at = now
+            cls._requeue_expired(db)
+
+    @classmethod
+    def start(cls):
+        """Starts the workers on the running event loop (app startup)."""
+        if cls._tasks:
+            return
+        cls._stopping = False
+        cls._loop = asyncio.get_running_loop()
+        cls._wake = asyncio.Event()
+        cls._reaped_at = 0.0
+        cls._tasks = [asyncio.create_task(cls._worker()) for _ in range(settings.JOB_WORKERS)]
+        logger.info(f"Started {len(cls._tasks)} job workers for {sorted(_handlers)}")
+
+    @classmethod
+    async def stop(cls):
+        cls._stopping = True
+        for task in cls._tasks:
+            task.cancel()
+        await asyncio.gather(*cls._tasks, return_exceptions=True)
+        cls._tasks = []
+
+    @staticmethod
+    def to_response(job: models.AIJob) -> Dict[str, Any]:
+        return {
+            "id": job.id,
+            "type": job.type,
+            "status": job.status,
+            "result": json.loads(job.result) if job.result else None,
+            "progress": json.loads(job.progress) if job.progress else None,
+            "error": job.error if job.status == "failed" else None,
+            "attempts": job.attempts,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at
+        }
@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class LabelIndex:
+    """
+    Inverted index from a categorical label (e.g. a student's major) to the ids
+    carrying it. Lets a hard filter be evaluated once per distinct label instead
+    of once per row, and hands the surviving ids to a vector search as allowed_ids.
+    """
+
+    def __init__(self):
+        self._ids: Dict[Hashable, set] = {}
+        self._label_of: Dict[int, Hashable] = {}
+        self._arrays: Dict[Hashable, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def build(self, pairs: Iterable[Tuple[int, Hashable]]):
+        with self._lock:
+            self._ids, self._label_of, self._arrays = {}, {}, {}
+            for item_id, label in pairs:
+                self._add(int(item_id), label)
+
+    def _add(self, item_id: int, label: Hashable):
+        self._ids.setdefault(label, set()).add(item_id)
+        self._label_of[item_id] = label
+        self._arrays.pop(label, None)
+
+    def _discard(self, item_id: int):
+        label = self._label_of.pop(item_id, None)
+        ids = self._ids.get(label)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self._ids[label]
+            self._arrays.pop(label, None)
+
+    def set(self, item_id: int, label: Hashable) -> bool:
+        """Returns whether the item's label changed."""
+        item_id = int(item_id)
+        with self._lock:
+            if item_id in self._label_of and self._label_of[item_id] == label:
+                return False
+            self._discard(item_id)
+            self._add(item_id, label)
+            return True
+
+    def remove(self, item_id: int):
+        with self._lock:
+            self._discard(int(item_id))
+
+    def labels(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._ids)
+
+    def ids_for(self, labels: Iterable[Hashable]) -> np.ndarray:
+        """All ids carrying any of the labels, as one int64 array."""
+        with self._lock:
+            parts = []
+            for label in labels:
+                if label not in self._ids:
+                    continue
+                arr = self._arrays.get(label)
+                if arr is None:
+                    arr = np.fromiter(self._ids[label], dtype=np.int64, count=len(self._ids[label]))
+                    self._arrays[label] = arr
+                parts.append(arr)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._label_of)
+
+
+# Process-wide label indexes, keyed by name ("student_majors", ...). Built at startup;
+# read them through EmbeddingStore, which picks up other processes' writes.
+_indexes: Dict[str, LabelIndex] = {}
+
+def get_label_index(name: str) -> Optional[LabelIndex]:
+    return _indexes.get(name)
+
+def set_label_index(name: str, index: LabelIndex):
+    _indexes[name] = index
@@ -0,0 +1,161 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryLLMCacheStore:
+    """
+    In-process LRU store with per-entry expiry, bounded by entry count.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            # Callers post-process results; never share the cached object with them
+            return copy.deepcopy(value)
+
+    def set(self, key: str, model: str, value: Any, ttl_seconds: int):
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(value), time.time() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class DatabaseLLMCacheStore:
+    """
+    Persistent store backed by the llm_cache_entries table, so cached responses
+    survive restarts and are shared by every worker using the same database.
+    Oldest entries are pruned once the table grows past max_entries.
+    """
+
+    PRUNE_EVERY = 100 # Writes between prune passes
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        db = SessionLocal()
+        try:
+            entry = db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.key == key,
+                LLMCacheEntry.expires_at > datetime.utcnow()
+            ).first()
+            return json.loads(entry.value) if entry else None
+        finally:
+            db.close()
+
+    def set(self, key: str, model: str, value: Any, ttl_seconds: int):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.merge(LLMCacheEntry(
+                key=key,
+                model=model,
+                value=json.dumps(value),
+                created_at=now,
+                expires_at=now + timedelta(seconds=ttl_seconds)
+            ))
+            db.commit()
+
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(db)
+        finally:
+            db.close()
+
+    def _prune(self, db):
+        removed = db.query(LLMCacheEntry).filter(LLMCacheEntry.expires_at <= datetime.utcnow()).delete()
+        overflow = db.query(LLMCacheEntry).count() - self.max_entries
+        if overflow > 0:
+            oldest = db.query(LLMCacheEntry.key).order_by(LLMCacheEntry.created_at.asc()).limit(overflow).subquery()
+            removed += db.query(LLMCacheEntry).filter(LLMCacheEntry.key.in_(oldest.select())).delete(synchronize_session=False)
+        db.commit()
+        self.evictions += removed
+
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM responses.
+    Keys are sha256(model name + rendered prompt), so identical inputs to the
+    same model hit the cache no matter which endpoint produced the prompt.
+    """
+
+    def __init__(self, store, ttl_seconds: int):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.store is None:
+            return None
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            logger.error(f"LLM cache read failed: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, model: str, value: Any, ttl_seconds: Optional[int] = None):
+        if self.store is None:
+            return
+        try:
+            self.store.set(key, model, value, ttl_seconds or self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"LLM cache write failed: {str(e)}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__ if self.store else "disabled",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": getattr(self.store, "evictions", 0),
+        }
+
+
+def _create_store(backend: str):
+    if backend == "memory":
+        return MemoryLLMCacheStore(settings.LLM_CACHE_MAX_ENTRIES)
+    if backend == "database":
+        return DatabaseLLMCacheStore(settings.LLM_CACHE_MAX_ENTRIES)
+    return None # "none" disables caching
+
+llm_cache = LLMCache(_create_store(settings.LLM_CACHE_BACKEND), settings.LLM_CACHE_TTL)
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import numpy as np
+from datetime import datetime
+from typing import List
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.db import models
+from app.db.database import SessionLocal
+from app.services.domain_filter import DomainFilter
+from app.services.embedding_store import EmbeddingStore, mentor_embedding_text, student_embedding_text
+from app.services.matching_engine import MatchingEngine, CANDIDATE_POOL_SIZE, MATCH_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+def _fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+def student_fingerprint(student: models.StudentProfile) -> str:
+    """Hash of every student field the 3 lenses read."""
+    return _fingerprint(
+        student_embedding_text(student),
+        student.major,
+        student.is_phd_seeker,
+        student.degree,
+        bool(student.projects)
+    )
+
+def mentor_fingerprint(mentor: models.MentorProfile) -> str:
+    """Hash of every mentor field the 3 lenses read."""
+    return _fingerprint(
+        mentor_embedding_text(mentor),
+        mentor.preferred_backgrounds,
+        mentor.mentor_type,
+        mentor.min_expectations,
+        mentor.accepting_phd_students
+    )
+
+
+class MatchScoreStore:
+    """
+    Maintains the mentor_match_scores table incrementally.
+    A student's rows are their candidate mentors, and student_match_states records
+    how far that row set reaches (see StudentMatchState). A student write rebuilds
+    that student's row set; a mentor write re-scores the mentor's existing pairs
+    plus their nearest candidate students. Within either, only pairs with stale
+    fingerprints are recomputed. Reads are a single indexed ORDER BY ... LIMIT.
+    """
+
+    @staticmethod
+    def set_state(db: Session, student_id: int, fingerprint: str, candidate_count: int, complete: bool):
+        """Records what the student's row set now covers. The caller commits."""
+        state = db.get(models.StudentMatchState, student_id)
+        if state is None:
+            state = models.StudentMatchState(student_id=student_id)
+            db.add(state)
+        state.student_fingerprint = fingerprint
+        state.candidate_count = candidate_count
+        state.complete = complete
+        state.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def _write_scores(db: Session, rows: dict, key_field: str, fixed: dict, scored: list, scores, fingerprints: dict):
+        now = datetime.utcnow()
+        semantic_sims, alignment_scores, final_scores = scores
+        for i, other in enumerate(scored):
+            row = rows.get(other.id)
+            if row is None:
+                row = models.MentorMatchScore(**fixed, **{key_field: other.id})
+                db.add(row)
+            row.match_score = float(final_scores[i])
+            row.semantic_score = float(semantic_sims[i])
+            row.alignment_score = float(alignment_scores[i])
+            row.student_fingerprint = fingerprints["student"](other)
+            row.mentor_fingerprint = fingerprints["mentor"](other)
+            row.updated_at = now
+
+    @staticmethod
+    async def rescore_student(db: Session, student: models.StudentProfile, pool_size: int = CANDIDATE_POOL_SIZE) -> int:
+        """
+        Brings one student's row up to date over their candidate mentors (the
+        nearest Lens-1 eligible mentors in the mentor index, see
+        MatchingEngine.retrieve_candidate_mentors), so the cost doesn't grow with
+        the mentor pool. Returns the number of pairs re-scored.
+        """
+        mentors, complete = await MatchingEngine.retrieve_candidate_mentors(db, student, pool_size)
+        eligible = [mentors[i] for i in np.flatnonzero(MatchingEngine._lens_1_mask(db, student, mentors))]
+        eligible_ids = {m.id for m in eligible}
+
+        s_fp = student_fingerprint(student)
+        m_fps = {m.id: mentor_fingerprint(m) for m in eligible}
+        rows = {r.mentor_id: r for r in db.query(models.MentorMatchScore).filter(models.MentorMatchScore.student_id == student.id)}
+
+        # Pairs that are no longer candidates (failed Lens 1, mentor gone/inactive, or pruned)
+        for mentor_id, row in rows.items():
+            if mentor_id not in eligible_ids:
+                db.delete(row)
+
+        stale = [
+            m for m in eligible
+            if m.id not in rows or rows[m.id].student_fingerprint != s_fp or rows[m.id].mentor_fingerprint != m_fps[m.id]
+        ]
+        if stale:
+            student_vec = await EmbeddingStore.refresh_student_embedding(db, student)
+            mentor_vecs = await EmbeddingStore.load_mentor_vectors(db, stale)
+            matrix = MatchingEngine._normalized_matrix([mentor_vecs.get(m.id) for m in stale], len(student_vec) or None)
+            scores = MatchingEngine._score_batch(student, student_vec, stale, matrix)
+            MatchScoreStore._write_scores(
+                db, rows, "mentor_id", {"student_id": student.id}, stale, scores,
+                {"student": lambda _: s_fp, "mentor": lambda m: m_fps[m.id]}
+            )
+        MatchScoreStore.set_state(db, student.id, s_fp, len(eligible) if complete else pool_size, complete)
+        db.commit()
+        return len(stale)
+
+    @staticmethod
+    async def rescore_mentor(db: Session, mentor: models.MentorProfile) -> int:
+        """
+        Brings one mentor's column up to date: the students already paired with
+        them, plus their nearest candidate students from the student index (so a
+        changed mentor can enter new students' lists). Eligible students outside
+        both were pruned from those students' lists and stay that way.
+        Returns the number of pairs re-scored.
+        """
+        rows = {r.student_id: r for r in db.query(models.MentorMatchScore).filter(models.MentorMatchScore.mentor_id == mentor.id)}
+        students = []
+        if mentor.user is not None and mentor.user.is_active:
+            students = await MatchingEngine.retrieve_candidate_students(db, mentor)
+            missing = set(rows) - {s.id for s in students}
+            if missing:
+                students += db.query(models.StudentProfile).join(models.User).filter(
+                    models.User.is_active == True, models.StudentProfile.id.in_(missing)
+                ).options(selectinload(models.StudentProfile.projects)).all()
+        domain_index = DomainFilter.get_index(db)
+        eligible = [s for s in students if MatchingEngine._mentor_admits(domain_index, s.major, mentor)]
+        eligible_ids = {s.id for s in eligible}
+
+        m_fp = mentor_fingerprint(mentor)
+        s_fps = {s.id: student_fingerprint(s) for s in eligible}
+
+        for student_id, row in rows.items():
+            if student_id not in eligible_ids:
+                db.delete(row)
+
+        stale = [
+            s for s in eligible
+            if s.id not in rows or rows[s.id].mentor_fingerprint != m_fp or rows[s.id].student_fingerprint != s_fps[s.id]
+        ]
+        if stale:
+            mentor_vec = await EmbeddingStore.refresh_mentor_embedding(db, mentor)
+            student_vecs = await EmbeddingStore.load_student_vectors(db, stale)
+            matrix = MatchingEngine._normalized_matrix([student_vecs.get(s.id) for s in stale], len(mentor_vec) or None)
+            scores = MatchingEngine._score_students_batch(mentor, mentor_vec, stale, matrix)
+            MatchScoreStore._write_scores(
+                db, rows, "student_id", {"mentor_id": mentor.id}, stale, scores,
+                {"student": lambda s: s_fps[s.id], "mentor": lambda _: m_fp}
+            )
+        db.commit()
+        return len(stale)
+
+    @staticmethod
+    def is_current(db: Session, student: models.StudentProfile, limit: int = 0) -> bool:
+        """
+        True once the student's rows were built for their current profile and
+        reach at least `limit` mentors. Mentor-side changes are kept current by
+        rescore_mentor.
+        """
+        state = db.get(models.StudentMatchState, student.id)
+        return (
+            state is not None
+            and state.student_fingerprint == student_fingerprint(student)
+            and (state.complete or state.candidate_count >= limit)
+        )
+
+    @staticmethod
+    def top_matches(db: Session, student_id: int, limit: int) -> List[models.MentorMatchScore]:
+        """
+        The student's best mentors above the display threshold, best first, with
+        everything build_match_result reads (user, trends and their topics) loaded
+        in the same query, so explanations are only built for these rows.
+        """
+        return db.query(models.MentorMatchScore).join(
+            models.MentorProfile, models.MentorProfile.id == models.MentorMatchScore.mentor_id
+        ).join(models.User, models.User.id == models.MentorProfile.user_id).filter(
+            models.MentorMatchScore.student_id == student_id,
+            models.MentorMatchScore.match_score > MATCH_THRESHOLD,
+            models.User.is_active == True
+        ).options(
+            joinedload(models.MentorMatchScore.mentor).joinedload(models.MentorProfile.user),
+            joinedload(models.MentorMatchScore.mentor).joinedload(models.MentorProfile.topic_trends).joinedload(models.MentorTopicTrend.topic)
+        ).order_by(models.MentorMatchScore.match_score.desc()).limit(limit).all()
+
+    @staticmethod
+    async def rescore_student_job(student_id: int):
+        """Background task: re-scores a student's row with its own session."""
+        db = SessionLocal()
+        try:
+            student = db.query(models.StudentProfile).filter(models.StudentProfile.id == student_id).first()
+            if student:
+                count = await MatchScoreStore.rescore_student(db, student)
+                logger.info(f"Re-scored {count} mentor pairs for student {student_id}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Re-scoring student {student_id} failed: {str(e)}")
+        finally:
+            db.close()
+
+    @staticmethod
+    async def rescore_mentor_job(mentor_id: int):
+        """Background task: re-scores a mentor's column with its own session."""
+        db = SessionLocal()
+        try:
+            mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == mentor_id).first()
+            if mentor:
+                count = await MatchScoreStore.rescore_mentor(db, mentor)
+                logger.info(f"Re-scored {count} student pairs for mentor {mentor_id}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Re-scoring mentor {mentor_id} failed: {str(e)}")
+        finally:
+            db.close()
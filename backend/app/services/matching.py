@@ -1,17 +1,35 @@
+from datetime import datetime
+from typing import Optional
 from app.db.models import Opportunity, User, StudentProfile
 
+def deadline_passed(opportunity: Opportunity, now: Optional[datetime] = None) -> bool:
+    """
+    Past-deadline opportunities take no applications: they're left out of
+    recommendations (OpportunitySkillMatrix.score) and score 0 here.
+    """
+    return opportunity.deadline is not None and opportunity.deadline < (now or datetime.utcnow())
+
 def calculate_match_score(student_user: User, opportunity: Opportunity):
     """
     Calculates the match percentage between a student and an opportunity
     based on weighted skills.
     """
+    if deadline_passed(opportunity):
+        return 0.0, {"score": 0.0, "details": "The application deadline has passed."}
+    
     # 1. Get student skills (set of skill IDs)
     student_skill_ids = {s.id for s in student_user.skills}
     
     # 2. Get opportunity required skills
     # opportunity.required_skills is a list of OpportunitySkill objects
-    required_skills = opportunity.required_skills
-    
+    return score_required_skills(student_skill_ids, opportunity.required_skills)
+
+def score_required_skills(student_skill_ids: set, required_skills: list):
+    """
+    Weighted-skill match for already loaded requirements (OpportunitySkill rows,
+    ideally with .skill eager-loaded). Lets listings score many opportunities
+    against one skill set without per-opportunity queries.
+    """
     if not required_skills:
         # If no skills are explicitly required, we might consider it a 100% match or 0%.
         # Usually if no requirements, anyone can apply.
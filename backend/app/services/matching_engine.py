@@ -1,11 +1,21 @@
+import heapq
 import logging
-import math
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Query, Session, joinedload, load_only, selectinload
 from app.db import models
-from app.services import ai_service
+from app.services.embedding_store import EmbeddingStore
+from app.services.domain_filter import DomainFilter, DomainFilterIndex, normalize_backgrounds, normalize_major, term_matches
 
 logger = logging.getLogger(__name__)
 
+# Number of nearest-neighbour candidates re-ranked by Lens 1/Lens 3 once the pool is large
+CANDIDATE_POOL_SIZE = 200
+
+# Minimum final score for a mentor to be shown to a student
+MATCH_THRESHOLD = 10
+
 class MatchingEngine:
     """
     Intelligent Matching Engine implementing the 3-Lens Architecture:
@@ -15,18 +25,20 @@ class MatchingEngine:
     """
 
     @staticmethod
-    def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-        if not vec1 or not vec2 or len(vec1) != len(vec2):
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        norm1 = math.sqrt(sum(a * a for a in vec1))
-        norm2 = math.sqrt(sum(b * b for b in vec2))
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-            
-        return dot_product / (norm1 * norm2)
+    def _normalized_matrix(vectors: List[List[float]], dim: Optional[int] = None) -> np.ndarray:
+        """
+        Stacks vectors into a row-normalized float32 matrix so cosine similarity
+        becomes a plain dot product. Missing or mis-sized vectors become zero rows.
+        """
+        if dim is None:
+            dim = max((len(v) for v in vectors), default=0)
+        matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+        for i, vec in enumerate(vectors):
+            if vec is not None and len(vec) == dim:
+                matrix[i] = vec
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
 
     @staticmethod
     def _lens_1_domain_filtering(student: models.StudentProfile, mentor: models.MentorProfile) -> bool:
@@ -38,50 +50,24 @@ class MatchingEngine:
         if not mentor.preferred_backgrounds:
             return True
             
+        return MatchingEngine._major_matches_backgrounds(student.major, mentor.preferred_backgrounds)
+
+    @staticmethod
+    def _major_matches_backgrounds(major: Optional[str], preferred_backgrounds: str) -> bool:
         # If student has no major specified, we can't filter, so keep them
-        if not student.major:
+        normalized_student = normalize_major(major)
+        if normalized_student is None:
             return True
-
-        student_major = student.major.lower().strip()
-        preferred = [bg.lower().strip() for bg in mentor.preferred_backgrounds.split(',')]
-        
-        # Check for direct match or substring match (e.g. "CS" in "Computer Science")
-        # Also check for broad categories
-        aliases = {
-            "cs": "computer science",
-            "cse": "computer science",
-            "ece": "electrical engineering",
-            "ee": "electrical engineering",
-            "ml": "machine learning",
-            "ai": "artificial intelligence"
-        }
         
-        normalized_student = aliases.get(student_major, student_major)
-        
-        for bg in preferred:
-            normalized_bg = aliases.get(bg, bg)
-            if normalized_student in normalized_bg or normalized_bg in normalized_student:
-                return True
-                
-        # If no match found in preferences, return False (Filter out)
-        return False
+        # Direct or substring match after alias expansion (e.g. "CS" -> "computer science")
+        return any(term_matches(normalized_student, bg) for bg in normalize_backgrounds(preferred_backgrounds))
 
     @staticmethod
-    async def _lens_2_semantic_similarity(student: models.StudentProfile, mentor: models.MentorProfile) -> float:
-        """
-        LENS 2: SEMANTIC SIMILARITY (SOFT MATCH)
-        Understand meaning, not just keywords.
-        """
-        # Construct rich text representations
-        student_text = f"{student.research_interests or ''} {student.bio or ''} {student.primary_skills or ''}"
-        mentor_text = f"{mentor.research_areas or ''} {mentor.bio or ''} {mentor.project_keywords or '' if hasattr(mentor, 'project_keywords') else ''}"
-        
-        # Get embeddings (Cached ideally, but for now live)
-        # In production, mentor embeddings should be pre-computed and stored in DB (pgvector)
-        student_vec = await ai_service.get_embedding(student_text)
-        mentor_vec = await ai_service.get_embedding(mentor_text)
-        
-        return MatchingEngine._cosine_similarity(student_vec, mentor_vec)
+    def _mentor_admits(domain_index: DomainFilterIndex, major: Optional[str], mentor: models.MentorProfile) -> bool:
+        # Set lookup in the precompiled index; mentors it hasn't seen yet use the direct rule
+        if mentor.id in domain_index:
+            return domain_index.passes(major, mentor.id)
+        return not mentor.preferred_backgrounds or MatchingEngine._major_matches_backgrounds(major, mentor.preferred_backgrounds)
 
     @staticmethod
     def _lens_3_profile_alignment(student: models.StudentProfile, mentor: models.MentorProfile) -> float:
@@ -106,30 +92,160 @@ class MatchingEngine:
                 score += 10
 
         # 2. Skill Overlap (20 pts)
+        score += 20 * MatchingEngine._skill_overlap_ratio(MatchingEngine._student_skill_set(student), mentor)
+            
+        # 3. Availability/Logistics (10 pts)
+        if mentor.accepting_phd_students == 'Yes':
+            score += 10
+        elif mentor.accepting_phd_students == 'Maybe':
+            score += 5
+            
+        return score
+
+    @staticmethod
+    def _student_skill_set(student: models.StudentProfile) -> set:
         # Parse text-based skills for now
         student_skills = set()
         if student.primary_skills:
             student_skills.update([s.strip().lower() for s in student.primary_skills.split(',')])
-            
+        return student_skills
+
+    @staticmethod
+    def _mentor_requirement_set(mentor: models.MentorProfile) -> set:
         mentor_reqs = set()
         if mentor.min_expectations:
             mentor_reqs.update([s.strip().lower() for s in mentor.min_expectations.split(',')])
+        return mentor_reqs
+
+    @staticmethod
+    def _skill_overlap_ratio(student_skills: set, mentor: models.MentorProfile, mentor_reqs: Optional[set] = None) -> float:
+        if mentor_reqs is None:
+            mentor_reqs = MatchingEngine._mentor_requirement_set(mentor)
             
-        if mentor_reqs:
-            overlap = student_skills.intersection(mentor_reqs)
-            overlap_ratio = len(overlap) / len(mentor_reqs)
-            score += 20 * overlap_ratio
-        else:
+        if not mentor_reqs:
             # If no specific expectations, give full points for skills to avoid penalizing
-            score += 20
-            
+            return 1.0
+        return len(student_skills.intersection(mentor_reqs)) / len(mentor_reqs)
+
+    @staticmethod
+    def _lens_1_mask(db: Session, student: models.StudentProfile, mentors: List[models.MentorProfile]) -> np.ndarray:
+        """
+        LENS 1 over a whole mentor pool, as a boolean mask.
+        The eligible mentor set for the student's major comes from the precompiled
+        domain index, so each mentor costs one set lookup.
+        """
+        domain_index = DomainFilter.get_index(db)
+        if domain_index.eligible_mentor_ids(student.major) is None:
+            return np.ones(len(mentors), dtype=bool)
+        return np.fromiter(
+            (MatchingEngine._mentor_admits(domain_index, student.major, m) for m in mentors),
+            dtype=bool, count=len(mentors)
+        )
+
+    @staticmethod
+    def _lens_3_alignment_batch(student: models.StudentProfile, mentors: List[models.MentorProfile]) -> np.ndarray:
+        """
+        LENS 3 over a whole mentor pool. Same point scheme as _lens_3_profile_alignment,
+        but the student-side terms are computed once and combined with array masks.
+        """
+        n = len(mentors)
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # 1. Academic Level Fit (10 pts)
+        if student.is_phd_seeker:
+            academic_fit = 10.0
+        elif student.degree and "master" in student.degree.lower():
+            academic_fit = 5.0
+        else:
+            academic_fit = 0.0
+        industry_fit = 10.0 if student.projects and len(student.projects) > 0 else 0.0
+        is_academic = np.fromiter((m.mentor_type == 'academic_supervisor' for m in mentors), dtype=bool, count=n)
+        level = np.where(is_academic, academic_fit, industry_fit)
+
+        # 2. Skill Overlap (20 pts)
+        student_skills = MatchingEngine._student_skill_set(student)
+        overlap = np.fromiter((MatchingEngine._skill_overlap_ratio(student_skills, m) for m in mentors), dtype=np.float32, count=n)
+
         # 3. Availability/Logistics (10 pts)
-        if mentor.accepting_phd_students == 'Yes':
-            score += 10
-        elif mentor.accepting_phd_students == 'Maybe':
-            score += 5
-            
-        return score
+        accepting = np.fromiter(
+            ({'Yes': 10.0, 'Maybe': 5.0}.get(m.accepting_phd_students, 0.0) for m in mentors),
+            dtype=np.float32, count=n
+        )
+
+        return (level + 20 * overlap + accepting).astype(np.float32)
+
+    @staticmethod
+    def _lens_3_alignment_for_mentor(mentor: models.MentorProfile, students: List[models.StudentProfile]) -> np.ndarray:
+        """
+        LENS 3 for one mentor against a pool of students (the transpose of
+        _lens_3_alignment_batch): mentor-side terms are computed once.
+        """
+        n = len(students)
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # 1. Academic Level Fit (10 pts)
+        if mentor.mentor_type == 'academic_supervisor':
+            level = np.fromiter(
+                (10.0 if s.is_phd_seeker else 5.0 if s.degree and "master" in s.degree.lower() else 0.0 for s in students),
+                dtype=np.float32, count=n
+            )
+        else:
+            level = np.fromiter((10.0 if s.projects and len(s.projects) > 0 else 0.0 for s in students), dtype=np.float32, count=n)
+
+        # 2. Skill Overlap (20 pts)
+        mentor_reqs = MatchingEngine._mentor_requirement_set(mentor)
+        overlap = np.fromiter(
+            (MatchingEngine._skill_overlap_ratio(MatchingEngine._student_skill_set(s), mentor, mentor_reqs) for s in students),
+            dtype=np.float32, count=n
+        )
+
+        # 3. Availability/Logistics (10 pts)
+        accepting = {'Yes': 10.0, 'Maybe': 5.0}.get(mentor.accepting_phd_students, 0.0)
+
+        return (level + 20 * overlap + accepting).astype(np.float32)
+
+    @classmethod
+    def _score_batch(cls, student: models.StudentProfile, student_vec: List[float],
+                     mentors: List[models.MentorProfile], mentor_matrix: np.ndarray):
+        """
+        Vectorized LENS 2 + LENS 3 for a pool of (already Lens-1 filtered) mentors.
+        mentor_matrix must be row-normalized and aligned with `mentors`.
+        Returns (semantic_sim, alignment_score, final_score) arrays.
+        """
+        n = len(mentors)
+        if n == 0 or mentor_matrix.size == 0:
+            semantic_sim = np.zeros(n, dtype=np.float32)
+        else:
+            query = cls._normalized_matrix([student_vec], mentor_matrix.shape[1])[0]
+            semantic_sim = mentor_matrix @ query
+
+        alignment = cls._lens_3_alignment_batch(student, mentors)
+
+        # FINAL MATCH SCORE
+        # Formula: 60% Semantic + 40% Alignment (capped at 100)
+        final = np.minimum(100.0, semantic_sim * 100 * 0.6 + alignment)
+        return semantic_sim, alignment, final
+
+    @classmethod
+    def _score_students_batch(cls, mentor: models.MentorProfile, mentor_vec: List[float],
+                              students: List[models.StudentProfile], student_matrix: np.ndarray):
+        """
+        Vectorized LENS 2 + LENS 3 for one mentor against a pool of students.
+        student_matrix must be row-normalized and aligned with `students`.
+        Returns (semantic_sim, alignment_score, final_score) arrays.
+        """
+        n = len(students)
+        if n == 0 or student_matrix.size == 0:
+            semantic_sim = np.zeros(n, dtype=np.float32)
+        else:
+            query = cls._normalized_matrix([mentor_vec], student_matrix.shape[1])[0]
+            semantic_sim = student_matrix @ query
+
+        alignment = cls._lens_3_alignment_for_mentor(mentor, students)
+        final = np.minimum(100.0, semantic_sim * 100 * 0.6 + alignment)
+        return semantic_sim, alignment, final
 
     @staticmethod
     def _generate_explanation(student: models.StudentProfile, mentor: models.MentorProfile, 
@@ -194,69 +310,250 @@ class MatchingEngine:
         return "Matched because " + " and ".join(reasons) + "."
 
     @classmethod
-    async def match_student_with_mentors(cls, student: models.StudentProfile, mentors: List[models.MentorProfile]) -> List[Dict[str, Any]]:
+    def build_match_result(cls, student: models.StudentProfile, mentor: models.MentorProfile,
+                           semantic_sim: float, alignment_score: float, final_score: float) -> Dict[str, Any]:
         """
-        Main Entry Point: Returns ranked list of mentors for a student.
+        Shapes one scored pair into the API match payload (with explanation and trends).
         """
-        matches = []
+        explanation = cls._generate_explanation(student, mentor, semantic_sim, alignment_score)
         
-        # Cache student embedding once
-        student_text = f"{student.research_interests or ''} {student.bio or ''} {student.primary_skills or ''}"
-        student_vec = await ai_service.get_embedding(student_text)
+        # Extract trend info for frontend display
+        trends = []
+        if hasattr(mentor, 'topic_trends') and mentor.topic_trends:
+            # Sort by count desc
+            sorted_trends = sorted(mentor.topic_trends, key=lambda x: x.total_count, reverse=True)
+            for t in sorted_trends[:3]: # Top 3
+                if t.topic:
+                    trends.append({
+                        "topic": t.topic.name,
+                        "status": t.trend_status,
+                        "count": t.total_count
+                    })
+
+        return {
+            "mentor_id": mentor.id,
+            "mentor_name": mentor.user.name if mentor.user else "Unknown",
+            "mentor_type": mentor.mentor_type,
+            "institution": mentor.university or mentor.company,
+            "position": mentor.position,
+            "match_score": round(final_score),
+            "semantic_score": round(semantic_sim * 100),
+            "alignment_score": round(alignment_score),
+            "explanation": explanation,
+            "research_areas": mentor.research_areas,
+            "accepting_students": mentor.accepting_phd_students,
+            "trends": trends
+        }
+
+    @staticmethod
+    def _generate_student_explanation(student: models.StudentProfile, mentor: models.MentorProfile,
+                                      semantic_score: float, alignment_score: float) -> str:
+        """
+        Mentor-facing counterpart of _generate_explanation.
+        """
+        reasons = []
         
-        for mentor in mentors:
-            # LENS 1: Domain Filtering
-            if not cls._lens_1_domain_filtering(student, mentor):
-                continue # Hard filter
-                
-            # LENS 2: Semantic Similarity (0-100 scale equivalent)
-            mentor_text = f"{mentor.research_areas or ''} {mentor.bio or ''}"
-            mentor_vec = await ai_service.get_embedding(mentor_text)
+        if semantic_score > 0.8:
+            reasons.append("their research interests closely follow your work")
+        elif semantic_score > 0.6:
+            reasons.append("their research interests overlap with yours")
+            
+        if alignment_score > 30:
+            reasons.append("their skills cover your lab's expectations")
+        elif alignment_score > 15:
+            reasons.append("their profile fits your general expectations")
             
-            semantic_sim = cls._cosine_similarity(student_vec, mentor_vec)
-            semantic_score = semantic_sim * 100 # Convert to 0-100
+        if mentor.mentor_type == 'academic_supervisor' and student.is_phd_seeker:
+            reasons.append("they are looking for a PhD position")
+        elif mentor.mentor_type != 'academic_supervisor' and student.projects:
+            reasons.append("they have hands-on project experience")
+            
+        if not reasons:
+            return "Profile matched based on general domain availability."
+            
+        return "Recommended because " + " and ".join(reasons) + "."
+
+    @classmethod
+    def build_student_match_result(cls, student: models.StudentProfile, mentor: models.MentorProfile,
+                                   semantic_sim: float, alignment_score: float, final_score: float) -> Dict[str, Any]:
+        """
+        Shapes one scored pair into the mentor-facing match payload.
+        """
+        return {
+            "student_id": student.id,
+            "student_name": student.user.name if student.user else "Unknown",
+            "headline": student.headline,
+            "university": student.university,
+            "degree": student.degree,
+            "major": student.major,
+            "is_phd_seeker": bool(student.is_phd_seeker),
+            "match_score": round(final_score),
+            "semantic_score": round(semantic_sim * 100),
+            "alignment_score": round(alignment_score),
+            "explanation": cls._generate_student_explanation(student, mentor, semantic_sim, alignment_score),
+            "research_interests": student.research_interests
+        }
+
+    @classmethod
+    def _eligible_student_ids(cls, db: Session, mentor: models.MentorProfile):
+        """
+        LENS 1 for a mentor over the whole student pool. The rule only depends on the
+        student's major, so it is evaluated once per distinct major and the survivors
+        are read from the major -> students index (or SQL while that isn't built).
+        Returns None when every student passes.
+        """
+        if not mentor.preferred_backgrounds:
+            return None
+        
+        domain_index = DomainFilter.get_index(db)
+        label_index = EmbeddingStore.student_major_index(db)
+        if label_index is not None:
+            majors = label_index.labels()
+        else:
+            majors = [m for (m,) in db.query(models.StudentProfile.major).distinct()]
+        eligible = [m for m in majors if cls._mentor_admits(domain_index, m, mentor)]
+        if len(eligible) == len(majors):
+            return None
+        if label_index is not None:
+            return label_index.ids_for(eligible)
+        
+        conditions = [models.StudentProfile.major.in_([m for m in eligible if m is not None])]
+        if None in eligible:
+            conditions.append(models.StudentProfile.major.is_(None))
+        return db.execute(
+            select(models.StudentProfile.id).join(models.User, models.User.id == models.StudentProfile.user_id)
+            .where(models.User.is_active == True, or_(*conditions))
+        ).scalars().all()
+
+    @classmethod
+    async def retrieve_candidate_students(cls, db: Session, mentor: models.MentorProfile,
+                                          pool_size: int = CANDIDATE_POOL_SIZE) -> List[models.StudentProfile]:
+        """
+        Candidate generation for reverse matching: the top `pool_size` Lens-1 eligible
+        students by embedding similarity from the student index.
+        Falls back to every active student while the index is missing or small.
+        """
+        query = db.query(models.StudentProfile).join(models.User).filter(models.User.is_active == True).options(
+            joinedload(models.StudentProfile.user),
+            selectinload(models.StudentProfile.projects)
+        )
+        
+        index = EmbeddingStore.student_index(db)
+        if index is None or len(index) <= pool_size:
+            return query.all()
             
-            # LENS 3: Profile Alignment (0-40 scale in our implementation, normalized to 100 range)
-            alignment_score = cls._lens_3_profile_alignment(student, mentor)
+        allowed_ids = cls._eligible_student_ids(db, mentor)
+        if allowed_ids is not None and len(allowed_ids) == 0:
+            return []
             
-            # FINAL MATCH SCORE
-            # Formula: 60% Semantic + 40% Alignment
-            # (Domain filter is binary)
-            final_score = (semantic_score * 0.6) + (alignment_score)
-            final_score = min(100.0, final_score) # Cap at 100
+        mentor_vec = await EmbeddingStore.refresh_mentor_embedding(db, mentor)
+        candidate_ids, _ = index.search(mentor_vec, pool_size, allowed_ids)
+        if not candidate_ids:
+            return query.all()
             
-            if final_score > 10: # Minimum threshold to show
-                explanation = cls._generate_explanation(student, mentor, semantic_sim, alignment_score)
-                
-                # Extract trend info for frontend display
-                trends = []
-                if hasattr(mentor, 'topic_trends') and mentor.topic_trends:
-                    # Sort by count desc
-                    sorted_trends = sorted(mentor.topic_trends, key=lambda x: x.total_count, reverse=True)
-                    for t in sorted_trends[:3]: # Top 3
-                        if t.topic:
-                            trends.append({
-                                "topic": t.topic.name,
-                                "status": t.trend_status,
-                                "count": t.total_count
-                            })
-
-                matches.append({
-                    "mentor_id": mentor.id,
-                    "mentor_name": mentor.user.name if mentor.user else "Unknown",
-                    "mentor_type": mentor.mentor_type,
-                    "institution": mentor.university or mentor.company,
-                    "position": mentor.position,
-                    "match_score": round(final_score),
-                    "semantic_score": round(semantic_score),
-                    "alignment_score": round(alignment_score),
-                    "explanation": explanation,
-                    "research_areas": mentor.research_areas,
-                    "accepting_students": mentor.accepting_phd_students,
-                    "trends": trends
-                })
+        return query.filter(models.StudentProfile.id.in_(candidate_ids)).all()
+
+    @classmethod
+    async def match_mentor_with_students(cls, db: Session, mentor: models.MentorProfile, students: List[models.StudentProfile],
+                                         limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Reverse entry point: returns a ranked list of students for a mentor.
+        Same lenses and score scale as the student-side scores in MatchScoreStore.
+        """
+        # LENS 1: Domain Filtering
+        domain_index = DomainFilter.get_index(db)
+        eligible = [s for s in students if cls._mentor_admits(domain_index, s.major, mentor)]
+        
+        # Stored embeddings: one bulk read for students, mentor only re-embedded if their text changed
+        mentor_vec = await EmbeddingStore.refresh_mentor_embedding(db, mentor)
+        student_vecs = await EmbeddingStore.load_student_vectors(db, eligible)
+        matrix = cls._normalized_matrix([student_vecs.get(s.id) for s in eligible], len(mentor_vec) or None)
         
-        # Sort by Final Match Score (Desc)
-        matches.sort(key=lambda x: x["match_score"], reverse=True)
+        # LENS 2 + LENS 3
+        semantic_sims, alignment_scores, final_scores = cls._score_students_batch(mentor, mentor_vec, eligible, matrix)
         
-        return matches
+        top = cls._select_top(final_scores, limit)
+        
+        # Display relations for the selected rows only, in one query
+        top_students = cls._load_student_display([eligible[i] for i in top], db)
+        return [
+            cls.build_student_match_result(
+                top_students[eligible[i].id], mentor, float(semantic_sims[i]), float(alignment_scores[i]), float(final_scores[i])
+            )
+            for i in top
+        ]
+
+    @staticmethod
+    def mentor_pool_query(db: Session) -> Query:
+        """
+        Active mentors as the matching engine reads them: only the columns the
+        three lenses and embedding text use, with topic trends (and their topics)
+        bulk-loaded by IN queries, so round trips don't grow per mentor. Rows are
+        materialized, not streamed: retrieval re-ranks the candidate set and the
+        batch precompute builds its matrices from the whole pool. Display columns
+        are loaded afterwards for the returned rows only.
+        """
+        return db.query(models.MentorProfile).join(models.User).filter(models.User.is_active == True).options(
+            load_only(
+                models.MentorProfile.id,
+                models.MentorProfile.user_id,
+                models.MentorProfile.research_areas,
+                models.MentorProfile.bio,
+                models.MentorProfile.preferred_backgrounds,
+                models.MentorProfile.min_expectations,
+                models.MentorProfile.mentor_type,
+                models.MentorProfile.accepting_phd_students
+            ),
+            selectinload(models.MentorProfile.topic_trends).joinedload(models.MentorTopicTrend.topic)
+        )
+
+    @classmethod
+    async def retrieve_candidate_mentors(cls, db: Session, student: models.StudentProfile,
+                                         pool_size: int = CANDIDATE_POOL_SIZE) -> Tuple[List[models.MentorProfile], bool]:
+        """
+        Candidate generation: the top `pool_size` mentors by embedding similarity from the
+        in-process index, so the cost of a match request doesn't grow with the mentor pool.
+        Falls back to every active mentor while the index is missing or small.
+        Returns (mentors, complete); complete means no eligible mentor was pruned.
+        """
+        query = cls.mentor_pool_query(db)
+        
+        index = EmbeddingStore.mentor_index(db)
+        if index is None or len(index) <= pool_size:
+            return query.all(), True
+            
+        # LENS 1 prunes the search space before any similarity is computed
+        allowed_ids = DomainFilter.get_index(db).eligible_mentor_ids(student.major)
+        if allowed_ids is not None and not allowed_ids:
+            return [], True
+        if allowed_ids is not None and len(allowed_ids) <= pool_size:
+            return query.filter(models.MentorProfile.id.in_(list(allowed_ids))).all(), True
+            
+        student_vec = await EmbeddingStore.refresh_student_embedding(db, student)
+        candidate_ids, _ = index.search(student_vec, pool_size, allowed_ids)
+        if not candidate_ids:
+            return query.all(), True
+            
+        return query.filter(models.MentorProfile.id.in_(candidate_ids)).all(), False
+
+    @staticmethod
+    def _select_top(final_scores: np.ndarray, limit: Optional[int]) -> List[int]:
+        """
+        Indices of rows above the display threshold, best first.
+        With a limit, a heap keeps only the best `limit` rows instead of sorting everything.
+        """
+        candidates = np.flatnonzero(final_scores > MATCH_THRESHOLD).tolist()
+        key = lambda i: round(float(final_scores[i])) # Ties keep pool order, as the API's rounded score did
+        if limit is None or limit >= len(candidates):
+            return sorted(candidates, key=key, reverse=True)
+        return heapq.nlargest(limit, candidates, key=key)
+
+    @staticmethod
+    def _load_student_display(students: List[models.StudentProfile], db: Session) -> Dict[int, models.StudentProfile]:
+        if not students:
+            return {}
+        loaded = db.query(models.StudentProfile).filter(models.StudentProfile.id.in_([s.id for s in students])).options(
+            joinedload(models.StudentProfile.user),
+            joinedload(models.StudentProfile.projects)
+        ).all()
+        return {s.id: s for s in loaded}
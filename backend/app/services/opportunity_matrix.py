@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.db import models
+
+logger = logging.getLogger(__name__)
+
+
+class OpportunitySkillMatrix:
+    """
+    Sparse (opportunities x skills) weight matrix in COO form, one row per open
+    opportunity. Scoring a student is a gather on their skill indicator vector
+    plus one bincount over the non-zeros, giving the same weighted-skill score
+    as matching.calculate_match_score for every open opportunity at once.
+    """
+
+    def __init__(self):
+        # opportunity_id -> (skill_ids, weights, deadline timestamp or nan)
+        self._rows: Dict[int, Tuple[np.ndarray, np.ndarray, float]] = {}
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def set_opportunity(self, opportunity_id: int, skills: Iterable[Tuple[int, int]], deadline: Optional[datetime] = None):
+        skills = list(skills)
+        skill_ids = np.fromiter((s for s, _ in skills), dtype=np.int64, count=len(skills))
+        weights = np.fromiter((w or 0 for _, w in skills), dtype=np.float64, count=len(skills))
+        with self._lock:
+            self._rows[opportunity_id] = (skill_ids, weights, deadline.timestamp() if deadline else np.nan)
+            self._compiled = None
+
+    def remove_opportunity(self, opportunity_id: int):
+        with self._lock:
+            if self._rows.pop(opportunity_id, None) is not None:
+                self._compiled = None
+
+    def _compile(self):
+        # Rebuilt lazily after writes: rows are kept per opportunity, arrays are derived
+        if self._compiled is not None:
+            return self._compiled
+        opportunity_ids = np.fromiter(self._rows, dtype=np.int64, count=len(self._rows))
+        rows = [self._rows[o] for o in opportunity_ids.tolist()]
+        nnz = np.array([len(r[0]) for r in rows], dtype=np.int64)
+        skill_ids = np.concatenate([r[0] for r in rows]) if rows else np.empty(0, dtype=np.int64)
+        weights = np.concatenate([r[1] for r in rows]) if rows else np.empty(0, dtype=np.float64)
+        skill_columns = np.unique(skill_ids)
+        entry_rows = np.repeat(np.arange(len(rows)), nnz)
+        self._compiled = {
+            "opportunity_ids": opportunity_ids,
+            "entry_rows": entry_rows,
+            "columns": np.searchsorted(skill_columns, skill_ids),
+            "weights": weights,
+            "skill_ids": skill_columns,
+            "totals": np.bincount(entry_rows, weights=weights, minlength=len(rows)),
+            "deadlines": np.array([r[2] for r in rows], dtype=np.float64)
+        }
+        return self._compiled
+
+    def score(self, student_skill_ids: Iterable[int], now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (opportunity_ids, scores) for every open opportunity whose deadline
+        hasn't passed (matching.deadline_passed). Scores are 0-100, rounded like
+        calculate_match_score.
+        """
+        with self._lock:
+            m = self._compile()
+        n = len(m["opportunity_ids"])
+        if n == 0:
+            return m["opportunity_ids"], np.zeros(0)
+
+        # Student skill indicator over the matrix's skill columns
+        owned = np.fromiter(set(student_skill_ids), dtype=np.int64)
+        indicator = np.isin(m["skill_ids"], owned).astype(np.float64)
+
+        matched = np.bincount(m["entry_rows"], weights=m["weights"] * indicator[m["columns"]], minlength=n)
+        totals = m["totals"]
+        # No requirements (or zero total weight) counts as a full match, as in calculate_match_score
+        scores = np.where(totals > 0, np.divide(matched * 100.0, totals, out=np.zeros(n), where=totals > 0), 100.0)
+
+        current = np.isnan(m["deadlines"]) | (m["deadlines"] >= (now or datetime.utcnow()).timestamp())
+        return m["opportunity_ids"][current], np.round(scores[current], 1)
+
+    def top(self, student_skill_ids: Iterable[int], k: int) -> List[Tuple[int, float]]:
+        """Best k (opportunity_id, score) pairs, ties broken by newest opportunity."""
+        opportunity_ids, scores = self.score(student_skill_ids)
+        if len(scores) == 0:
+            return []
+        if k < len(scores):
+            # Keep everything tied with the k-th score so the tie-break below stays exact
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            keep = scores >= kth
+            opportunity_ids, scores = opportunity_ids[keep], scores[keep]
+        order = np.lexsort((-opportunity_ids, -scores))[:k]
+        return [(int(opportunity_ids[i]), float(scores[i])) for i in order]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class OpportunityMatrix:
+    """
+    Process-wide OpportunitySkillMatrix over open opportunities. Opportunity
+    writes through the API update it in place and bump the "opportunities"
+    DataVersion, so other processes see any edit (deadlines, weights) within
+    REFRESH_INTERVAL seconds; row counts and sums still catch seed scripts.
+    """
+
+    REFRESH_INTERVAL = 5.0
+    VERSION_KEY = "opportunities"
+
+    _matrix: Optional[OpportunitySkillMatrix] = None
+    _version = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @classmethod
+    def _current_version(cls, db: Session):
+        writes = db.query(models.DataVersion.version).filter(models.DataVersion.key == cls.VERSION_KEY).scalar()
+        open_opps = db.query(func.count(models.Opportunity.id), func.max(models.Opportunity.id)).filter(
+            models.Opportunity.is_open == True
+        ).one()
+        skills = db.query(func.count(models.OpportunitySkill.skill_id), func.sum(models.OpportunitySkill.weight)).one()
+        return (writes,) + tuple(open_opps) + tuple(skills)
+
+    @classmethod
+    def _bump_version(cls, db: Session):
+        bumped = db.query(models.DataVersion).filter(models.DataVersion.key == cls.VERSION_KEY).update({
+            models.DataVersion.version: models.DataVersion.version + 1,
+            models.DataVersion.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        if not bumped:
+            try:
+                db.add(models.DataVersion(key=cls.VERSION_KEY, version=1))
+                db.commit()
+                return
+            except IntegrityError:
+                # Another process created the row first
+                db.rollback()
+                return cls._bump_version(db)
+        db.commit()
+
+    @staticmethod
+    def _build(db: Session) -> OpportunitySkillMatrix:
+        matrix = OpportunitySkillMatrix()
+        opportunities = db.query(models.Opportunity.id, models.Opportunity.deadline).filter(models.Opportunity.is_open == True).all()
+        skills: Dict[int, List[Tuple[int, int]]] = {o.id: [] for o in opportunities}
+        for opportunity_id, skill_id, weight in db.query(
+            models.OpportunitySkill.opportunity_id, models.OpportunitySkill.skill_id, models.OpportunitySkill.weight
+        ).join(models.Opportunity).filter(models.Opportunity.is_open == True):
+            skills[opportunity_id].append((skill_id, weight))
+        for o in opportunities:
+            matrix.set_opportunity(o.id, skills[o.id], o.deadline)
+        logger.info(f"Built opportunity skill matrix for {len(matrix)} open opportunities")
+        return matrix
+
+    @classmethod
+    def get(cls, db: Session) -> OpportunitySkillMatrix:
+        now = time.time()
+        if cls._matrix is not None and now - cls._checked_at < cls.REFRESH_INTERVAL:
+            return cls._matrix
+        with cls._lock:
+            version = cls._current_version(db)
+            if cls._matrix is None or version != cls._version:
+                cls._matrix = cls._build(db)
+            cls._version = version
+            cls._checked_at = now
+        return cls._matrix
+
+    @classmethod
+    def refresh_opportunity(cls, db: Session, opportunity: models.Opportunity):
+        """Call after an opportunity (or its required skills) is written and committed."""
+        if cls._matrix is not None:
+            if opportunity.is_open:
+                cls._matrix.set_opportunity(
+                    opportunity.id, [(s.skill_id, s.weight) for s in opportunity.required_skills], opportunity.deadline
+                )
+            else:
+                cls._matrix.remove_opportunity(opportunity.id)
+        cls._bump_version(db)
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+from app.services.research_service import ResearchService
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces acquisitions out to at most `per_minute`, shared by every worker."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute and per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class ResearchPipeline:
+    """
+    Ingests publications and (re)analyzes trends for every mentor that needs it.
+
+    Due mentors are streamed in id order, processed by `concurrency` workers
+    (each with its own session) and every LLM-backed step waits on one shared
+    rate limiter. Progress is checkpointed per mentor in research_pipeline_states,
+    so a rerun only picks up mentors that weren't finished. If analyses added
+    topics, the corpus is retagged against them once at the end.
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, concurrency: int = None, rate_per_minute: float = None,
+                 force_analysis: bool = False, limit: Optional[int] = None):
+        self.concurrency = concurrency or settings.RESEARCH_PIPELINE_CONCURRENCY
+        self.limiter = RateLimiter(settings.RESEARCH_PIPELINE_RATE if rate_per_minute is None else rate_per_minute)
+        self.force_analysis = force_analysis
+        self.limit = limit
+        self.stats = {"mentors": 0, "ingested": 0, "analyzed": 0, "failed": 0, "llm_calls": 0, "new_topics": 0, "retagged": 0}
+
+    def _due_pages(self, db: Session):
+        """Pages of (mentor_id, publication_count, needs_ingest, needs_analysis), keyset-paginated."""
+        state = models.ResearchPipelineState
+        pub_counts = db.query(
+            models.Publication.mentor_profile_id.label("mentor_id"), func.count(models.Publication.id).label("n")
+        ).filter(models.Publication.mentor_profile_id.isnot(None)).group_by(models.Publication.mentor_profile_id).subquery()
+        pub_count = func.coalesce(pub_counts.c.n, 0)
+
+        query = db.query(models.MentorProfile.id, pub_count, state.analyzed_at, state.publication_count).outerjoin(
+            pub_counts, pub_counts.c.mentor_id == models.MentorProfile.id
+        ).outerjoin(state, state.mentor_id == models.MentorProfile.id)
+        if not self.force_analysis:
+            query = query.filter(or_(pub_count == 0, state.analyzed_at.is_(None), state.publication_count != pub_count))
+
+        last_id, remaining = 0, self.limit
+        while remaining is None or remaining > 0:
+            size = self.PAGE_SIZE if remaining is None else min(self.PAGE_SIZE, remaining)
+            page = query.filter(models.MentorProfile.id > last_id).order_by(models.MentorProfile.id).limit(size).all()
+            if not page:
+                return
+            last_id = page[-1][0]
+            if remaining is not None:
+                remaining -= len(page)
+            yield [
+                (mentor_id, count, count == 0, self.force_analysis or analyzed_at is None or analyzed_count != count)
+                for mentor_id, count, analyzed_at, analyzed_count in page
+            ]
+
+    @staticmethod
+    def _checkpoint(db: Session, mentor_id: int, **values):
+        # Written only after the mentor's work, so no write transaction is held across LLM calls
+        state = db.get(models.ResearchPipelineState, mentor_id)
+        if state is None:
+            state = models.ResearchPipelineState(mentor_id=mentor_id)
+            db.add(state)
+        for key, value in values.items():
+            setattr(state, key, value)
+        state.updated_at = datetime.utcnow()
+        db.commit()
+
+    async def _llm_step(self):
+        # Every LLM-backed step waits on the shared limiter; counted here so the
+        # reported rate is this pipeline's own, not the process-wide executor's
+        await self.limiter.acquire()
+        self.stats["llm_calls"] += 1
+
+    async def _process(self, mentor_id: int, needs_ingest: bool, needs_analysis: bool):
+        db = SessionLocal()
+        try:
+            done = {"last_error": None}
+            if needs_ingest:
+                await self._llm_step()
+                await ResearchService.ingest_publications(db, mentor_id, raise_errors=True)
+                done["ingested_at"] = datetime.utcnow()
+                self.stats["ingested"] += 1
+
+            count = db.query(models.Publication).filter(models.Publication.mentor_profile_id == mentor_id).count()
+            if count and (needs_analysis or needs_ingest):
+                await self._llm_step()
+                self.stats["new_topics"] += await ResearchService.analyze_trends(db, mentor_id, raise_errors=True)
+                done["analyzed_at"] = datetime.utcnow()
+                done["publication_count"] = count
+                self.stats["analyzed"] += 1
+
+            self._checkpoint(db, mentor_id, **done)
+        except Exception as e:
+            db.rollback()
+            self.stats["failed"] += 1
+            logger.error(f"Research pipeline failed for mentor {mentor_id}: {str(e)}")
+            try:
+                self._checkpoint(db, mentor_id, last_error=str(e))
+            except Exception as checkpoint_error:
+                db.rollback()
+                logger.error(f"Could not record the failure for mentor {mentor_id}: {str(checkpoint_error)}")
+        finally:
+            db.close()
+            self.stats["mentors"] += 1
+
+    def _throughput(self, started: float) -> Dict[str, Any]:
+        elapsed = max(time.time() - started, 1e-6)
+        return {
+            **self.stats,
+            "seconds": round(elapsed, 1),
+            "mentors_per_min": round(self.stats["mentors"] * 60 / elapsed, 1),
+            "llm_calls_per_min": round(self.stats["llm_calls"] * 60 / elapsed, 1)
+        }
+
+    async def run(self, on_progress=None) -> Dict[str, Any]:
+        started = time.time()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                # A worker must outlive any one mentor, or the producer blocks on a full queue
+                try:
+                    await self._process(*item)
+                    if on_progress:
+                        on_progress(self._throughput(started))
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"Research pipeline worker error for mentor {item[0]}: {str(e)}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        db = SessionLocal()
+        try:
+            for page in self._due_pages(db):
+                db.expunge_all()
+                for mentor_id, _, needs_ingest, needs_analysis in page:
+                    await queue.put((mentor_id, needs_ingest, needs_analysis))
+        finally:
+            db.close()
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        if self.stats["new_topics"]:
+            try:
+                self.stats["retagged"] = await asyncio.to_thread(ResearchService.retag_all_publications)
+            except Exception as e:
+                logger.error(f"Research pipeline retag failed: {str(e)}")
+        return self._throughput(started)
+
+
+async def run_research_pipeline(concurrency: int = None, rate_per_minute: float = None,
+                                force_analysis: bool = False, limit: Optional[int] = None,
+                                on_progress=None) -> Dict[str, Any]:
+    """
+    Runs the pipeline once, calling on_progress with the running totals after
+    each mentor. Inside the API it runs as the research_pipeline job, whose
+    concurrency of 1 keeps runs from overlapping.
+    """
+    try:
+        pipeline = ResearchPipeline(concurrency, rate_per_minute, force_analysis, limit)
+        stats = await pipeline.run(on_progress=on_progress)
+        stats["finished_at"] = datetime.utcnow().isoformat()
+        logger.info(f"Research pipeline complete: {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"Research pipeline failed: {str(e)}")
+        raise
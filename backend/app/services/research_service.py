@@ -1,18 +1,30 @@
+import json
 import logging
+from collections import Counter
+from datetime import datetime
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.cache import cache, mentor_tag
+from app.core.config import settings
 from app.db import models
+from app.db.database import SessionLocal
 from app.services import ai_service
-from typing import List, Dict, Any
+from app.services.embedding_store import EmbeddingStore, publication_embedding_text
+from app.services.topic_matcher import TopicMatcher, TopicVocabulary, similarity_tags
+from typing import List, Dict, Any, Optional, Set
 
 logger = logging.getLogger(__name__)
 
 class ResearchService:
     
     @staticmethod
-    async def ingest_publications(db: Session, mentor_id: int):
+    async def ingest_publications(db: Session, mentor_id: int, raise_errors: bool = False):
         """
         Simulates ingestion of publications for a mentor.
+        raise_errors=True lets a failed AI call propagate (job queue and pipeline).
         """
         mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == mentor_id).first()
         if not mentor:
@@ -29,11 +41,12 @@ class ResearchService:
         pubs_data = await ai_service.generate_simulated_publications(
             mentor_name=mentor.user.name if mentor.user else "Professor",
             research_areas=mentor.research_areas,
-            bio=mentor.bio
+            bio=mentor.bio,
+            raise_errors=raise_errors
         )
         
-        for p in pubs_data:
-            pub = models.Publication(
+        pubs = [
+            models.Publication(
                 mentor_profile_id=mentor_id,
                 title=p.get("title"),
                 description=p.get("abstract"),
@@ -41,100 +54,376 @@ class ResearchService:
                 journal_conference=p.get("journal"),
                 citation_count=p.get("citation_count", 0)
             )
-            db.add(pub)
+            for p in pubs_data
+        ]
+        db.add_all(pubs)
+        db.flush()
+        # Tagged against the known topics in the same transaction, so trends include them
+        ResearchService.tag_publications(db, pubs)
         
         db.commit()
         logger.info(f"Ingested {len(pubs_data)} publications for mentor {mentor_id}")
 
     @staticmethod
-    async def analyze_trends(db: Session, mentor_id: int):
+    def _insert_ignore(db: Session, model, rows: List[Dict[str, Any]], conflict_columns: List[str]):
+        """
+        Bulk INSERT that skips rows clashing on the unique `conflict_columns`:
+        one ON CONFLICT DO NOTHING statement on SQLite/PostgreSQL, otherwise
+        one SELECT of the existing keys plus one INSERT of the rest.
+        """
+        if not rows:
+            return
+        table = model.__table__
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            dialect_insert = sqlite_insert if dialect == "sqlite" else pg_insert
+            db.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=conflict_columns), rows)
+            return
+        
+        key_columns = [table.c[c] for c in conflict_columns]
+        keys = {tuple(r[c] for c in conflict_columns) for r in rows}
+        if len(conflict_columns) == 1:
+            existing = {(k,) for (k,) in db.execute(select(key_columns[0]).where(key_columns[0].in_([k[0] for k in keys])))}
+        else:
+            existing = {tuple(r) for r in db.execute(select(*key_columns).where(tuple_(*key_columns).in_(list(keys))))}
+        new_rows = [r for r in rows if tuple(r[c] for c in conflict_columns) not in existing]
+        if new_rows:
+            db.execute(table.insert(), new_rows)
+
+    @staticmethod
+    def _publication_year(publication_date: Optional[str]) -> Optional[int]:
+        try:
+            return int(publication_date[:4])
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _compute_trend(year_counts: Dict[int, int], current_year: int) -> Dict[str, Any]:
+        # Simple Trend Logic
+        # Compare recent (last 3 years) vs previous
+        total_count = sum(year_counts.values())
+        recent_count = sum(n for year, n in year_counts.items() if year >= current_year - 3)
+        old_count = total_count - recent_count
+        
+        status = "Stable"
+        if recent_count > old_count * 1.5: # Arbitrary threshold
+            status = "Rising"
+        elif recent_count == 0:
+            status = "Declining"
+        return {"trend_status": status, "total_count": total_count, "last_active_year": max(year_counts)}
+
+    @staticmethod
+    def apply_topic_links(db: Session, added=(), removed=()) -> int:
+        """
+        Folds added/removed (mentor_id, topic_id, year) tags into the per-year
+        counts and re-derives the MentorTopicTrend rows of the (mentor, topic)
+        pairs they touch, so the cost follows the tags changed, not the mentor's
+        publication count. Undated tags don't count towards trends. The caller
+        commits. Returns the number of trends re-derived.
+        """
+        deltas = Counter(k for k in added if k[0] is not None and k[2] is not None)
+        deltas.subtract(k for k in removed if k[0] is not None and k[2] is not None)
+        deltas = {k: d for k, d in deltas.items() if d}
+        if not deltas:
+            return 0
+        
+        counts = models.MentorTopicYearCount
+        stored = {
+            (r.mentor_id, r.topic_id, r.year): r for r in db.query(counts).filter(
+                tuple_(counts.mentor_id, counts.topic_id, counts.year).in_(list(deltas))
+            ).all()
+        }
+        for (m_id, topic_id, year), delta in deltas.items():
+            row = stored.get((m_id, topic_id, year))
+            if row is None:
+                if delta > 0:
+                    db.add(counts(mentor_id=m_id, topic_id=topic_id, year=year, count=delta))
+            elif row.count + delta > 0:
+                row.count += delta
+            else:
+                db.delete(row)
+        db.flush()
+        
+        # Re-derive the touched trends from their (few) per-year counts
+        pairs = list({(m_id, topic_id) for m_id, topic_id, _ in deltas})
+        year_counts = {pair: {} for pair in pairs}
+        for m_id, topic_id, year, n in db.query(counts.mentor_id, counts.topic_id, counts.year, counts.count).filter(
+            tuple_(counts.mentor_id, counts.topic_id).in_(pairs)
+        ):
+            year_counts[(m_id, topic_id)][year] = n
+        trends = {
+            (t.mentor_id, t.topic_id): t for t in db.query(models.MentorTopicTrend).filter(
+                tuple_(models.MentorTopicTrend.mentor_id, models.MentorTopicTrend.topic_id).in_(pairs)
+            ).all()
+        }
+        current_year = datetime.utcnow().year
+        for (m_id, topic_id), by_year in year_counts.items():
+            trend = trends.get((m_id, topic_id))
+            if not by_year:
+                if trend is not None:
+                    db.delete(trend)
+                continue
+            if trend is None:
+                trend = models.MentorTopicTrend(mentor_id=m_id, topic_id=topic_id)
+                db.add(trend)
+            for field, value in ResearchService._compute_trend(by_year, current_year).items():
+                setattr(trend, field, value)
+        return len(pairs)
+
+    @staticmethod
+    def rebuild_topic_counts(db: Session, mentor_id: int) -> int:
+        """
+        Recomputes a mentor's per-year counts and trends from their publication
+        tags (e.g. for data tagged before the counts existed). The caller commits.
+        """
+        db.query(models.MentorTopicYearCount).filter(models.MentorTopicYearCount.mentor_id == mentor_id).delete(synchronize_session=False)
+        db.query(models.MentorTopicTrend).filter(models.MentorTopicTrend.mentor_id == mentor_id).delete(synchronize_session=False)
+        tags = db.query(models.PublicationTopic.topic_id, models.Publication.publication_date).join(
+            models.Publication, models.Publication.id == models.PublicationTopic.publication_id
+        ).filter(models.Publication.mentor_profile_id == mentor_id).all()
+        return ResearchService.apply_topic_links(
+            db, added=[(mentor_id, topic_id, ResearchService._publication_year(date)) for topic_id, date in tags]
+        )
+
+    @staticmethod
+    def remove_publications(db: Session, publication_ids: List[int]):
+        """
+        Call before deleting publications: drops their tags and stored vectors,
+        takes them out of topic centroids and decrements the per-year counts.
+        The caller commits.
+        """
+        if not publication_ids:
+            return
+        tags = db.query(
+            models.PublicationTopic.publication_id, models.PublicationTopic.topic_id,
+            models.Publication.mentor_profile_id, models.Publication.publication_date
+        ).join(models.Publication, models.Publication.id == models.PublicationTopic.publication_id).filter(
+            models.PublicationTopic.publication_id.in_(publication_ids)
+        ).all()
+        
+        members = {}
+        if tags:
+            vectors = EmbeddingStore.stored_publication_vectors(db, publication_ids)
+            for publication_id, topic_id, _, _ in tags:
+                if publication_id in vectors:
+                    members.setdefault(topic_id, []).append(vectors[publication_id])
+            topic_embeddings = {
+                r.topic_id: r for r in db.query(models.TopicEmbedding).filter(models.TopicEmbedding.topic_id.in_(list(members))).all()
+            } if members else {}
+            EmbeddingStore.remove_topic_members(topic_embeddings, members)
+        
+        db.query(models.PublicationTopic).filter(models.PublicationTopic.publication_id.in_(publication_ids)).delete(synchronize_session=False)
+        db.query(models.PublicationEmbedding).filter(models.PublicationEmbedding.publication_id.in_(publication_ids)).delete(synchronize_session=False)
+        ResearchService.apply_topic_links(db, removed=[
+            (m_id, topic_id, ResearchService._publication_year(date)) for _, topic_id, m_id, date in tags
+        ])
+
+    @staticmethod
+    def refresh_trend_statuses(db: Session, current_year: Optional[int] = None) -> int:
+        """
+        Re-derives every trend status against the current year from the per-year
+        counts. Statuses only depend on the year otherwise, so this runs once per
+        new year (see the refresh_trend_statuses job). Returns statuses changed.
+        """
+        current_year = current_year or datetime.utcnow().year
+        counts = models.MentorTopicYearCount
+        year_counts = {}
+        for m_id, topic_id, year, n in db.query(counts.mentor_id, counts.topic_id, counts.year, counts.count):
+            year_counts.setdefault((m_id, topic_id), {})[year] = n
+        
+        changes = []
+        for trend_id, m_id, topic_id, status in db.query(
+            models.MentorTopicTrend.id, models.MentorTopicTrend.mentor_id, models.MentorTopicTrend.topic_id, models.MentorTopicTrend.trend_status
+        ):
+            by_year = year_counts.get((m_id, topic_id))
+            if by_year:
+                new_status = ResearchService._compute_trend(by_year, current_year)["trend_status"]
+                if new_status != status:
+                    changes.append({"id": trend_id, "trend_status": new_status})
+        if changes:
+            db.execute(update(models.MentorTopicTrend), changes)
+        db.commit()
+        logger.info(f"Refreshed trend statuses for {current_year}: {len(changes)} changed")
+        return len(changes)
+
+    @staticmethod
+    async def analyze_trends(db: Session, mentor_id: int, raise_errors: bool = False):
         """
         Analyzes publications to extract topics and compute trends.
+        Papers are tagged by phrase match and by embedding similarity to topic
+        centroids; only tags that are new are written and folded into the
+        per-year counts trends derive from. Writes are set-based (topic upsert,
+        then link insert, centroid and trend updates in one transaction), so the
+        number of queries doesn't grow with publications.
+        Returns the number of topics new to the vocabulary; other mentors' papers
+        are only tagged with them by a retag (see retag_publications).
         """
-        mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == mentor_id).first()
+        mentor = db.query(models.MentorProfile.id).filter(models.MentorProfile.id == mentor_id).first()
         if not mentor:
             raise ValueError("Mentor not found")
             
-        # 1. Fetch Publications
-        pubs = db.query(models.Publication).filter(models.Publication.mentor_profile_id == mentor_id).all()
+        # 1. Fetch Publications (only the columns tagging reads)
+        pubs = db.query(
+            models.Publication.id, models.Publication.title, models.Publication.description, models.Publication.publication_date
+        ).filter(models.Publication.mentor_profile_id == mentor_id).all()
         if not pubs:
             logger.warning("No publications found for analysis")
-            return
+            return 0
             
         abstracts = [p.description for p in pubs if p.description]
         
         # 2. Extract Topics (AI)
-        topic_names = await ai_service.extract_research_topics(abstracts)
+        topic_names = list(dict.fromkeys(n for n in await ai_service.extract_research_topics(abstracts, raise_errors=raise_errors) if n))
         
-        # 3. Link Topics & Compute Trends
-        # Clear existing trends for re-analysis
-        db.query(models.MentorTopicTrend).filter(models.MentorTopicTrend.mentor_id == mentor_id).delete()
-        db.commit()
+        # 3. Get or Create Topics (one upsert, one lookup) and their centroid embeddings.
+        # Topics are shared vocabulary, so they're committed before the embedding call.
+        known = {n for (n,) in db.query(models.ResearchTopic.name).filter(
+            models.ResearchTopic.name.in_(topic_names)
+        )} if topic_names else set()
+        new_topics = [n for n in topic_names if n not in known]
+        try:
+            ResearchService._insert_ignore(db, models.ResearchTopic, [{"name": n} for n in topic_names], ["name"])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        topics = db.query(models.ResearchTopic.id, models.ResearchTopic.name).filter(
+            models.ResearchTopic.name.in_(topic_names)
+        ).all() if topic_names else []
+        topic_ids = {t.name: t.id for t in topics}
+        # Stored per publication: only new or edited papers cost an embedding call
+        pub_vectors = await EmbeddingStore.load_publication_vectors(db, pubs)
+        topic_embeddings = await EmbeddingStore.load_topic_embeddings(db, topics)
         
-        for topic_name in topic_names:
-            # Get or Create Topic
-            topic = db.query(models.ResearchTopic).filter(models.ResearchTopic.name == topic_name).first()
-            if not topic:
-                topic = models.ResearchTopic(name=topic_name)
-                db.add(topic)
-                db.commit()
-                db.refresh(topic)
-                
-            # Link papers to this topic (Simple keyword match in abstract/title)
-            # In a real system, we'd use embedding similarity or AI classification
-            topic_years = []
+        # 4. Link papers to topics, in memory: exact phrase matches on title/abstract words,
+        # plus every topic whose centroid is similar enough to the paper's embedding
+        matcher = TopicMatcher({name: name for name in topic_names})
+        similar = similarity_tags(
+            pub_vectors,
+            {topic_id: np.frombuffer(row.centroid, dtype=np.float32) for topic_id, row in topic_embeddings.items()},
+            settings.TOPIC_SIMILARITY_THRESHOLD
+        )
+        topic_names_by_id = {topic_id: name for name, topic_id in topic_ids.items()}
+        matches = {name: [] for name in topic_names}
+        years = []
+        for i, p in enumerate(pubs):
+            names = matcher.match(publication_embedding_text(p))
+            names.update(topic_names_by_id[topic_id] for topic_id in similar.get(p.id, ()))
+            for name in names:
+                matches[name].append(i)
+            years.append(ResearchService._publication_year(p.publication_date))
+        
+        try:
+            links = {(pubs[i].id, topic_ids[name]) for name, indices in matches.items() for i in indices}
+            existing = set(db.query(models.PublicationTopic.publication_id, models.PublicationTopic.topic_id).filter(
+                models.PublicationTopic.publication_id.in_([p.id for p in pubs])
+            ).all())
+            new_links = links - existing
+            ResearchService._insert_ignore(db, models.PublicationTopic, [
+                {"publication_id": publication_id, "topic_id": topic_id} for publication_id, topic_id in new_links
+            ], ["publication_id", "topic_id"])
             
-            for pub in pubs:
-                text = (pub.title + " " + (pub.description or "")).lower()
-                if topic_name.lower() in text:
-                    # Link it
-                    # Check if link exists
-                    link = db.query(models.PublicationTopic).filter(
-                        models.PublicationTopic.publication_id == pub.id,
-                        models.PublicationTopic.topic_id == topic.id
-                    ).first()
-                    
-                    if not link:
-                        link = models.PublicationTopic(publication_id=pub.id, topic_id=topic.id)
-                        db.add(link)
-                    
-                    try:
-                        year = int(pub.publication_date[:4])
-                        topic_years.append(year)
-                    except:
-                        pass
+            # Newly tagged papers pull their topics' centroids towards them
+            members = {}
+            for publication_id, topic_id in new_links:
+                if publication_id in pub_vectors:
+                    members.setdefault(topic_id, []).append(pub_vectors[publication_id])
+            EmbeddingStore.add_topic_members(topic_embeddings, members)
             
-            # Compute Trend Stats
-            if topic_years:
-                from collections import Counter
-                counts = Counter(topic_years)
-                total_count = len(topic_years)
-                last_active = max(topic_years)
-                
-                # Simple Trend Logic
-                # Compare recent (last 3 years) vs previous
-                current_year = 2025
-                recent_count = sum(c for y, c in counts.items() if y >= current_year - 3)
-                old_count = total_count - recent_count
-                
-                status = "Stable"
-                if recent_count > old_count * 1.5: # Arbitrary threshold
-                    status = "Rising"
-                elif recent_count == 0:
-                    status = "Declining"
-                
-                # Save Trend Summary
-                trend = models.MentorTopicTrend(
-                    mentor_id=mentor_id,
-                    topic_id=topic.id,
-                    trend_status=status,
-                    total_count=total_count,
-                    last_active_year=last_active
+            # Trends follow the per-year counts: only the new tags are folded in, unless the
+            # mentor has none yet (first analysis, or tags from before the counts existed)
+            has_counts = db.query(models.MentorTopicYearCount.mentor_id).filter(
+                models.MentorTopicYearCount.mentor_id == mentor_id
+            ).first() is not None
+            if has_counts:
+                year_of = {p.id: year for p, year in zip(pubs, years)}
+                trends = ResearchService.apply_topic_links(
+                    db, added=[(mentor_id, topic_id, year_of[publication_id]) for publication_id, topic_id in new_links]
                 )
-                db.add(trend)
-                
+            else:
+                trends = ResearchService.rebuild_topic_counts(db, mentor_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        # Trends feed match explanations and research gaps for this mentor
+        cache.invalidate_tags(mentor_tag(mentor_id))
+        logger.info(f"Analysis complete for mentor {mentor_id}: {len(new_links)} new tags, {trends} trends updated from {len(pubs)} publications, {len(new_topics)} new topics")
+        return len(new_topics)
+
+    @staticmethod
+    def tag_publications(db: Session, pubs: list, matcher: Optional[TopicMatcher] = None) -> Set[int]:
+        """
+        Tags publications (rows with id/title/description/mentor_profile_id/
+        publication_date, already flushed) by phrase match against every known
+        ResearchTopic. Only links that don't exist yet are inserted and folded
+        into the per-year counts, so new papers count towards trends in the same
+        transaction that adds them. The caller commits. Returns the ids of the
+        mentors that gained links.
+        """
+        matcher = matcher or TopicVocabulary.get(db)
+        tags = [(pub, topic_id) for pub in pubs for topic_id in matcher.match(publication_embedding_text(pub))]
+        if not tags:
+            return set()
+        existing = set(db.query(models.PublicationTopic.publication_id, models.PublicationTopic.topic_id).filter(
+            models.PublicationTopic.publication_id.in_({pub.id for pub, _ in tags})
+        ).all())
+        new_tags = [(pub, topic_id) for pub, topic_id in tags if (pub.id, topic_id) not in existing]
+        ResearchService._insert_ignore(db, models.PublicationTopic, [
+            {"publication_id": pub.id, "topic_id": topic_id} for pub, topic_id in new_tags
+        ], ["publication_id", "topic_id"])
+        ResearchService.apply_topic_links(db, added=[
+            (pub.mentor_profile_id, topic_id, ResearchService._publication_year(pub.publication_date))
+            for pub, topic_id in new_tags
+        ])
+        return {pub.mentor_profile_id for pub, _ in new_tags if pub.mentor_profile_id is not None}
+
+    @staticmethod
+    def retag_publications(db: Session, mentor_id: Optional[int] = None, batch_size: int = 1000) -> int:
+        """
+        Tags publications (one mentor's, or the whole corpus) against every known
+        ResearchTopic, e.g. after new topics were added. Links are only added,
+        never removed; new ones count towards the mentors' trends, and those
+        mentors' cached results are invalidated.
+        Returns the number of mentors that gained links.
+        """
+        # Read the vocabulary now: the topics that prompted the retag may be seconds old
+        matcher = TopicVocabulary.get(db, refresh=True)
+        query = db.query(
+            models.Publication.id, models.Publication.title, models.Publication.description,
+            models.Publication.mentor_profile_id, models.Publication.publication_date
+        )
+        if mentor_id is not None:
+            query = query.filter(models.Publication.mentor_profile_id == mentor_id)
+        
+        changed = set()
+        batch = []
+        for pub in query.order_by(models.Publication.id).yield_per(batch_size):
+            batch.append(pub)
+            if len(batch) >= batch_size:
+                changed |= ResearchService.tag_publications(db, batch, matcher)
+                batch = []
+        if batch:
+            changed |= ResearchService.tag_publications(db, batch, matcher)
         db.commit()
-        logger.info(f"Analysis complete for mentor {mentor_id}")
+        # New links change these mentors' trends, which feed explanations and research gaps
+        if changed:
+            cache.invalidate_tags(*(mentor_tag(m_id) for m_id in changed))
+        logger.info(f"Re-tagged publications against {matcher.size} topics: {len(changed)} mentors gained links")
+        return len(changed)
+
+    @staticmethod
+    def retag_all_publications() -> int:
+        """Whole-corpus retag_publications with its own session, so it can run in a worker thread."""
+        db = SessionLocal()
+        try:
+            return ResearchService.retag_publications(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
 
     @staticmethod
     def get_mentor_analytics(db: Session, mentor_id: int):
@@ -156,35 +445,65 @@ class ResearchService:
         ]
 
     @staticmethod
-    async def generate_gaps_for_pair(db: Session, mentor_id: int, student_id: int) -> List[Dict[str, Any]]:
+    def gap_contexts(db: Session, mentor_ids: List[int]) -> Dict[int, Dict[str, Any]]:
         """
-        Generates research gaps for a specific student-mentor pair.
+        Research-gap prompt context (name, top domains, recent abstracts) for many
+        mentors in two queries: the mentors with their names and top 5 trend
+        topics (one row per topic), then their 10 latest publications.
+        Missing mentors are left out.
         """
-        mentor = db.query(models.MentorProfile).filter(models.MentorProfile.id == mentor_id).first()
-        student = db.query(models.StudentProfile).filter(models.StudentProfile.id == student_id).first()
+        # Mentor's top domains (from trends), top 5 per mentor
+        trend_rank = func.row_number().over(
+            partition_by=models.MentorTopicTrend.mentor_id,
+            order_by=models.MentorTopicTrend.total_count.desc()
+        ).label("rank")
+        ranked_trends = db.query(models.MentorTopicTrend.mentor_id, models.MentorTopicTrend.topic_id, trend_rank).filter(
+            models.MentorTopicTrend.mentor_id.in_(mentor_ids)
+        ).subquery()
+        rows = db.query(
+            models.MentorProfile.id, models.MentorProfile.research_areas,
+            models.User.name.label("mentor_name"), models.ResearchTopic.name.label("topic")
+        ).outerjoin(models.User, models.User.id == models.MentorProfile.user_id).outerjoin(
+            ranked_trends, and_(ranked_trends.c.mentor_id == models.MentorProfile.id, ranked_trends.c.rank <= 5)
+        ).outerjoin(models.ResearchTopic, models.ResearchTopic.id == ranked_trends.c.topic_id).filter(
+            models.MentorProfile.id.in_(mentor_ids)
+        ).order_by(models.MentorProfile.id, ranked_trends.c.rank).all()
+        if not rows:
+            return {}
         
-        if not mentor or not student:
-            raise ValueError("Mentor or Student not found")
-            
-        # 1. Gather Context
-        # Mentor's top domains (from trends)
-        top_trends = db.query(models.MentorTopicTrend).filter(
-            models.MentorTopicTrend.mentor_id == mentor_id
-        ).order_by(models.MentorTopicTrend.total_count.desc()).limit(5).all()
-        mentor_domains = [t.topic.name for t in top_trends]
-        if not mentor_domains and mentor.research_areas:
-             mentor_domains = [area.strip() for area in mentor.research_areas.split(',')]
-        
-        # Mentor's Abstracts
-        pubs = db.query(models.Publication).filter(models.Publication.mentor_profile_id == mentor_id).order_by(models.Publication.publication_date.desc()).limit(10).all()
-        mentor_abstracts = [f"Title: {p.title}\nAbstract: {p.description}" for p in pubs]
+        contexts = {}
+        research_areas = {}
+        for m_id, areas, name, topic in rows:
+            context = contexts.setdefault(m_id, {"mentor_name": name, "mentor_domains": [], "mentor_abstracts": []})
+            research_areas[m_id] = areas
+            if topic is not None:
+                context["mentor_domains"].append(topic)
+        for m_id, context in contexts.items():
+            if not context["mentor_domains"] and research_areas[m_id]:
+                context["mentor_domains"] = [area.strip() for area in research_areas[m_id].split(',')]
         
+        # Mentor's Abstracts, 10 latest per mentor
+        pub_rank = func.row_number().over(
+            partition_by=models.Publication.mentor_profile_id,
+            order_by=models.Publication.publication_date.desc()
+        ).label("rank")
+        ranked_pubs = db.query(
+            models.Publication.mentor_profile_id, models.Publication.title, models.Publication.description, pub_rank
+        ).filter(models.Publication.mentor_profile_id.in_(list(contexts))).subquery()
+        pubs = db.query(ranked_pubs.c.mentor_profile_id, ranked_pubs.c.title, ranked_pubs.c.description).filter(
+            ranked_pubs.c.rank <= 10
+        ).order_by(ranked_pubs.c.mentor_profile_id, ranked_pubs.c.rank).all()
+        for m_id, title, description in pubs:
+            contexts[m_id]["mentor_abstracts"].append(f"Title: {title}\nAbstract: {description}")
+        return contexts
+
+    @staticmethod
+    def student_gap_skills(student: models.StudentProfile) -> List[str]:
         # Student's Skills
         student_skills = []
         if student.primary_skills:
             try:
                 # Try JSON
-                import json
                 student_skills = json.loads(student.primary_skills)
             except:
                 # Fallback to CSV
@@ -194,13 +513,32 @@ class ResearchService:
             # Fallback to interests if no skills
              if student.interests:
                  student_skills = [s.strip() for s in student.interests.split(',')]
+        return student_skills
+
+    @staticmethod
+    async def generate_gaps_for_pair(db: Session, mentor_id: int, student_id: int) -> List[Dict[str, Any]]:
+        """
+        Generates research gaps for a specific student-mentor pair.
+        """
+        student = db.query(models.StudentProfile).filter(models.StudentProfile.id == student_id).first()
+        # 1. Gather Context
+        context = ResearchService.gap_contexts(db, [mentor_id]).get(mentor_id)
+        
+        if not context or not student:
+            raise ValueError("Mentor or Student not found")
         
         # 2. Call AI Service
+        return await ResearchService.generate_gaps_from_context(context, ResearchService.student_gap_skills(student))
+
+    @staticmethod
+    async def generate_gaps_from_context(context: Dict[str, Any], student_skills: List[str],
+                                         raise_errors: bool = False) -> List[Dict[str, Any]]:
         gaps = await ai_service.generate_research_gaps(
-            mentor_name=mentor.user.name,
-            mentor_domains=mentor_domains,
+            mentor_name=context["mentor_name"],
+            mentor_domains=context["mentor_domains"],
             student_skills=student_skills,
-            mentor_abstracts=mentor_abstracts
+            mentor_abstracts=context["mentor_abstracts"],
+            raise_errors=raise_errors
         )
         
         return gaps
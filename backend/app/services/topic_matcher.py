@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+import numpy as np
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.db import models
+
+# A trailing "+" or "#" is part of the word, so "C++" and "C#" don't tokenize to "c"
+_WORD = re.compile(r"\w+[+#]*")
+
+
+def normalize_token(token: str) -> str:
+    """Lowercased, crude singular form, so "Networks" matches "network"."""
+    token = token.lower()
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith("sses"):
+        return token[:-2]
+    if len(token) > 4 and token.endswith(("ches", "shes", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [normalize_token(t) for t in _WORD.findall(text or "")]
+
+
+class TopicMatcher:
+    """
+    Aho-Corasick automaton over normalized words. Every topic phrase is matched
+    on word boundaries (and singular/plural alike) against a text in one pass
+    over its words, however many topics there are.
+    """
+
+    def __init__(self, topics: Dict[Hashable, str]):
+        # Trie over word sequences; node 0 is the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Hashable, ...]] = [()]
+        for key, name in topics.items():
+            words = tokenize(name)
+            if words:
+                self._add(words, key)
+        self._link()
+        self.size = len(topics)
+
+    def _add(self, words: List[str], key: Hashable):
+        node = 0
+        for word in words:
+            nxt = self._goto[node].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][word] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += (key,)
+
+    def _link(self):
+        # Breadth-first failure links; outputs are merged along them once, at build time
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def match(self, text: Optional[str]) -> Set[Hashable]:
+        """Keys of every topic occurring in the text."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for word in tokenize(text):
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def match_many(self, texts: Iterable[Optional[str]]) -> List[Set[Hashable]]:
+        return [self.match(text) for text in texts]
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def similarity_tags(publication_vectors: Dict[int, List[float]], topic_vectors: Dict[Hashable, np.ndarray],
+                    threshold: float) -> Dict[int, Set[Hashable]]:
+    """
+    Tags every publication with the topics whose vector is at least `threshold`
+    cosine-similar to it, as one (publications x topics) matrix product.
+    Vectors whose size differs from the topics' (failed embeddings) are skipped.
+    """
+    if not publication_vectors or not topic_vectors:
+        return {}
+    dims = len(next(iter(topic_vectors.values())))
+    topic_keys = [k for k, v in topic_vectors.items() if len(v) == dims]
+    publication_ids = [p for p, v in publication_vectors.items() if len(v) == dims]
+    if not publication_ids:
+        return {}
+    publications = _unit_rows(np.array([publication_vectors[p] for p in publication_ids], dtype=np.float32))
+    topics = _unit_rows(np.array([topic_vectors[k] for k in topic_keys], dtype=np.float32))
+
+    tags: Dict[int, Set[Hashable]] = {}
+    rows, cols = np.nonzero(publications @ topics.T >= threshold)
+    for r, c in zip(rows.tolist(), cols.tolist()):
+        tags.setdefault(publication_ids[r], set()).add(topic_keys[c])
+    return tags
+
+
+class TopicVocabulary:
+    """
+    Process-wide TopicMatcher over every ResearchTopic (keyed by topic id),
+    rebuilt when topics are added. Used to (re)tag publications against the
+    global vocabulary rather than one analysis' extracted topics.
+    """
+
+    REFRESH_INTERVAL = 5.0
+
+    _matcher: Optional[TopicMatcher] = None
+    _version = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _current_version(db: Session):
+        return tuple(db.query(func.count(models.ResearchTopic.id), func.max(models.ResearchTopic.id)).one())
+
+    @classmethod
+    def get(cls, db: Session, refresh: bool = False) -> TopicMatcher:
+        """The current matcher; `refresh` checks the version now instead of after REFRESH_INTERVAL."""
+        now = time.time()
+        if not refresh and cls._matcher is not None and now - cls._checked_at < cls.REFRESH_INTERVAL:
+            return cls._matcher
+        with cls._lock:
+            version = cls._current_version(db)
+            if cls._matcher is None or version != cls._version:
+                cls._matcher = TopicMatcher(dict(db.query(models.ResearchTopic.id, models.ResearchTopic.name).all()))
+            cls._version = version
+            cls._checked_at = now
+        return cls._matcher
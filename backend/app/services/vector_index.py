@@ -0,0 +1,312 @@
+import logging
+import math
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Indexes below this size are always served exactly; IVF only pays off on large pools.
+IVF_MIN_VECTORS = 20000
+
+
+def _normalize(vec) -> np.ndarray:
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(arr)
+    if norm > 0:
+        arr = arr / norm
+    return arr
+
+def _top_k(ids: np.ndarray, sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if k <= 0 or sims.size == 0:
+        return ids[:0], sims[:0]
+    if sims.size > k:
+        part = np.argpartition(-sims, k - 1)[:k]
+    else:
+        part = np.arange(sims.size)
+    order = part[np.argsort(-sims[part], kind="stable")]
+    return ids[order], sims[order]
+
+
+class _Block:
+    """
+    Growable matrix of normalized vectors with O(1) swap-remove.
+    """
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.dim = dim
+        self.size = 0
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.pos: Dict[int, int] = {}
+
+    def upsert(self, item_id: int, vec: np.ndarray):
+        row = self.pos.get(item_id)
+        if row is not None:
+            self.matrix[row] = vec
+            return
+        if self.size == len(self.ids):
+            capacity = max(64, len(self.ids) * 2)
+            self.ids = np.resize(self.ids, capacity)
+            matrix = np.empty((capacity, self.dim), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            self.matrix = matrix
+        self.ids[self.size] = item_id
+        self.matrix[self.size] = vec
+        self.pos[item_id] = self.size
+        self.size += 1
+
+    def remove(self, item_id: int) -> bool:
+        row = self.pos.pop(item_id, None)
+        if row is None:
+            return False
+        last = self.size - 1
+        if row != last:
+            moved = int(self.ids[last])
+            self.ids[row] = moved
+            self.matrix[row] = self.matrix[last]
+            self.pos[moved] = row
+        self.size = last
+        return True
+
+    def search(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray] = None):
+        """`allowed` must be sorted and unique (see VectorIndex._prepare_query)."""
+        ids = self.ids[:self.size]
+        sims = self.matrix[:self.size] @ query
+        if allowed is not None:
+            if allowed.size == 0:
+                return _top_k(ids[:0], sims[:0], k)
+            # Binary search into the sorted candidate set: O(n log m) per block
+            pos = np.minimum(np.searchsorted(allowed, ids), allowed.size - 1)
+            keep = allowed[pos] == ids
+            ids, sims = ids[keep], sims[keep]
+        return _top_k(ids, sims, k)
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over integer ids (mentor/student profile ids).
+    Subclasses decide how much of the pool is scanned per query.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+
+    def build(self, ids: List[int], vectors: List[List[float]]):
+        raise NotImplementedError
+
+    def upsert(self, item_id: int, vector: List[float]):
+        raise NotImplementedError
+
+    def remove(self, item_id: int):
+        raise NotImplementedError
+
+    def search(self, query: List[float], k: int, allowed_ids: Optional[Iterable[int]] = None) -> Tuple[List[int], List[float]]:
+        """
+        Returns (ids, similarities) of the k nearest vectors, best first.
+        allowed_ids restricts the result to a candidate set (e.g. Lens 1 survivors).
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, item_id: int) -> bool:
+        raise NotImplementedError
+
+    def _accepts(self, vector) -> bool:
+        if vector is None or len(vector) == 0:
+            return False
+        if self.dim is None:
+            self.dim = len(vector)
+        return len(vector) == self.dim
+
+    def _prepare_query(self, query, allowed_ids):
+        if not self._accepts(query) or len(self) == 0:
+            return None, None
+        allowed = None
+        if allowed_ids is not None:
+            if not isinstance(allowed_ids, np.ndarray):
+                allowed_ids = np.fromiter(allowed_ids, dtype=np.int64)
+            allowed = np.unique(allowed_ids.astype(np.int64, copy=False))
+        return _normalize(query), allowed
+
+
+class FlatIndex(VectorIndex):
+    """
+    Exact search: one matrix-vector product over every stored vector.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        super().__init__(dim)
+        self._block: Optional[_Block] = None
+
+    def build(self, ids: List[int], vectors: List[List[float]]):
+        self._block = None
+        for item_id, vec in zip(ids, vectors):
+            self.upsert(item_id, vec)
+
+    def upsert(self, item_id: int, vector: List[float]):
+        if not self._accepts(vector):
+            self.remove(item_id)
+            return
+        if self._block is None:
+            self._block = _Block(self.dim)
+        self._block.upsert(int(item_id), _normalize(vector))
+
+    def remove(self, item_id: int):
+        if self._block is not None:
+            self._block.remove(int(item_id))
+
+    def search(self, query, k, allowed_ids=None):
+        q, allowed = self._prepare_query(query, allowed_ids)
+        if q is None:
+            return [], []
+        ids, sims = self._block.search(q, k, allowed)
+        return ids.tolist(), sims.tolist()
+
+    def __len__(self):
+        return self._block.size if self._block is not None else 0
+
+    def __contains__(self, item_id):
+        return self._block is not None and int(item_id) in self._block.pos
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file approximate index: vectors are bucketed by their nearest
+    k-means centroid and a query only scans the `nprobe` closest buckets.
+    Buckets are retrained once the pool has grown well past the training size.
+    """
+
+    def __init__(self, dim: Optional[int] = None, nlist: Optional[int] = None, nprobe: int = 8,
+                 kmeans_iters: int = 10, max_train_samples: int = 20000):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iters = kmeans_iters
+        self.max_train_samples = max_train_samples
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[_Block] = []
+        self._where: Dict[int, int] = {}
+        self._trained_size = 0
+
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        n = matrix.shape[0]
+        nlist = self.nlist or max(1, min(1024, int(math.sqrt(n))))
+        rng = np.random.default_rng(0)
+        sample = matrix
+        if n > self.max_train_samples:
+            sample = matrix[rng.choice(n, self.max_train_samples, replace=False)]
+        nlist = min(nlist, sample.shape[0])
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+        # Spherical k-means: vectors and centroids stay unit-length, similarity is a dot product
+        for _ in range(self.kmeans_iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+        return centroids
+
+    def build(self, ids: List[int], vectors: List[List[float]]):
+        pairs = [(int(i), v) for i, v in zip(ids, vectors) if self._accepts(v)]
+        self._lists = []
+        self._where = {}
+        self._centroids = None
+        self._trained_size = len(pairs)
+        if not pairs:
+            return
+
+        matrix = np.stack([_normalize(v) for _, v in pairs])
+        self._centroids = self._train(matrix)
+        self._lists = [_Block(self.dim) for _ in range(len(self._centroids))]
+        assign = np.argmax(matrix @ self._centroids.T, axis=1)
+        for (item_id, _), row, bucket in zip(pairs, matrix, assign):
+            self._lists[bucket].upsert(item_id, row)
+            self._where[item_id] = int(bucket)
+
+    def _all_items(self):
+        for block in self._lists:
+            for row in range(block.size):
+                yield int(block.ids[row]), block.matrix[row].copy()
+
+    def upsert(self, item_id: int, vector: List[float]):
+        item_id = int(item_id)
+        if not self._accepts(vector):
+            self.remove(item_id)
+            return
+        if self._centroids is None:
+            self.build([item_id], [vector])
+            return
+
+        vec = _normalize(vector)
+        bucket = int(np.argmax(self._centroids @ vec))
+        previous = self._where.get(item_id)
+        if previous is not None and previous != bucket:
+            self._lists[previous].remove(item_id)
+        self._lists[bucket].upsert(item_id, vec)
+        self._where[item_id] = bucket
+
+        # Centroids drift as the pool grows; retrain once it has quadrupled.
+        if len(self._where) > 4 * max(self._trained_size, IVF_MIN_VECTORS // 4):
+            items = list(self._all_items())
+            self.build([i for i, _ in items], [v for _, v in items])
+
+    def remove(self, item_id: int):
+        bucket = self._where.pop(int(item_id), None)
+        if bucket is not None:
+            self._lists[bucket].remove(int(item_id))
+
+    def search(self, query, k, allowed_ids=None):
+        q, allowed = self._prepare_query(query, allowed_ids)
+        if q is None:
+            return [], []
+
+        order = np.argsort(-(self._centroids @ q))
+        if allowed is not None and allowed.size * 4 <= len(self._where):
+            # Sparse candidate set: only buckets holding a candidate are worth probing
+            holding = {self._where[i] for i in allowed.tolist() if i in self._where}
+            order = [b for b in order if b in holding]
+
+        # Probe the closest buckets; keep going past nprobe until k results are found
+        found_ids, found_sims, found = [], [], 0
+        for probed, bucket in enumerate(order):
+            if probed >= self.nprobe and found >= k:
+                break
+            ids, sims = self._lists[bucket].search(q, k, allowed)
+            found_ids.append(ids)
+            found_sims.append(sims)
+            found += len(ids)
+        if not found_ids:
+            return [], []
+        ids, sims = _top_k(np.concatenate(found_ids), np.concatenate(found_sims), k)
+        return ids.tolist(), sims.tolist()
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, item_id):
+        return int(item_id) in self._where
+
+
+def create_index(kind: str = "auto", expected_size: int = 0, nprobe: int = 8) -> VectorIndex:
+    """
+    kind: "flat", "ivf", or "auto" (IVF once the pool is large enough to benefit).
+    nprobe only applies to IVF (see VECTOR_INDEX_NPROBE for the recall trade-off).
+    """
+    if kind == "ivf" or (kind == "auto" and expected_size >= IVF_MIN_VECTORS):
+        return IVFIndex(nprobe=nprobe)
+    return FlatIndex()
+
+
+# Process-wide indexes, keyed by name ("mentors", ...). Built at startup; read them
+# through EmbeddingStore, which picks up other processes' writes.
+_indexes: Dict[str, VectorIndex] = {}
+
+def get_index(name: str) -> Optional[VectorIndex]:
+    return _indexes.get(name)
+
+def set_index(name: str, index: VectorIndex):
+    _indexes[name] = index
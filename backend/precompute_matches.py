@@ -0,0 +1,18 @@
+import argparse
+import asyncio
+from app.services.batch_matching import run_batch_matching
+
+def precompute_matches():
+    parser = argparse.ArgumentParser(description="Precompute every student's top-K mentor matches.")
+    parser.add_argument("--top-k", type=int, default=None, help="Mentors kept per student (MATCH_BATCH_TOP_K)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Students per task (MATCH_BATCH_CHUNK_SIZE)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (MATCH_BATCH_WORKERS, 0 = CPUs)")
+    args = parser.parse_args()
+
+    print("Precomputing mentor matches...")
+    stats = asyncio.run(run_batch_matching(top_k=args.top_k, chunk_size=args.chunk_size, workers=args.workers))
+    print(f"Scored {stats['students']} students against {stats['mentors']} mentors "
+          f"({stats['pairs_written']} rows) in {stats['seconds']}s")
+
+if __name__ == "__main__":
+    precompute_matches()
@@ -0,0 +1,22 @@
+import argparse
+import asyncio
+from app.services.research_pipeline import run_research_pipeline
+
+def research_pipeline():
+    parser = argparse.ArgumentParser(description="Ingest publications and analyze research trends for every mentor that needs it.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Mentors processed at once (RESEARCH_PIPELINE_CONCURRENCY)")
+    parser.add_argument("--rate", type=float, default=None, help="Max LLM-backed steps per minute (RESEARCH_PIPELINE_RATE, 0 = unlimited)")
+    parser.add_argument("--force", action="store_true", help="Re-analyze every mentor, not only those with new publications")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many mentors (resume later by running again)")
+    args = parser.parse_args()
+
+    print("Running research pipeline...")
+    stats = asyncio.run(run_research_pipeline(
+        concurrency=args.concurrency, rate_per_minute=args.rate, force_analysis=args.force, limit=args.limit
+    ))
+    print(f"Processed {stats['mentors']} mentors ({stats['ingested']} ingested, {stats['analyzed']} analyzed, "
+          f"{stats['failed']} failed) in {stats['seconds']}s: "
+          f"{stats['mentors_per_min']} mentors/min, {stats['llm_calls_per_min']} LLM calls/min")
+
+if __name__ == "__main__":
+    research_pipeline()
@@ -2,6 +2,10 @@ from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.db import models
 from app.core.security import hash_password
+from app.services.embedding_store import EmbeddingStore
+from app.services.match_scores import MatchScoreStore
+from app.services.domain_filter import DomainFilter
+import asyncio
 import sys
 
 def seed_mentors():
@@ -276,6 +280,18 @@ def seed_mentors():
         db.commit()
         print(f"  - Profile updated for {data['name']}")
 
+    # Precompute matching embeddings (batched, only for new or changed profiles)
+    mentors = db.query(models.MentorProfile).all()
+    asyncio.run(EmbeddingStore.load_mentor_vectors(db, mentors))
+    print(f"Embeddings ready for {len(mentors)} mentors")
+    
+    # Score the seeded mentors against existing students (unchanged pairs are skipped)
+    async def rescore_all():
+        for mentor in mentors:
+            DomainFilter.refresh_mentor(db, mentor)
+            await MatchScoreStore.rescore_mentor(db, mentor)
+    asyncio.run(rescore_all())
+
     db.close()
     print("Seeding Complete!")
     print("\nCredentials:")
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Tests import the app package from backend/, wherever pytest is started from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.db.database builds its engine at import time
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+# Settings without defaults; the values only matter to the routes that use them
+for _name in ("SECRET_KEY", "ADMIN_EMAIL", "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GITHUB_CLIENT_ID", "GITHUB_CLIENT_SECRET"):
+    os.environ.setdefault(_name, "test")
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import MemoryBackend, RedisBackend, SimpleCache, SQLiteBackend, mentor_tag, student_tag
+
+# In-process Redis-protocol server, so RedisBackend runs without a live Redis
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def redis_backend(server) -> RedisBackend:
+    # One client per worker process, all talking to the same server
+    return RedisBackend(client=fakeredis.FakeStrictRedis(server=server))
+
+
+def simple_cache(backend) -> SimpleCache:
+    instance = object.__new__(SimpleCache)
+    instance._setup(backend)
+    return instance
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path, server):
+    if request.param == "memory":
+        return MemoryBackend(max_entries=100, max_bytes=1 << 20, sweep_interval=0)
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=100)
+    return redis_backend(server)
+
+
+def test_invalidate_drops_tagged_entries_only(backend):
+    backend.set("a", [1], 60, tags=[student_tag(1), mentor_tag(2)])
+    backend.set("b", [2], 60, tags=[student_tag(3)])
+    assert backend.invalidate_tags([mentor_tag(2)]) == 1
+    assert backend.get("a") is None
+    assert backend.get("b") == [2]
+
+
+def test_write_is_skipped_after_its_tag_was_invalidated(backend):
+    tags = [student_tag(1), mentor_tag(2)]
+    generations = backend.tag_generations(tags)
+    assert backend.set("a", [1], 60, tags=tags, generations=generations)
+
+    backend.invalidate_tags([mentor_tag(2)])
+    assert not backend.set("a", [1], 60, tags=tags, generations=generations)
+    assert backend.get("a") is None
+    assert backend.set("a", [1], 60, tags=tags, generations=backend.tag_generations(tags))
+
+
+def test_redis_tag_sets_expire_with_their_longest_lived_entry(server):
+    backend = redis_backend(server)
+    tag_key = backend.prefix + "tag:" + mentor_tag(2)
+    backend.set("short", [1], 30, tags=[mentor_tag(2)])
+    assert 0 < backend.client.ttl(tag_key) <= 30
+    # EXPIRE GT extends the set for a longer-lived member...
+    backend.set("long", [2], 300, tags=[mentor_tag(2)])
+    assert 30 < backend.client.ttl(tag_key) <= 300
+    # ...and never shortens it for a shorter-lived one
+    backend.set("short", [1], 30, tags=[mentor_tag(2)])
+    assert backend.client.ttl(tag_key) > 30
+    assert backend.client.smembers(tag_key) == {b"short", b"long"}
+
+
+def test_redis_write_is_aborted_by_a_concurrent_invalidation(server):
+    backend, other_worker = redis_backend(server), redis_backend(server)
+    tags = [mentor_tag(2)]
+    generations = backend.tag_generations(tags)
+    original_pipeline = backend.client.pipeline
+
+    def pipeline(*args, **kwargs):
+        pipe = original_pipeline(*args, **kwargs)
+        watched_mget = pipe.mget
+
+        def mget(*mget_args, **mget_kwargs):
+            current = watched_mget(*mget_args, **mget_kwargs)
+            # The invalidation lands between the generation check and MULTI/EXEC
+            other_worker.invalidate_tags(tags)
+            return current
+        pipe.mget = mget
+        return pipe
+
+    backend.client.pipeline = pipeline
+    assert not backend.set("a", [1], 60, tags=tags, generations=generations)
+    assert other_worker.get("a") is None
+
+
+def test_get_or_set_discards_a_load_invalidated_by_another_worker(server):
+    cache, other_worker = simple_cache(redis_backend(server)), redis_backend(server)
+    tags = [student_tag(1), mentor_tag(2)]
+
+    async def loader():
+        other_worker.invalidate_tags([student_tag(1)])
+        return ["gap"]
+
+    async def scenario():
+        assert await cache.get_or_set("gaps:1:2", loader, tags=tags) == ["gap"]
+        assert cache.get("gaps:1:2") is None
+        assert await cache.get_or_set("gaps:1:2", lambda: asyncio.sleep(0, ["fresh"]), tags=tags) == ["fresh"]
+        assert cache.get("gaps:1:2") == ["fresh"]
+
+    asyncio.run(scenario())
+    assert cache.stats()["stale_loads"] == 1
@@ -0,0 +1,22 @@
+from app.services.topic_matcher import TopicMatcher, tokenize
+
+
+def test_plus_and_hash_stay_in_tokens():
+    assert tokenize("Written in C++ and C#") == ["written", "in", "c++", "and", "c#"]
+
+
+def test_cpp_topic_does_not_match_plain_c():
+    matcher = TopicMatcher({"cpp": "C++", "csharp": "C#"})
+    assert matcher.match("Reading C code") == set()
+
+
+def test_cpp_and_c_topics_match_their_own_language():
+    matcher = TopicMatcher({"cpp": "C++", "csharp": "C#", "c": "C"})
+    assert matcher.match("A compiler written in C++") == {"cpp"}
+    assert matcher.match("Tooling for C# developers") == {"csharp"}
+    assert matcher.match("Reading C code") == {"c"}
+
+
+def test_phrases_match_plural_forms():
+    matcher = TopicMatcher({1: "Graph Neural Network"})
+    assert matcher.match("Scalable graph neural networks for chemistry") == {1}
@@ -23,6 +23,28 @@ api.interceptors.request.use(
   }
 );
 
+// Endpoints that queue AI work answer 202 with a job; poll it until it finishes
+const JOB_POLL_INTERVAL_MS = 1500;
+const JOB_POLL_MAX_ATTEMPTS = 120; // ~3 minutes
+
+const awaitJob = async (response) => {
+  if (response.status !== 202) {
+    return response.data;
+  }
+  const statusUrl = response.data.status_url;
+  for (let attempt = 0; attempt < JOB_POLL_MAX_ATTEMPTS; attempt++) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const job = (await api.get(statusUrl)).data;
+    if (job.status === "succeeded") {
+      return job.result;
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "Job failed");
+    }
+  }
+  throw new Error("Timed out waiting for the result. Please try again later.");
+};
+
 export const login = async (email, password) => {
   const response = await api.post("/auth/login", { email, password });
   return response.data;
@@ -189,7 +211,7 @@ export const updateApplicationStatus = async (id, status) => {
 // Improvement Plan APIs
 export const generateImprovementPlan = async (opportunityId) => {
   const response = await api.post(`/improvement/generate/${opportunityId}`);
-  return response.data;
+  return awaitJob(response);
 };
 
 export const getMyImprovementPlans = async () => {
@@ -323,7 +345,7 @@ export const getSmartMatches = async () => {
 
 export const generateAICoverLetter = async (opportunityId) => {
   const response = await api.post('/ai/cover-letter', { opportunity_id: opportunityId });
-  return response.data;
+  return awaitJob(response);
 };
 
 export const getResearchGaps = async (mentorId, studentId) => {
@@ -337,7 +359,7 @@ export const getProposalGuidance = async (mentorId, gapTitle, gapDescription) =>
     gap_title: gapTitle,
     gap_description: gapDescription
   });
-  return response.data;
+  return awaitJob(response);
 };
 
 export const saveResearchGap = async (gapData) => {